@@ -1,40 +1,152 @@
-from .rgb_color_picker import RGBColorPicker
-from .color_palette import ColorPalette
-from .image_palette_extractor import ImagePaletteExtractor
+from .lazy_import import lazy_node
+from . import palette_api, palette_metrics, palette_worker
 from aiohttp import web
+import asyncio
 import server
 
+# Node classes are stand-ins that import their module (and NumPy/torch) the
+# first time ComfyUI reads or runs them; see lazy_import.py
 NODE_CLASS_MAPPINGS = {
-    "RGBColorPicker": RGBColorPicker,
-    "ColorPalette": ColorPalette,
-    "ImagePaletteExtractor": ImagePaletteExtractor,
+    "RGBColorPicker": lazy_node("rgb_color_picker", "RGBColorPicker"),
+    "ColorPalette": lazy_node("color_palette", "ColorPalette"),
+    "ImagePaletteExtractor": lazy_node("image_palette_extractor", "ImagePaletteExtractor"),
+    "PaletteRemap": lazy_node("palette_remap", "PaletteRemap"),
+    "PaletteMatch": lazy_node("palette_index", "PaletteMatch"),
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "RGBColorPicker": "RGB Color Picker",
     "ColorPalette": "Color Palette",
     "ImagePaletteExtractor": "Image Palette Extractor",
+    "PaletteRemap": "Palette Remap",
+    "PaletteMatch": "Palette Match",
 }
 
 # Serve frontend JS from the js/ folder
 WEB_DIRECTORY = "./js"
 
+# Blocking work (preset file reads, JSON parsing, extraction) runs on the
+# palette_worker pools; identical concurrent requests share one job and a full
+# pool answers 503 instead of queueing without bound.
+def _busy(e):
+    return web.json_response({"error": str(e)}, status=503,
+                             headers={"Retry-After": str(palette_worker.RETRY_AFTER_S)})
+
 @server.PromptServer.instance.routes.post("/tj_comfyuiutil/palette")
 async def get_palette_colors(request):
     """Return colors for a given preset or custom json without executing the node.
     Body: {"preset":"primary"} or {"preset":"custom","custom_json":"{...}"}
     """
     try:
-        data = await request.json()
-        preset = data.get("preset", "primary")
-        custom_json = data.get("custom_json", "")
-        palette_node = ColorPalette()
-        if preset == "custom":
-            colors = palette_node._parse_custom(custom_json)
-        else:
-            colors = palette_node.load_palette(preset)
+        body = await request.read()
+        colors = await palette_worker.route_pool.run(("palette", body), palette_api.from_json,
+                                                     palette_api.resolve_request, body)
         return web.json_response(colors)
+    except palette_worker.Busy as e:
+        return _busy(e)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+@server.PromptServer.instance.routes.post("/tj_comfyuiutil/palettes")
+async def get_palette_colors_batch(request):
+    """Resolve many presets / custom jsons in one round-trip.
+    Body: {"requests":[{"preset":"primary"},{"preset":"custom","custom_json":"{...}"}, ...]}
+    Returns: {"results":[[8 colors], ...]} in request order
+    """
+    try:
+        body = await request.read()
+        result = await palette_worker.route_pool.run(("palettes", body), palette_api.from_json,
+                                                     palette_api.resolve_batch, body)
+        return web.json_response(result)
+    except palette_worker.Busy as e:
+        return _busy(e)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
+@server.PromptServer.instance.routes.get("/tj_comfyuiutil/palettes")
+async def get_preset_palettes(request):
+    """Preset colors, cacheable: ?name=primary&name=pastel (all presets without name).
+    Sends an ETag of the preset file versions; If-None-Match answers 304.
+    """
+    try:
+        names = tuple(request.query.getall("name", []))
+        if_none_match = request.headers.get("If-None-Match")
+        payload, etag = await palette_worker.route_pool.run(("presets", names, if_none_match),
+                                                            palette_api.presets_payload, names, if_none_match)
+        headers = {"ETag": etag, "Cache-Control": palette_api.CACHE_CONTROL}
+        if payload is None:
+            return web.Response(status=304, headers=headers)
+        return web.json_response(payload, headers=headers)
+    except palette_worker.Busy as e:
+        return _busy(e)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+@server.PromptServer.instance.routes.post("/tj_comfyuiutil/palette_match")
+async def match_palette(request):
+    """Closest presets to a palette (assignment-based Lab dE, see palette_index.py).
+    Body: {"colors":["#RRGGBB", ...], "k":5} -> {"matches":[{"name":..., "distance":...}, ...]}
+    or {"queries":[[...], ...], "k":5} -> {"results":[[...], ...]}
+    """
+    try:
+        body = await request.read()
+        result = await palette_worker.route_pool.run(("match", body), palette_api.from_json, palette_api.match, body)
+        return web.json_response(result)
+    except palette_worker.Busy as e:
+        return _busy(e)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+@server.PromptServer.instance.routes.post("/tj_comfyuiutil/extract_palette")
+async def extract_palette(request):
+    """Palette of an uploaded image (ImagePaletteExtractor on the extract worker pool).
+    multipart/form-data with an "image" file (any format Pillow reads, or .npy) and
+    extractor inputs as fields or query parameters (?palette_size=8&sort=hue&...),
+    or the raw file as the body with the inputs in the query string.
+    Returns the custom_json object: {"colors":[...], "kmeans":{...}}
+    """
+    try:
+        raw = dict(request.query)
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            upload = form.get("image")
+            if not hasattr(upload, "file"):
+                return web.json_response({"error": 'missing "image" file field'}, status=400)
+            raw.update((k, v) for k, v in form.items() if k != "image" and isinstance(v, str))
+            data = await asyncio.to_thread(upload.file.read)
+        else:
+            data = await request.read()
+        if len(data) > palette_api.MAX_UPLOAD_BYTES:
+            return web.json_response({"error": "upload too large"}, status=413)
+        key = await asyncio.to_thread(palette_api.upload_key, data, raw)
+        result = await palette_worker.extract_pool.run(key, palette_api.extract, data, raw)
+        return web.json_response(result)
+    except web.HTTPException:  # e.g. 413 from the server's client_max_size
+        raise
+    except palette_worker.Busy as e:
+        return _busy(e)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+@server.PromptServer.instance.routes.get("/tj_comfyuiutil/metrics")
+async def get_palette_metrics(request):
+    """ImagePaletteExtractor stage metrics.
+    Default: Prometheus text exposition (needs TJ_COLORUTIL_METRICS=prometheus).
+    ?format=json: the recent runs kept by the ring buffer sink (TJ_COLORUTIL_METRICS=ring)
+    and the worker pool counters.
+    """
+    if request.query.get("format") == "json":
+        return web.json_response({"enabled": palette_metrics.enabled(), "runs": palette_metrics.recent_runs(),
+                                  "workers": palette_worker.stats()})
+    text = palette_metrics.prometheus_text()
+    if text is None:
+        return web.Response(status=404, text="prometheus metrics are off; set TJ_COLORUTIL_METRICS=prometheus\n")
+    return web.Response(text=text, headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
@@ -0,0 +1,92 @@
+"""ImagePaletteExtractor working color spaces compared: speed and stability.
+
+    python benchmarks/bench_color_spaces.py [--megapixels 1] [--samples 100000] [--seeds 5] [--json out.json]
+
+Synthetic images only (a smooth gradient with noise, and uniform noise). Per
+color_space (cielab / oklab / linear_rgb) it reports:
+  convert_ms  _rgb_to_working on the samples
+  extract_ms  extract_palette end to end (cache off), median over the seeds
+  n_iter      mean k-means passes
+  drift_de    mean palette distance (palette_index.palette_distance, CIE76
+              dE in Lab for every space) between the palettes of different
+              seeds; lower = more stable palettes
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_palette_extractor import _COLOR_SPACES, ImagePaletteExtractor, _rgb_to_lab, _rgb_to_working  # noqa: E402
+from palette_index import _parse_colors, palette_distance  # noqa: E402
+
+
+def make_image(megapixels: float, kind: str, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    side = int(round(np.sqrt(megapixels * 1e6)))
+    if kind == "gradient":
+        yy, xx = np.mgrid[0:side, 0:side].astype(np.float32) / side
+        img = np.stack([xx, yy, 1 - (xx + yy) / 2], axis=-1)
+        img = np.clip(img + rng.normal(0, 0.03, size=img.shape).astype(np.float32), 0, 1)
+    elif kind == "noisy":
+        img = rng.random((side, side, 3), dtype=np.float32)
+    else:
+        raise ValueError(f"Unknown image kind: {kind}")
+    return img[None]
+
+
+def bench_space(image: np.ndarray, space: str, samples: int, seeds: int) -> dict:
+    node = ImagePaletteExtractor()
+    sampled = node._sample(node._frames_view(image, first_only=True), samples, 42, "random")
+    t0 = time.perf_counter()
+    _rgb_to_working(sampled, space)
+    convert_ms = (time.perf_counter() - t0) * 1e3
+    times, passes, palettes = [], [], []
+    for seed in range(seeds):
+        t0 = time.perf_counter()
+        data = json.loads(node.extract_palette(image, sample_max_pixels=samples, seed=seed, color_space=space,
+                                               use_cache=False)[0])
+        times.append((time.perf_counter() - t0) * 1e3)
+        passes.append(data["kmeans"]["n_iter"])
+        palettes.append(_rgb_to_lab(_parse_colors(data["colors"])))
+    drift = [palette_distance(a, b) for a, b in itertools.combinations(palettes, 2)]
+    return {
+        "convert_ms": round(convert_ms, 2),
+        "extract_ms": round(statistics.median(times), 1),
+        "n_iter": round(statistics.mean(passes), 1),
+        "drift_de": round(statistics.mean(drift), 2) if drift else 0.0,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--megapixels", type=float, default=1.0)
+    ap.add_argument("--kinds", type=lambda t: t.split(","), default=["gradient", "noisy"])
+    ap.add_argument("--samples", type=int, default=100_000)
+    ap.add_argument("--seeds", type=int, default=5)
+    ap.add_argument("--json", type=Path)
+    args = ap.parse_args()
+
+    results = []
+    for kind in args.kinds:
+        image = make_image(args.megapixels, kind)
+        for space in _COLOR_SPACES:
+            row = {"kind": kind, "color_space": space, **bench_space(image, space, args.samples, args.seeds)}
+            results.append(row)
+            print(f"{kind:<9} {space:<11} convert={row['convert_ms']:>7.2f}ms  extract={row['extract_ms']:>7.1f}ms  "
+                  f"n_iter={row['n_iter']:>5.1f}  drift={row['drift_de']:>5.2f} dE", flush=True)
+    if args.json:
+        args.json.write_text(json.dumps({"megapixels": args.megapixels, "samples": args.samples,
+                                         "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Per-stage benchmark of ImagePaletteExtractor: time and peak memory.
+
+    python benchmarks/bench_extractor.py [--megapixels 0.25,1,4,16] [--kinds striped,noisy]
+                                         [--samples 10000,100000,1000000] [--repeat 3] [--json out.json]
+    python benchmarks/bench_extractor.py --compare base.json new.json [--threshold 1.25] [--min-ms 1]
+
+Synthetic images only (no files, no network). For every image size / kind /
+sample_max_pixels it measures the pipeline stages on their own:
+  to_numpy     _to_numpy_rgb01 (full float64 copy of the first frame)
+  sample       _sample (random) on the uncopied frame view
+  rgb_to_lab   _rgb_to_lab on the samples
+  kmeans       _kmeans_fit, k=8, 15 passes
+  merge        _merge_close + _ensure_k
+  lab_to_rgb   _lab_to_rgb on the centers
+  extract      extract_palette end to end (cache off)
+  extract_torch  same with backend="torch", only when torch is installed
+Time is the median of --repeat runs; peak_kb is the tracemalloc peak of one
+extra run (NumPy reports its buffers to tracemalloc, torch does not).
+
+--compare prints new/base time ratios per stage and exits with status 1 when
+any ratio exceeds --threshold, so two commits can be checked in CI. Stages
+that take under --min-ms in both runs are shown but never flagged (timer noise).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from image_palette_extractor import (  # noqa: E402
+    ImagePaletteExtractor, _import_torch, _kmeans_fit, _lab_to_rgb, _rgb_to_lab,
+)
+
+torch = _import_torch()
+
+STAGES = ("to_numpy", "sample", "rgb_to_lab", "kmeans", "merge", "lab_to_rgb", "extract", "extract_torch")
+
+
+def make_image(megapixels: float, kind: str, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    side = int(round(np.sqrt(megapixels * 1e6)))
+    if kind == "striped":
+        colors = rng.random((8, 3)).astype(np.float32)
+        img = colors[np.arange(side) * 8 // side][:, None, :].repeat(side, axis=1)
+    elif kind == "noisy":
+        img = rng.random((side, side, 3), dtype=np.float32)
+    else:
+        raise ValueError(f"Unknown image kind: {kind}")
+    return img[None]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1e3)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ms": round(statistics.median(times), 3), "peak_kb": round(peak / 1024, 1)}
+
+
+def bench_case(image: np.ndarray, samples: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    node = ImagePaletteExtractor()
+    frames = node._frames_view(image, first_only=True)
+    sampled = node._sample(frames, samples, 42, "random")
+    lab = _rgb_to_lab(sampled)
+    fit = _kmeans_fit(lab, k=8, max_iter=15, seed=42)
+    counts = np.bincount(fit.labels[0], minlength=8).astype(np.int64)
+
+    def merge():
+        centers, n = node._merge_close(fit.centers[0], counts, threshold=6.0)
+        return node._ensure_k(centers, n, lab[0], 8, 42)
+
+    stages = {
+        "to_numpy": lambda: node._to_numpy_rgb01(image),
+        "sample": lambda: node._sample(frames, samples, 42, "random"),
+        "rgb_to_lab": lambda: _rgb_to_lab(sampled),
+        "kmeans": lambda: _kmeans_fit(lab, k=8, max_iter=15, seed=42),
+        "merge": merge,
+        "lab_to_rgb": lambda: _lab_to_rgb(fit.centers[0]),
+        "extract": lambda: node.extract_palette(image, sample_max_pixels=samples, use_cache=False),
+    }
+    if torch is not None:
+        tensor = torch.from_numpy(image)
+        stages["extract_torch"] = lambda: node.extract_palette(tensor, sample_max_pixels=samples,
+                                                               backend="torch", use_cache=False)
+    return {name: measure(fn, repeat) for name, fn in stages.items()}
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    results: List[Dict[str, object]] = []
+    for mp in args.megapixels:
+        for kind in args.kinds:
+            image = make_image(mp, kind)
+            for samples in args.samples:
+                stages = bench_case(image, samples, args.repeat)
+                results.append({"megapixels": mp, "kind": kind, "samples": samples, "stages": stages})
+                row = "  ".join(f"{s}={v['ms']:.1f}ms/{v['peak_kb'] / 1024:.1f}MB" for s, v in stages.items())
+                print(f"{mp:>5g} MP {kind:<8} samples={samples:<8} {row}", flush=True)
+            del image
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": None if torch is None else torch.__version__,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+
+def case_key(r: Dict[str, object]) -> str:
+    return f"{r['megapixels']:g}MP/{r['kind']}/{r['samples']}"
+
+
+def compare(base_path: Path, new_path: Path, threshold: float, min_ms: float) -> int:
+    base = json.loads(base_path.read_text())
+    new = json.loads(new_path.read_text())
+    base_cases = {case_key(r): r["stages"] for r in base["results"]}
+    print(f"{base.get('revision')} -> {new.get('revision')}  (ratio = new / base time)")
+    regressions = 0
+    for r in new["results"]:
+        old = base_cases.get(case_key(r))
+        if old is None:
+            continue
+        cells = []
+        for stage in STAGES:
+            if stage not in r["stages"] or stage not in old:
+                continue
+            new_ms, old_ms = r["stages"][stage]["ms"], old[stage]["ms"]
+            ratio = new_ms / max(old_ms, 1e-6)
+            flag = "!" if ratio > threshold and max(new_ms, old_ms) >= min_ms else ""
+            regressions += bool(flag)
+            cells.append(f"{stage}={ratio:.2f}{flag}")
+        print(f"{case_key(r):<24} " + "  ".join(cells))
+    if regressions:
+        print(f"{regressions} stage(s) slower than {threshold:g}x")
+    return 1 if regressions else 0
+
+
+def floats(text: str) -> List[float]:
+    return [float(v) for v in text.split(",") if v]
+
+
+def ints(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--megapixels", type=floats, default=[0.25, 1.0, 4.0, 16.0])
+    ap.add_argument("--kinds", type=lambda t: t.split(","), default=["striped", "noisy"])
+    ap.add_argument("--samples", type=ints, default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", type=Path, help="write results as JSON")
+    ap.add_argument("--compare", nargs=2, type=Path, metavar=("BASE", "NEW"), help="compare two result files")
+    ap.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    ap.add_argument("--min-ms", type=float, default=1.0, help="ignore stages faster than this in --compare")
+    args = ap.parse_args()
+
+    if args.compare:
+        sys.exit(compare(args.compare[0], args.compare[1], args.threshold, args.min_ms))
+    report = run(args)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
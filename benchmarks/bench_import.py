@@ -0,0 +1,94 @@
+"""Node registration cost: importing the package the way ComfyUI does.
+
+    python benchmarks/bench_import.py [--path /other/checkout] [--runs 5] [--json out.json]
+
+Every run is a fresh interpreter (after one untimed warm-up run that fills
+__pycache__). A stub `server` module stands in for ComfyUI's PromptServer so
+the routes can register. Two scenarios:
+  cold    nothing preloaded
+  comfy   NumPy, torch and aiohttp already imported (as inside ComfyUI)
+Reported per scenario (medians over the runs):
+  import_ms       `import <package>` plus the registration loop over
+                  NODE_CLASS_MAPPINGS
+  input_types_ms  first INPUT_TYPES() of every node (the /object_info request)
+  numpy / torch   whether the import alone loaded them
+Run it with --path against an older checkout to compare.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+_CHILD = r"""
+import importlib, json, sys, time, types
+root, preload = sys.argv[1], sys.argv[2] == "comfy"
+if preload:
+    import numpy, aiohttp.web
+    try:
+        import torch
+    except ImportError:
+        pass
+from aiohttp import web
+server = types.ModuleType("server")
+server.PromptServer = types.SimpleNamespace(instance=types.SimpleNamespace(routes=web.RouteTableDef()))
+sys.modules["server"] = server
+parent, name = root.rsplit("/", 1)
+sys.path.insert(0, parent)
+t0 = time.perf_counter()
+pkg = importlib.import_module(name)
+for cls in pkg.NODE_CLASS_MAPPINGS.values():
+    cls.RELATIVE_PYTHON_MODULE = "custom_nodes." + name
+import_ms = (time.perf_counter() - t0) * 1e3
+loaded = {"numpy": "numpy" in sys.modules, "torch": "torch" in sys.modules}
+t0 = time.perf_counter()
+for cls in pkg.NODE_CLASS_MAPPINGS.values():
+    cls.INPUT_TYPES()
+input_types_ms = (time.perf_counter() - t0) * 1e3
+print(json.dumps({"import_ms": import_ms, "input_types_ms": input_types_ms, **loaded}))
+"""
+
+
+def run_once(path: Path, scenario: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    out = subprocess.run([sys.executable, "-c", _CHILD, str(path), scenario], env=env, cwd=path.parent,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def bench(path: Path, scenario: str, runs: int) -> dict:
+    run_once(path, scenario)  # warm-up: bytecode cache
+    rows = [run_once(path, scenario) for _ in range(runs)]
+    return {
+        "import_ms": round(statistics.median(r["import_ms"] for r in rows), 1),
+        "input_types_ms": round(statistics.median(r["input_types_ms"] for r in rows), 1),
+        "numpy": rows[-1]["numpy"],
+        "torch": rows[-1]["torch"],
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--path", type=Path, default=Path(__file__).resolve().parent.parent)
+    ap.add_argument("--scenarios", type=lambda t: t.split(","), default=["cold", "comfy"])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--json", type=Path)
+    args = ap.parse_args()
+
+    path = args.path.resolve()
+    results = []
+    for scenario in args.scenarios:
+        row = {"scenario": scenario, **bench(path, scenario, args.runs)}
+        results.append(row)
+        print(f"{scenario:<6} import={row['import_ms']:>8.1f}ms  input_types={row['input_types_ms']:>7.1f}ms  "
+              f"numpy={row['numpy']!s:<5}  torch={row['torch']}", flush=True)
+    if args.json:
+        args.json.write_text(json.dumps({"path": str(path), "runs": args.runs, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Build and query time of PaletteIndex for growing numbers of palettes.
+
+    python benchmarks/bench_palette_index.py [--sizes 1000,10000,50000] [--queries 20] [--k 5]
+
+Random palettes of 5-8 colors. Reports the index build time, the median
+query time and how many candidates needed the exact assignment distance
+(the rest were pruned by the lower bound).
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import palette_index  # noqa: E402
+from palette_index import PaletteIndex  # noqa: E402
+
+
+def random_palettes(n: int, rng: np.random.Generator):
+    for i in range(n):
+        rgb = rng.integers(0, 256, size=(int(rng.integers(5, 9)), 3))
+        yield f"p{i:06d}", [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in rgb]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=lambda t: [int(v) for v in t.split(",") if v], default=[1000, 10_000, 50_000])
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--k", type=int, default=5)
+    args = ap.parse_args()
+
+    exact = palette_index.palette_distance
+    calls = [0]
+
+    def counted(a, b):
+        calls[0] += 1
+        return exact(a, b)
+
+    palette_index.palette_distance = counted
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        t0 = time.perf_counter()
+        index = PaletteIndex(random_palettes(n, rng))
+        build_ms = (time.perf_counter() - t0) * 1e3
+        times = []
+        calls[0] = 0
+        for q in random_palettes(args.queries, rng):
+            t0 = time.perf_counter()
+            index.query(q[1], args.k)
+            times.append((time.perf_counter() - t0) * 1e3)
+        print(f"{n:>7} palettes  build={build_ms:8.1f}ms  query={statistics.median(times):7.2f}ms  "
+              f"exact/query={calls[0] / args.queries:6.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
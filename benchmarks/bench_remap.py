@@ -0,0 +1,85 @@
+"""Throughput of PaletteRemap on 4K frames.
+
+    python benchmarks/bench_remap.py [--frames 4] [--size 3840x2160] [--colors 16] [--json out.json]
+
+The synthetic batch is a smooth RGB gradient with mild noise (video-like
+color coherence). Reports, per mode / dither:
+  build_ms   first call on a new palette (index table build; LUT modes only)
+  frame_ms   median time per frame of a batch remap with the table cached
+  mpix_s     megapixels per second
+Floyd-Steinberg runs on the first frame only (it is a sequential wavefront).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import palette_remap  # noqa: E402
+from palette_remap import PaletteRemap  # noqa: E402
+
+CASES = [
+    ("lut3d_8bit", "none"), ("lut3d_6bit", "none"), ("lut3d_8bit", "bayer8"),
+    ("exact", "none"), ("lut3d_8bit", "floyd_steinberg"),
+]
+
+
+def make_batch(frames: int, width: int, height: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([xx / width, yy / height, (xx + yy) / (width + height)], axis=-1)
+    out = np.empty((frames, height, width, 3), dtype=np.float32)
+    for i in range(frames):
+        out[i] = np.clip(base + rng.normal(0, 0.02, size=base.shape).astype(np.float32), 0, 1)
+    return out
+
+
+def make_palette(n: int, seed: int = 1) -> str:
+    rgb = np.random.default_rng(seed).integers(0, 256, size=(n, 3))
+    return json.dumps({"colors": [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in rgb]})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=4)
+    ap.add_argument("--size", default="3840x2160")
+    ap.add_argument("--colors", type=int, default=16)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", type=Path)
+    args = ap.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    batch = make_batch(args.frames, width, height)
+    palette = make_palette(args.colors)
+    node = PaletteRemap()
+    results = []
+    for mode, dither in CASES:
+        images = batch[:1] if dither == "floyd_steinberg" else batch
+        palette_remap._index_cache.clear()
+        t0 = time.perf_counter()
+        node.remap(images[:1, :1], palette, mode, dither)
+        build_ms = (time.perf_counter() - t0) * 1e3
+        times = []
+        for _ in range(1 if dither == "floyd_steinberg" else args.repeat):
+            t0 = time.perf_counter()
+            node.remap(images, palette, mode, dither)
+            times.append((time.perf_counter() - t0) * 1e3 / images.shape[0])
+        frame_ms = statistics.median(times)
+        row = {"mode": mode, "dither": dither, "build_ms": round(build_ms, 1), "frame_ms": round(frame_ms, 1),
+               "mpix_s": round(width * height / 1e6 / (frame_ms / 1e3), 1)}
+        results.append(row)
+        print(f"{mode:<11} {dither:<16} build={row['build_ms']:>8.1f}ms  frame={row['frame_ms']:>8.1f}ms  "
+              f"{row['mpix_s']:>7.1f} MP/s", flush=True)
+    if args.json:
+        args.json.write_text(json.dumps({"size": args.size, "colors": args.colors, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
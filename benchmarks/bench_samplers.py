@@ -0,0 +1,99 @@
+"""Compare ImagePaletteExtractor samplers: speed, palette stability and recall.
+
+    python benchmarks/bench_samplers.py [--megapixels 16] [--samples 100000] [--json out.json]
+
+The synthetic image is five broad noisy color bands plus three small (0.1% of
+the frame each) saturated patches. For each sampler it reports
+  sample_ms   time to draw the samples (the stage the sampler replaces)
+  total_ms    full extract_palette time
+  stability   mean CIE76 dE between palettes extracted with different seeds
+              (symmetric nearest-color distance; lower = more stable)
+  recall      fraction of the small patch colors found within 10 dE
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from color_hex import hex_to_rgb01  # noqa: E402
+from image_palette_extractor import ImagePaletteExtractor, _SAMPLERS, _rgb_to_lab  # noqa: E402
+
+PATCH_COLORS = np.array([[1.0, 0.85, 0.0], [0.0, 0.9, 1.0], [1.0, 0.0, 0.6]])
+
+
+def make_image(megapixels: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    side = int(round(np.sqrt(megapixels * 1e6)))
+    bands = rng.random((5, 3)) * 0.6 + 0.1
+    img = bands[np.arange(side) * len(bands) // side][None, :, :].repeat(side, axis=0)
+    img = img + rng.normal(0, 0.03, size=img.shape)
+    # small salient patches, each ~0.1% of the frame
+    patch = max(2, int(side * np.sqrt(0.001)))
+    for i, color in enumerate(PATCH_COLORS):
+        y = (i + 1) * side // (len(PATCH_COLORS) + 1)
+        img[y:y + patch, y:y + patch] = color
+    return np.clip(img, 0, 1).astype(np.float32)[None]
+
+
+def palette_lab(custom_json: str) -> np.ndarray:
+    hexes = json.loads(custom_json)["colors"]
+    return _rgb_to_lab(hex_to_rgb01(hexes))
+
+
+def chamfer(a: np.ndarray, b: np.ndarray) -> float:
+    d = np.linalg.norm(a[:, None] - b[None], axis=2)
+    return float((d.min(axis=1).mean() + d.min(axis=0).mean()) / 2)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--megapixels", type=float, default=16.0)
+    ap.add_argument("--samples", type=int, default=100_000)
+    ap.add_argument("--seeds", type=int, default=4)
+    ap.add_argument("--json", type=Path, help="write results as JSON")
+    args = ap.parse_args()
+
+    image = make_image(args.megapixels)
+    frames = ImagePaletteExtractor()._frames_view(image)
+    patches = _rgb_to_lab(PATCH_COLORS)
+    node = ImagePaletteExtractor()
+    results = []
+    for sampler in _SAMPLERS:
+        t0 = time.perf_counter()
+        node._sample(frames, args.samples, 0, sampler)
+        sample_ms = (time.perf_counter() - t0) * 1e3
+        palettes, totals = [], []
+        for seed in range(args.seeds):
+            t0 = time.perf_counter()
+            out = node.extract_palette(image, sample_max_pixels=args.samples, seed=seed, sampler=sampler, use_cache=False)[0]
+            totals.append((time.perf_counter() - t0) * 1e3)
+            palettes.append(palette_lab(out))
+        pairs = [chamfer(palettes[i], palettes[j]) for i in range(len(palettes)) for j in range(i + 1, len(palettes))]
+        recall = np.mean([
+            np.mean(np.linalg.norm(p[:, None] - patches[None], axis=2).min(axis=0) < 10.0) for p in palettes
+        ])
+        results.append({
+            "sampler": sampler,
+            "sample_ms": round(sample_ms, 2),
+            "total_ms": round(float(np.median(totals)), 2),
+            "stability_de": round(float(np.mean(pairs)) if pairs else 0.0, 3),
+            "recall": round(float(recall), 3),
+        })
+
+    print(f"{args.megapixels:g} MP, sample_max_pixels={args.samples}, {args.seeds} seeds")
+    print(f"{'sampler':<12}{'sample_ms':>10}{'total_ms':>10}{'stability':>11}{'recall':>8}")
+    for r in results:
+        print(f"{r['sampler']:<12}{r['sample_ms']:>10.1f}{r['total_ms']:>10.1f}{r['stability_de']:>11.3f}{r['recall']:>8.2f}")
+    if args.json:
+        args.json.write_text(json.dumps({"megapixels": args.megapixels, "samples": args.samples, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
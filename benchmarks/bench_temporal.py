@@ -0,0 +1,109 @@
+"""Palette extraction over video frames: cold per-frame runs vs PaletteTracker.
+
+    python benchmarks/bench_temporal.py [--frames 60] [--size 512] [--skip 0.05] [--json out.json]
+
+A synthetic clip (drifting color gradient + noise, a static stretch in the
+middle, a scene cut two thirds in) is processed frame by frame:
+  cold      extract_palette on every frame separately (k-means++ each time,
+            cache off), as a frame loop did before batch_mode="temporal"
+  temporal  one PaletteTracker: warm-started k-means, histogram skip, stable slots
+Reported per mode:
+  ms_frame  mean wall time per frame
+  n_iter    mean k-means passes per clustered frame
+  skipped   frames that reused the previous palette
+  flicker   mean dE (Lab, slot by slot) between consecutive palettes,
+            excluding the cut; lower = steadier slots
+  inertia   k-means inertia of the clustered frames relative to the cold
+            run on the same frame (mean ratio; <= 1 = fits at least as well)
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_palette_extractor import ImagePaletteExtractor, _rgb_to_lab  # noqa: E402
+from palette_index import _parse_colors  # noqa: E402
+from palette_tracker import PaletteTracker  # noqa: E402
+
+
+def make_clip(frames: int, size: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    still = range(frames // 3, frames // 3 + frames // 6)
+    cut = 2 * frames // 3
+    out = np.empty((frames, size, size, 3), dtype=np.float32)
+    t = 0.0
+    for i in range(frames):
+        if i not in still:
+            t += 0.01
+        if i < cut:
+            img = np.stack([xx * 0.8 + 0.1 * np.sin(t), yy, 0.5 + 0.4 * np.sin(xx * 6 + t * 3)], axis=-1)
+        else:
+            img = np.stack([0.3 + 0.3 * yy, 0.6 - 0.4 * xx + 0.05 * np.sin(t), 0.2 + 0.2 * (xx + yy)], axis=-1)
+        img += rng.normal(0, 0.02, size=img.shape).astype(np.float32)
+        out[i] = np.clip(img, 0, 1)
+    return out
+
+
+def flicker(palettes, skip):
+    lab = [_rgb_to_lab(_parse_colors(p)) for p in palettes]
+    d = [np.sqrt(((a - b) ** 2).sum(-1)).mean() for i, (a, b) in enumerate(zip(lab, lab[1:])) if i + 1 != skip]
+    return float(np.mean(d))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=60)
+    ap.add_argument("--size", type=int, default=512)
+    ap.add_argument("--skip", type=float, default=0.05)
+    ap.add_argument("--json", type=Path)
+    args = ap.parse_args()
+
+    clip = make_clip(args.frames, args.size)
+    cut = 2 * args.frames // 3
+    node = ImagePaletteExtractor()
+    cold, cold_iter, cold_ms, cold_inertia = [], [], [], []
+    for frame in clip:
+        t0 = time.perf_counter()
+        data = json.loads(node.extract_palette(frame[None], use_cache=False)[0])
+        cold_ms.append((time.perf_counter() - t0) * 1e3)
+        cold.append(data["colors"])
+        cold_iter.append(data["kmeans"]["n_iter"])
+        cold_inertia.append(data["kmeans"]["inertia"])
+
+    tracker = PaletteTracker(skip_delta=args.skip)
+    temporal, temporal_ms, ratio = [], [], []
+    for i, frame in enumerate(clip):
+        skipped = tracker.skipped
+        t0 = time.perf_counter()
+        temporal.append(tracker.update(frame))
+        temporal_ms.append((time.perf_counter() - t0) * 1e3)
+        if tracker.skipped == skipped:
+            ratio.append(tracker.inertia / cold_inertia[i])
+    clustered = tracker.frames - tracker.skipped
+
+    results = [
+        {"mode": "cold", "ms_frame": round(statistics.mean(cold_ms), 2), "n_iter": round(statistics.mean(cold_iter), 1),
+         "skipped": 0, "flicker": round(flicker(cold, cut), 2), "inertia": 1.0},
+        {"mode": "temporal", "ms_frame": round(statistics.mean(temporal_ms), 2),
+         "n_iter": round(tracker.n_iter / max(1, clustered), 1), "skipped": tracker.skipped,
+         "flicker": round(flicker(temporal, cut), 2), "inertia": round(statistics.mean(ratio), 3)},
+    ]
+    for row in results:
+        print(f"{row['mode']:<9} {row['ms_frame']:>7.2f}ms/frame  n_iter={row['n_iter']:>5.1f}  "
+              f"skipped={row['skipped']:>3}/{args.frames}  flicker={row['flicker']:>5.2f} dE  inertia={row['inertia']:.3f}")
+    if args.json:
+        args.json.write_text(json.dumps({"frames": args.frames, "size": args.size, "skip_delta": args.skip,
+                                         "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Tiled / masked palette extraction vs extracting every crop separately.
+
+    python benchmarks/bench_tiles.py [--megapixels 4] [--grids 2,4,8] [--repeat 3] [--json out.json]
+
+Per tile_rows x tile_cols grid (square) on a noisy gradient image:
+  crops   extract_palette on the whole frame, then once per tile crop with
+          sample_max_pixels / tiles samples (sampling + Lab per crop)
+  tiles   one extract_palette(tile_rows=..., tile_cols=...) call: the frame is
+          sampled and converted once, tiles cluster in parallel threads
+and, for a mask covering a quarter of the frame:
+  crop    extract_palette on the bounding crop (the mask is a rectangle)
+  mask    extract_palette(mask=...)
+Times are medians over --repeat runs with the result cache off.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_palette_extractor import ImagePaletteExtractor  # noqa: E402
+
+
+def make_image(megapixels: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    side = int(round(np.sqrt(megapixels * 1e6)))
+    yy, xx = np.mgrid[0:side, 0:side].astype(np.float32) / side
+    img = np.stack([xx, yy, 1 - (xx + yy) / 2], axis=-1)
+    return np.clip(img + rng.normal(0, 0.05, size=img.shape).astype(np.float32), 0, 1)[None]
+
+
+def timed(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1e3)
+    return statistics.median(times)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--megapixels", type=float, default=4.0)
+    ap.add_argument("--grids", type=lambda t: [int(g) for g in t.split(",")], default=[2, 4, 8])
+    ap.add_argument("--samples", type=int, default=100_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", type=Path)
+    args = ap.parse_args()
+
+    node = ImagePaletteExtractor()
+    image = make_image(args.megapixels)
+    _, H, W, _ = image.shape
+    opts = dict(sample_max_pixels=args.samples, use_cache=False)
+    results = []
+    for g in args.grids:
+        per_tile = max(1000, args.samples // (g * g))
+
+        def crops():
+            node.extract_palette(image, **opts)
+            for r in range(g):
+                for c in range(g):
+                    crop = image[:, r * H // g:(r + 1) * H // g, c * W // g:(c + 1) * W // g]
+                    node.extract_palette(crop, sample_max_pixels=per_tile, use_cache=False)
+
+        row = {"grid": g, "crops_ms": round(timed(crops, args.repeat), 1),
+               "tiles_ms": round(timed(lambda: node.extract_palette(image, tile_rows=g, tile_cols=g, **opts),
+                                       args.repeat), 1)}
+        results.append(row)
+        print(f"{g}x{g} tiles  crops={row['crops_ms']:>8.1f}ms  tiles={row['tiles_ms']:>8.1f}ms", flush=True)
+
+    mask = np.zeros((H, W), dtype=np.float32)
+    mask[:H // 2, :W // 2] = 1.0
+    crop_ms = timed(lambda: node.extract_palette(image[:, :H // 2, :W // 2], **opts), args.repeat)
+    mask_ms = timed(lambda: node.extract_palette(image, mask=mask, **opts), args.repeat)
+    print(f"quarter mask  crop={crop_ms:>8.1f}ms  mask={mask_ms:>8.1f}ms")
+    if args.json:
+        args.json.write_text(json.dumps({"megapixels": args.megapixels, "samples": args.samples, "grids": results,
+                                         "mask": {"crop_ms": round(crop_ms, 1), "mask_ms": round(mask_ms, 1)}},
+                                        indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+# Vectorized "#RRGGBB" / "#RRGGBBAA" <-> array conversion.
+#
+# Parsing encodes the strings into one fixed-width byte array and validates
+# every character at once through a 256-entry byte -> nibble table (-1 for
+# anything that is not a hex digit), so there is no per-character Python loop
+# and no regex. Formatting writes the digits through a 16-entry table into a
+# (n, 7|9) byte array and decodes it in one step.
+
+_DIGITS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+_NIBBLE = np.full(256, -1, dtype=np.int16)
+_NIBBLE[_DIGITS] = np.arange(16)
+_NIBBLE[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
+_HASH = ord("#")
+
+
+def _encode(colors: Iterable) -> np.ndarray:
+    # strings -> (n, 10) uint8, NUL padded; non-strings become empty rows.
+    # Anything longer than "#RRGGBBAA" is invalid, so 10 bytes are enough to tell.
+    encoded = [c.strip().encode("utf-8")[:10] if isinstance(c, str) else b"" for c in colors]
+    return np.array(encoded, dtype="S10").view(np.uint8).reshape(len(encoded), 10)
+
+
+def parse_hex(colors: Iterable, alpha: bool = False, require_hash: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse hex color strings.
+
+    Returns (values, valid): values is (n, 3) uint8 RGB, or (n, 4) RGBA when
+    alpha is True ("#RRGGBBAA" is then accepted too, "#RRGGBB" gets 255);
+    valid is the (n,) bool mask of well-formed entries (invalid rows are 0).
+    Surrounding whitespace and either case are accepted. With
+    require_hash=False the leading "#" is optional.
+    """
+    buf = _encode(colors)
+    has_hash = buf[:, 0] == _HASH
+    digits = np.where(has_hash[:, None], buf[:, 1:9], buf[:, :8])
+    length = np.count_nonzero(buf, axis=1) - has_hash
+    nib = _NIBBLE[digits]
+    ok = nib >= 0
+    valid = (length == 6) & ok[:, :6].all(axis=1)
+    valid8 = (length == 8) & ok.all(axis=1) if alpha else np.zeros_like(valid)
+    valid |= valid8
+    if require_hash:
+        valid &= has_hash
+    nib = np.where(ok, nib, 0).astype(np.uint8)
+    values = (nib[:, 0::2] << 4) | nib[:, 1::2]
+    if alpha:
+        values[~valid8, 3] = 255
+    else:
+        values = np.ascontiguousarray(values[:, :3])
+    values[~valid] = 0
+    return values, valid
+
+
+def hex_to_rgb8(colors: Iterable, alpha: bool = False, require_hash: bool = True) -> np.ndarray:
+    """The valid entries of colors as (m, 3|4) uint8 (invalid ones are dropped)."""
+    values, valid = parse_hex(colors, alpha=alpha, require_hash=require_hash)
+    return values[valid]
+
+
+def hex_to_rgb01(colors: Iterable, alpha: bool = False, require_hash: bool = True) -> np.ndarray:
+    """The valid entries of colors as (m, 3|4) float64 in 0..1."""
+    return hex_to_rgb8(colors, alpha=alpha, require_hash=require_hash) / 255.0
+
+
+# bytes that can be part of a hex code; everything else separates tokens
+_TOKEN_BYTES = bytes(range(256)).translate(
+    bytes.maketrans(b"", b""), b"0123456789ABCDEFabcdef#")
+_SEPARATORS = bytes.maketrans(_TOKEN_BYTES, b" " * len(_TOKEN_BYTES))
+
+
+def find_hex(text: str, alpha: bool = False) -> np.ndarray:
+    """Every hex color written anywhere in free text ("#FF0000, 00ff00 ...")
+    as (m, 3|4) uint8, in order. The "#" is optional; tokens that are not
+    exactly 6 (or 8 with alpha) hex digits are skipped.
+    """
+    data = (text or "").encode("utf-8").translate(_SEPARATORS).replace(b"#", b" #")
+    return hex_to_rgb8([t.decode("ascii") for t in data.split()], alpha=alpha, require_hash=False)
+
+
+def is_hex(colors: Iterable, alpha: bool = False, require_hash: bool = True) -> np.ndarray:
+    return parse_hex(colors, alpha=alpha, require_hash=require_hash)[1]
+
+
+def rgb8_to_hex(values) -> List[str]:
+    """(n, 3) or (n, 4) integers -> "#RRGGBB" / "#RRGGBBAA" strings (clamped to 0..255).
+
+    A single color ((3,) or (4,)) gives a one-element list.
+    """
+    v = np.atleast_2d(np.clip(np.asarray(values), 0, 255).astype(np.uint8))
+    if v.ndim != 2 or v.shape[1] not in (3, 4):
+        raise ValueError("Expected 3 (RGB) or 4 (RGBA) channels")
+    out = np.empty((v.shape[0], 1 + 2 * v.shape[1]), dtype=np.uint8)
+    out[:, 0] = _HASH
+    out[:, 1::2] = _DIGITS[v >> 4]
+    out[:, 2::2] = _DIGITS[v & 15]
+    return out.view(f"S{out.shape[1]}").ravel().astype(str).tolist()
+
+
+def rgb01_to_rgb8(rgb) -> np.ndarray:
+    # round half to even like int(np.round(x * 255)), then clamp
+    return np.clip(np.rint(np.asarray(rgb, dtype=np.float64) * 255.0), 0, 255).astype(np.uint8)
+
+
+def rgb01_to_hex(rgb) -> List[str]:
+    """(n, 3|4) floats in 0..1 -> hex strings (see rgb8_to_hex)."""
+    return rgb8_to_hex(rgb01_to_rgb8(rgb))
@@ -5,6 +5,13 @@ import os
 from pathlib import Path
 from typing import Tuple
 
+try:
+    from .lazy_import import load_module
+    from .palette_registry import get_registry, preset_names
+except ImportError:  # loaded as a top-level module (tests)
+    from lazy_import import load_module  # type: ignore
+    from palette_registry import get_registry, preset_names  # type: ignore
+
 
 class ColorPalette:
     """
@@ -15,19 +22,22 @@ class ColorPalette:
     - Output: color_0 ~ color_7 (各 #RRGGBB)
     - Category: TJnodes/color
 
-    パレットは palettes/ フォルダの JSON から読み込み。
+    パレットは palettes/ フォルダ (+ TJ_COLORUTIL_PALETTE_DIRS) の JSON から読み込み。
+    読み込みはプロセス共通の palette_registry が一度だけ行い、以降の参照はメモリのみ。
     custom 選択時は custom_json の内容を直接使用。
     """
 
     def __init__(self):
         self.palettes_dir = Path(__file__).parent / "palettes"
-        self._palette_cache = {}
+        self._registry = get_registry()
+        # 旧キャッシュ名。clear() でレジストリを破棄し、次回参照時に再読み込み
+        self._palette_cache = self._registry
 
     @classmethod
     def INPUT_TYPES(cls):
-        # palettes/ から利用可能なプリセットを列挙 + custom
-        instance = cls()
-        presets = instance.list_presets()
+        # 利用可能なプリセットを列挙 + custom
+        # ノード登録時はレジストリを構築せず、キャッシュ済みの名前インデックスを使う
+        presets = preset_names() or ["primary"]
         if "custom" not in presets:
             presets.append("custom")
         return {
@@ -43,59 +53,31 @@ class ColorPalette:
     CATEGORY = "TJnodes/color"
 
     def list_presets(self) -> list[str]:
-        """palettes/ 内の .json ファイルから利用可能なプリセット名を返す"""
-        if not self.palettes_dir.exists():
-            return ["primary"]
-        
-        presets = []
-        for file in self.palettes_dir.glob("*.json"):
-            presets.append(file.stem)
-        return sorted(presets) if presets else ["primary"]
+        """利用可能なプリセット名を返す (レジストリのインデックスから、ファイル走査なし)"""
+        presets = self._registry.names()
+        return presets if presets else ["primary"]
 
     def load_palette(self, preset_name: str) -> list[str]:
-        """指定プリセットの色リストを返す。キャッシュ利用。"""
-        if preset_name in self._palette_cache:
-            return self._palette_cache[preset_name]
-        
-        palette_file = self.palettes_dir / f"{preset_name}.json"
-        if not palette_file.exists():
+        """指定プリセットの色リストを返す。レジストリ参照のみ (読み込み失敗・未登録はグレー階調)。"""
+        colors = self._registry.get(preset_name)
+        if colors is None:
             # フォールバック: 基本8色 (モノクログラデーション)
-            fallback = [f"#{i*32:02X}{i*32:02X}{i*32:02X}" for i in range(8)]
-            return fallback
-        
-        try:
-            with open(palette_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                colors = data.get("colors", [])
-                # 8色に満たない場合は #000000 で埋める
-                while len(colors) < 8:
-                    colors.append("#000000")
-                # 8色超過は切り捨て
-                colors = colors[:8]
-                self._palette_cache[preset_name] = colors
-                return colors
-        except Exception as e:
-            print(f"[ColorPalette] Error loading {preset_name}: {e}")
-            # エラー時フォールバック
             return [f"#{i*32:02X}{i*32:02X}{i*32:02X}" for i in range(8)]
+        # 8色に満たない場合は #000000 で埋める / 8色超過は切り捨て
+        while len(colors) < 8:
+            colors.append("#000000")
+        return colors[:8]
 
     def _parse_custom(self, custom_json: str) -> list[str]:
         """custom_json 文字列を解析して #RRGGBB リスト(最大8)を返す。失敗時はグレー階調。"""
         try:
             data = json.loads(custom_json)
             raw = data.get("colors", [])
-            colors: list[str] = []
-            for c in raw:
-                if not isinstance(c, str):
-                    continue
-                c = c.strip()
-                if len(c) == 7 and c.startswith("#"):
-                    # 16進検証
-                    h = c[1:]
-                    if all(ch in "0123456789abcdefABCDEF" for ch in h):
-                        colors.append("#" + h.upper())
-                if len(colors) >= 8:
-                    break
+            # 16進検証は color_hex でまとめて行い、有効な #RRGGBB のみ大文字で採用
+            # (color_hex は NumPy を使うため初回実行時に読み込む)
+            color_hex = load_module("color_hex")
+            values, valid = color_hex.parse_hex(raw)
+            colors = color_hex.rgb8_to_hex(values[valid][:8])
             while len(colors) < 8:
                 colors.append("#000000")
             return colors[:8]
@@ -110,3 +92,4 @@ class ColorPalette:
         else:
             colors = self.load_palette(preset)
         return tuple(colors)
+
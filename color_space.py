@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Color space conversion kernels for (..., 3) arrays.
+#
+# convert(x, src, dst, out=None) walks the shortest path through
+#   srgb <-> linear <-> xyz <-> lab <-> lch
+#             linear <-> oklab <-> oklch
+# and runs every step on chunks of _CHUNK pixels with two scratch buffers and
+# one mask allocated once per call, so a call allocates the same few buffers
+# whatever the array size (plus the output unless out= is given; out may be x
+# itself for an in-place conversion). float32 input is computed in float32,
+# everything else in float64. Out-of-range values are not clipped.
+#
+# sRGB/XYZ/Lab use the same constants (D65, sRGB matrices) as the original
+# helpers in image_palette_extractor; OKLab follows Ottosson (2020).
+
+SPACES = ("srgb", "linear", "xyz", "lab", "lch", "oklab", "oklch")
+
+# Pixels per chunk: the working set (input, output, 2 scratch, mask) of a
+# float64 chunk is ~0.5 MB and stays in L2
+_CHUNK = 1 << 13
+
+_WHITE = np.array([0.95047, 1.00000, 1.08883])
+_EPS = (6 / 29) ** 3
+_K = (29 / 6) ** 2 / 3
+
+_MATRICES: Dict[str, np.ndarray] = {
+    # linear sRGB -> XYZ and the inverse used by _lab_to_rgb
+    "rgb_xyz": np.array([
+        [0.4124564, 0.3575761, 0.1804375],
+        [0.2126729, 0.7151522, 0.0721750],
+        [0.0193339, 0.1191920, 0.9503041],
+    ]),
+    "xyz_rgb": np.array([
+        [3.2404542, -1.5371385, -0.4985314],
+        [-0.9692660, 1.8760108, 0.0415560],
+        [0.0556434, -0.2040259, 1.0572252],
+    ]),
+    # f(X/Xn), f(Y/Yn), f(Z/Zn) -> L + 16, a, b and back
+    "f_lab": np.array([[0.0, 116.0, 0.0], [500.0, -500.0, 0.0], [0.0, 200.0, -200.0]]),
+    "lab_f": np.array([[1 / 116, 1 / 500, 0.0], [1 / 116, 0.0, 0.0], [1 / 116, 0.0, -1 / 200]]),
+    # OKLab: linear sRGB -> LMS, cube-rooted LMS -> Lab
+    "rgb_lms": np.array([
+        [0.4122214708, 0.5363325363, 0.0514459929],
+        [0.2119034982, 0.6806995451, 0.1073969566],
+        [0.0883024619, 0.2817188376, 0.6299787005],
+    ]),
+    "lms_oklab": np.array([
+        [0.2104542553, 0.7936177850, -0.0040720468],
+        [1.9779984951, -2.4285922050, 0.4505937099],
+        [0.0259040371, 0.7827717662, -0.8086757660],
+    ]),
+}
+_MATRICES["lms_rgb"] = np.linalg.inv(_MATRICES["rgb_lms"])
+_MATRICES["oklab_lms"] = np.linalg.inv(_MATRICES["lms_oklab"])
+
+
+@lru_cache(maxsize=None)
+def _mat(name: str, dtype: np.dtype) -> np.ndarray:
+    # transposed, for row-vector (n,3) @ M.T products
+    return np.ascontiguousarray(_MATRICES[name].T, dtype=dtype)
+
+
+@lru_cache(maxsize=None)
+def _vec(name: str, dtype: np.dtype) -> np.ndarray:
+    return {"white": _WHITE, "inv_white": 1.0 / _WHITE}[name].astype(dtype)
+
+
+# Kernels: (x, o, s0, s1, m) with x, o, s0, s1 (n,3) float and m (n,3) bool
+# ((n,1) for the elementwise sRGB transfer functions on other shapes).
+# o may be x; s0/s1/m are scratch.
+
+def _srgb_linear(x, o, s0, s1, m):
+    np.greater(x, 0.04045, out=m)
+    np.maximum(x, 0.04045, out=s0)
+    s0 += 0.055
+    s0 *= 1 / 1.055
+    np.power(s0, 2.4, out=s0)
+    np.multiply(x, 1 / 12.92, out=o)
+    np.copyto(o, s0, where=m)
+
+
+def _linear_srgb(x, o, s0, s1, m):
+    np.greater(x, 0.0031308, out=m)
+    np.maximum(x, 0.0031308, out=s0)
+    np.power(s0, 1 / 2.4, out=s0)
+    s0 *= 1.055
+    s0 -= 0.055
+    np.multiply(x, 12.92, out=o)
+    np.copyto(o, s0, where=m)
+
+
+def _matmul(name: str):
+    def kernel(x, o, s0, s1, m):
+        np.matmul(x, _mat(name, o.dtype), out=s0)
+        np.copyto(o, s0)
+    return kernel
+
+
+def _xyz_lab(x, o, s0, s1, m):
+    np.multiply(x, _vec("inv_white", o.dtype), out=s0)
+    np.less_equal(s0, _EPS, out=m)
+    np.multiply(s0, _K, out=s1)
+    s1 += 4 / 29
+    np.cbrt(s0, out=s0)
+    np.copyto(s0, s1, where=m)
+    np.matmul(s0, _mat("f_lab", o.dtype), out=o)
+    o[:, 0] -= 16.0
+
+
+def _lab_xyz(x, o, s0, s1, m):
+    np.copyto(s0, x)
+    s0[:, 0] += 16.0
+    np.matmul(s0, _mat("lab_f", o.dtype), out=s1)
+    np.greater(s1, 6 / 29, out=m)
+    np.multiply(s1, s1, out=s0)
+    s0 *= s1
+    s1 -= 4 / 29
+    s1 *= 3 * (6 / 29) ** 2
+    np.copyto(s1, s0, where=m)
+    np.multiply(s1, _vec("white", o.dtype), out=o)
+
+
+def _linear_oklab(x, o, s0, s1, m):
+    np.matmul(x, _mat("rgb_lms", o.dtype), out=s0)
+    np.cbrt(s0, out=s0)
+    np.matmul(s0, _mat("lms_oklab", o.dtype), out=o)
+
+
+def _oklab_linear(x, o, s0, s1, m):
+    np.matmul(x, _mat("oklab_lms", o.dtype), out=s0)
+    np.multiply(s0, s0, out=s1)
+    s1 *= s0
+    np.matmul(s1, _mat("lms_rgb", o.dtype), out=o)
+
+
+def _lab_lch(x, o, s0, s1, m):
+    # works for Lab -> LCh and OKLab -> OKLCh; hue in degrees [0, 360)
+    np.hypot(x[:, 1], x[:, 2], out=s0[:, 0])
+    np.arctan2(x[:, 2], x[:, 1], out=s0[:, 1])
+    np.degrees(s0[:, 1], out=s0[:, 1])
+    np.mod(s0[:, 1], 360.0, out=s0[:, 1])
+    np.copyto(o[:, 0], x[:, 0])
+    np.copyto(o[:, 1:], s0[:, :2])
+
+
+def _lch_lab(x, o, s0, s1, m):
+    np.radians(x[:, 2], out=s0[:, 0])
+    np.cos(s0[:, 0], out=s0[:, 1])
+    np.sin(s0[:, 0], out=s0[:, 2])
+    s0[:, 1] *= x[:, 1]
+    s0[:, 2] *= x[:, 1]
+    np.copyto(o[:, 0], x[:, 0])
+    np.copyto(o[:, 1:], s0[:, 1:])
+
+
+_Kernel = Callable[..., None]
+
+_EDGES: Dict[Tuple[str, str], _Kernel] = {
+    ("srgb", "linear"): _srgb_linear,
+    ("linear", "srgb"): _linear_srgb,
+    ("linear", "xyz"): _matmul("rgb_xyz"),
+    ("xyz", "linear"): _matmul("xyz_rgb"),
+    ("xyz", "lab"): _xyz_lab,
+    ("lab", "xyz"): _lab_xyz,
+    ("lab", "lch"): _lab_lch,
+    ("lch", "lab"): _lch_lab,
+    ("linear", "oklab"): _linear_oklab,
+    ("oklab", "linear"): _oklab_linear,
+    ("oklab", "oklch"): _lab_lch,
+    ("oklch", "oklab"): _lch_lab,
+}
+
+
+# steps that act on each value independently (any array shape is accepted)
+_ELEMENTWISE = (_srgb_linear, _linear_srgb)
+
+
+@lru_cache(maxsize=None)
+def _path(src: str, dst: str) -> Tuple[_Kernel, ...]:
+    for space in (src, dst):
+        if space not in SPACES:
+            raise ValueError(f"Unknown color space: {space} (expected one of {', '.join(SPACES)})")
+    prev: Dict[str, Optional[str]] = {src: None}
+    queue = deque([src])
+    while queue:
+        node = queue.popleft()
+        for a, b in _EDGES:
+            if a == node and b not in prev:
+                prev[b] = a
+                queue.append(b)
+    hops: List[_Kernel] = []
+    node = dst
+    while prev[node] is not None:
+        hops.append(_EDGES[(prev[node], node)])
+        node = prev[node]
+    return tuple(reversed(hops))
+
+
+def convert(x, src: str, dst: str, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Convert a (..., 3) array from color space src to dst (see SPACES).
+
+    out: optional C-contiguous float32/float64 array of the same shape to
+    write into; may be x itself. srgb <-> linear accept any shape.
+    """
+    steps = _path(src, dst)
+    x = np.asarray(x)
+    width = 3 if x.shape[-1:] == (3,) else 1
+    if width != 3 and not all(step in _ELEMENTWISE for step in steps):
+        raise ValueError("Expected last dimension=3")
+    if out is None:
+        out = np.empty(x.shape, dtype=np.float32 if x.dtype == np.float32 else np.float64)
+    elif out.shape != x.shape or out.dtype not in (np.float32, np.float64) or not out.flags.c_contiguous:
+        raise ValueError("out must be a C-contiguous float32/float64 array shaped like x")
+    if not steps:
+        np.copyto(out, x)
+        return out
+    src_flat = x.reshape(-1, width)
+    dst_flat = out.reshape(-1, width)
+    n = src_flat.shape[0]
+    size = max(1, min(n, _CHUNK * 3 // width))
+    scratch = np.empty((2, size, width), dtype=out.dtype)
+    mask = np.empty((size, width), dtype=bool)
+    for s in range(0, n, size):
+        e = min(n, s + size)
+        k = e - s
+        xi, oi = src_flat[s:e], dst_flat[s:e]
+        s0, s1, m = scratch[0, :k], scratch[1, :k], mask[:k]
+        steps[0](xi, oi, s0, s1, m)
+        for step in steps[1:]:
+            step(oi, oi, s0, s1, m)
+    return out
+
+
+def srgb_to_linear(x, out=None):
+    return convert(x, "srgb", "linear", out)
+
+
+def linear_to_srgb(x, out=None):
+    return convert(x, "linear", "srgb", out)
+
+
+def linear_to_xyz(x, out=None):
+    return convert(x, "linear", "xyz", out)
+
+
+def xyz_to_linear(x, out=None):
+    return convert(x, "xyz", "linear", out)
+
+
+def xyz_to_lab(x, out=None):
+    return convert(x, "xyz", "lab", out)
+
+
+def lab_to_xyz(x, out=None):
+    return convert(x, "lab", "xyz", out)
+
+
+def srgb_to_lab(x, out=None):
+    return convert(x, "srgb", "lab", out)
+
+
+def lab_to_srgb(x, out=None):
+    return convert(x, "lab", "srgb", out)
+
+
+def srgb_to_oklab(x, out=None):
+    return convert(x, "srgb", "oklab", out)
+
+
+def oklab_to_srgb(x, out=None):
+    return convert(x, "oklab", "srgb", out)
+
+
+def lab_to_lch(x, out=None):
+    return convert(x, "lab", "lch", out)
+
+
+def lch_to_lab(x, out=None):
+    return convert(x, "lch", "lab", out)
@@ -1,132 +1,582 @@
 from __future__ import annotations
 
 import json
-from typing import Tuple, List
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Tuple, List, NamedTuple, Optional
 
 import math
 import numpy as np
 
 try:
-    import torch  # type: ignore
-except Exception:  # pragma: no cover
-    torch = None  # type: ignore
+    from . import color_space, palette_cache, palette_metrics
+    from .color_hex import rgb01_to_hex
+except ImportError:  # loaded as a top-level module (tests)
+    import color_space  # type: ignore
+    from color_hex import rgb01_to_hex  # type: ignore
+    import palette_cache  # type: ignore
+    import palette_metrics  # type: ignore
+
+
+def _loaded_torch():
+    # torch if something already imported it. An IMAGE can only be a tensor
+    # then, so type checks never need to import torch themselves.
+    return sys.modules.get("torch")
+
+
+@lru_cache(maxsize=1)
+def _import_torch():
+    # explicit backend="torch": import on first use (None if unavailable)
+    try:
+        import torch  # type: ignore
+    except Exception:  # pragma: no cover
+        return None
+    return torch
 
 
 def _srgb_to_linear(c: np.ndarray) -> np.ndarray:
-    mask = c <= 0.04045
-    out = np.empty_like(c)
-    out[mask] = c[mask] / 12.92
-    out[~mask] = ((c[~mask] + 0.055) / 1.055) ** 2.4
-    return out
+    return color_space.srgb_to_linear(np.asarray(c, dtype=np.float64))
 
 
 def _linear_to_srgb(c: np.ndarray) -> np.ndarray:
-    mask = c <= 0.0031308
-    out = np.empty_like(c)
-    out[mask] = 12.92 * c[mask]
-    out[~mask] = 1.055 * (np.maximum(c[~mask], 0) ** (1 / 2.4)) - 0.055
-    return out
+    return color_space.linear_to_srgb(np.asarray(c, dtype=np.float64))
 
 
 def _rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
-    # rgb 0..1, shape (N,3)
-    rgb_lin = _srgb_to_linear(np.clip(rgb, 0, 1))
-    M = np.array([
-        [0.4124564, 0.3575761, 0.1804375],
-        [0.2126729, 0.7151522, 0.0721750],
-        [0.0193339, 0.1191920, 0.9503041],
-    ], dtype=np.float64)
-    xyz = rgb_lin @ M.T
-    # D65 white
-    Xn, Yn, Zn = 0.95047, 1.00000, 1.08883
-    x = xyz[:, 0] / Xn
-    y = xyz[:, 1] / Yn
-    z = xyz[:, 2] / Zn
-    eps = (6 / 29) ** 3
-    k = (29 / 3) ** 2 / 3
-    fx = np.where(x > eps, np.cbrt(x), k * x + 4 / 29)
-    fy = np.where(y > eps, np.cbrt(y), k * y + 4 / 29)
-    fz = np.where(z > eps, np.cbrt(z), k * z + 4 / 29)
-    L = 116 * fy - 16
-    a = 500 * (fx - fy)
-    b = 200 * (fy - fz)
-    return np.stack([L, a, b], axis=1)
+    # rgb 0..1, shape (..., 3) -> float64 Lab
+    rgb = np.asarray(rgb)
+    out = np.clip(rgb, 0, 1, out=np.empty(rgb.shape, dtype=np.float64))
+    return color_space.srgb_to_lab(out, out=out)
+
+
+def _linear_to_lab(rgb_lin: np.ndarray) -> np.ndarray:
+    out = np.array(rgb_lin, dtype=np.float64)
+    return color_space.convert(out, "linear", "lab", out=out)
 
 
 def _lab_to_rgb(lab: np.ndarray) -> np.ndarray:
-    # lab shape (N,3)
-    L, a, b = lab[:, 0], lab[:, 1], lab[:, 2]
-    fy = (L + 16) / 116
-    fx = a / 500 + fy
-    fz = fy - b / 200
-    eps = (6 / 29) ** 3
-    Xn, Yn, Zn = 0.95047, 1.00000, 1.08883
-    def f_inv(t):
-        return np.where(t ** 3 > eps, t ** 3, (t - 4 / 29) * (3 * (6 / 29) ** 2))
-    x = f_inv(fx) * Xn
-    y = f_inv(fy) * Yn
-    z = f_inv(fz) * Zn
-    M_inv = np.array([
-        [ 3.2404542, -1.5371385, -0.4985314],
-        [-0.9692660,  1.8760108,  0.0415560],
-        [ 0.0556434, -0.2040259,  1.0572252],
-    ], dtype=np.float64)
-    rgb_lin = np.stack([x, y, z], axis=1) @ M_inv.T
-    rgb = _linear_to_srgb(np.clip(rgb_lin, 0, None))
-    return np.clip(rgb, 0, 1)
-
-
-def _kmeans_pp_init(data: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
-    n = data.shape[0]
-    centers = np.empty((k, data.shape[1]), dtype=np.float64)
-    idx = rng.integers(0, n)
-    centers[0] = data[idx]
-    d2 = np.full(n, np.inf)
+    # lab shape (N,3) -> sRGB clipped to 0..1
+    out = np.array(lab, dtype=np.float64)
+    color_space.convert(out, "lab", "linear", out=out)
+    np.maximum(out, 0, out=out)
+    color_space.linear_to_srgb(out, out=out)
+    return np.clip(out, 0, 1, out=out)
+
+
+def _ciede2000(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    # CIEDE2000 color difference (Sharma, Wu & Dalal 2005), kL = kC = kH = 1;
+    # broadcasts over the leading axes of two (..., 3) Lab arrays
+    L1, a1, b1 = np.moveaxis(np.asarray(lab1, dtype=np.float64), -1, 0)
+    L2, a2, b2 = np.moveaxis(np.asarray(lab2, dtype=np.float64), -1, 0)
+    c7 = ((np.hypot(a1, b1) + np.hypot(a2, b2)) / 2) ** 7
+    g = 0.5 * (1 - np.sqrt(c7 / (c7 + 25.0 ** 7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma0 = c1p * c2p == 0
+
+    dh = h2p - h1p
+    dh = np.where(dh > 180, dh - 360, np.where(dh < -180, dh + 360, dh))
+    dh = np.where(chroma0, 0.0, dh)
+    dL = L2 - L1
+    dC = c2p - c1p
+    dH = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(dh) / 2)
+
+    Lm = (L1 + L2) / 2
+    Cm = (c1p + c2p) / 2
+    hs = h1p + h2p
+    hm = np.where(np.abs(h1p - h2p) <= 180, hs / 2, np.where(hs < 360, (hs + 360) / 2, (hs - 360) / 2))
+    hm = np.where(chroma0, hs, hm)
+    t = (1 - 0.17 * np.cos(np.radians(hm - 30)) + 0.24 * np.cos(np.radians(2 * hm))
+         + 0.32 * np.cos(np.radians(3 * hm + 6)) - 0.20 * np.cos(np.radians(4 * hm - 63)))
+    dtheta = 30 * np.exp(-(((hm - 275) / 25) ** 2))
+    cm7 = Cm ** 7
+    rc = 2 * np.sqrt(cm7 / (cm7 + 25.0 ** 7))
+    sl = 1 + 0.015 * (Lm - 50) ** 2 / np.sqrt(20 + (Lm - 50) ** 2)
+    sc = 1 + 0.045 * Cm
+    sh = 1 + 0.015 * Cm * t
+    rt = -np.sin(np.radians(2 * dtheta)) * rc
+    return np.sqrt(np.maximum((dL / sl) ** 2 + (dC / sc) ** 2 + (dH / sh) ** 2 + rt * (dC / sc) * (dH / sh), 0.0))
+
+
+_MERGE_METRICS = ("euclidean", "ciede2000")
+
+
+def _lab_distance(a: np.ndarray, b: np.ndarray, metric: str) -> np.ndarray:
+    # distance between Lab colors, broadcasting like _ciede2000
+    if metric == "euclidean":
+        return np.sqrt(((a - b) ** 2).sum(-1))
+    if metric == "ciede2000":
+        return _ciede2000(a, b)
+    raise ValueError(f"Unknown merge_metric: {metric}")
+
+
+# Upper bound on the number of elements in the per-chunk temporaries of the
+# k-means engine ((B, rows, k) distance block, (B, rows, D) difference block).
+# Peak memory then stays fixed however many pixels are sampled.
+_KMEANS_CHUNK_ELEMS = 1 << 18
+
+
+def _chunk_rows(B: int, width: int) -> int:
+    return max(1, _KMEANS_CHUNK_ELEMS // max(1, B * width))
+
+
+def _weighted_pick(d2: np.ndarray, u: np.ndarray, step: int) -> np.ndarray:
+    # Per frame, index i with probability d2[b, i] / sum(d2[b]) (same rule as
+    # rng.choice(n, p=...)), without building an O(N) cumulative sum.
+    B, n = d2.shape
+    starts = np.arange(0, n, step)
+    chunk_sums = np.add.reduceat(d2, starts, axis=1, dtype=np.float64)
+    csum = np.cumsum(chunk_sums, axis=1)
+    target = u * csum[:, -1]
+    j = np.minimum(np.count_nonzero(csum <= target[:, None], axis=1), len(starts) - 1)
+    idx = np.empty(B, dtype=np.int64)
+    for b in range(B):
+        s = starts[j[b]]
+        local = np.cumsum(d2[b, s:s + step], dtype=np.float64)
+        rem = target[b] - (csum[b, j[b]] - chunk_sums[b, j[b]])
+        idx[b] = min(s + np.count_nonzero(local <= rem), n - 1)
+    return idx
+
+
+# --- sRGB -> Lab lookup tables -------------------------------------------------
+#
+# ComfyUI images are effectively 8-bit, so Lab conversion can be replaced by
+# table lookups once the input is quantized to 0..255 per channel:
+#
+#   lut         256-entry sRGB -> linear table replaces the ** 2.4 branch;
+#               the XYZ matrix and cube roots still run per pixel.
+#   lut3d_Nbit  (2^N)^3-entry RGB -> Lab table (N = 6, 7, 8), memory-mapped
+#               from the cache directory; conversion becomes one gather.
+#
+# Accuracy versus _rgb_to_lab, measured over all 2^24 8-bit colors (CIE76 dE):
+#   lut          < 1e-4   (float rounding only)
+#   lut3d_8bit   < 1e-4   (table stored as float32)
+#   lut3d_7bit   <= 1.0   (mean 0.4)
+#   lut3d_6bit   <= 2.9   (mean 0.9)
+# Inputs that are not already 8-bit additionally carry the rounding error of
+# the 8-bit quantization itself, at most 0.9 dE.
+
+_LAB_MODES = ("exact", "lut", "lut3d_6bit", "lut3d_7bit", "lut3d_8bit")
+# Table entries converted per step while building a 3D table
+_LUT_BUILD_CHUNK = 1 << 20
+
+
+def _cache_dir() -> Path:
+    # TJ_COLORUTIL_CACHE_DIR, else the user cache directory: the 8-bit table
+    # is ~200 MB and the node directory may be read-only
+    override = os.environ.get("TJ_COLORUTIL_CACHE_DIR")
+    if override:
+        return Path(override)
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "tj_colorutility"
+
+
+@lru_cache(maxsize=1)
+def _srgb8_linear_table() -> np.ndarray:
+    return _srgb_to_linear(np.arange(256, dtype=np.float64) / 255.0)
+
+
+def _build_lab_table(bits: int, out: np.ndarray) -> None:
+    # entry (r<<2b | g<<b | b) holds Lab of the center of that 8-bit bin
+    shift = 8 - bits
+    levels = (np.arange(1 << bits) << shift) + ((1 << shift) - 1) / 2.0
+    lin = _srgb_to_linear(levels / 255.0)
+    n = 1 << (3 * bits)
+    for s in range(0, n, _LUT_BUILD_CHUNK):
+        code = np.arange(s, min(s + _LUT_BUILD_CHUNK, n))
+        rgb_lin = np.stack([lin[code >> (2 * bits)], lin[(code >> bits) & ((1 << bits) - 1)], lin[code & ((1 << bits) - 1)]], axis=-1)
+        out[s:s + code.shape[0]] = _linear_to_lab(rgb_lin)
+
+
+@lru_cache(maxsize=None)
+def _lab_table(bits: int) -> np.ndarray:
+    # Built once, saved as .npy in the cache directory and memory-mapped on
+    # later runs. Falls back to an in-memory table if the directory is not writable.
+    n = 1 << (3 * bits)
+    path = _cache_dir() / f"srgb_lab_{bits}bit.npy"
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".npy.tmp")
+        os.close(fd)
+        table = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n, 3))
+        _build_lab_table(bits, table)
+        table.flush()
+        del table
+        os.replace(tmp, path)
+        return np.load(path, mmap_mode="r")
+    except OSError as e:
+        print(f"[ImagePaletteExtractor] Lab table cache unavailable ({e}); building in memory")
+        table = np.empty((n, 3), dtype=np.float32)
+        _build_lab_table(bits, table)
+        return table
+
+
+def _rgb_to_lab_lut(rgb: np.ndarray, bits: Optional[int] = None) -> np.ndarray:
+    # rgb 0..1, shape (..., 3). bits=None uses the 256-entry linearization
+    # table, otherwise the (2^bits)^3 RGB -> Lab table.
+    q = (np.clip(rgb, 0, 1) * 255.0 + 0.5).astype(np.intp)
+    if bits is None:
+        return _linear_to_lab(np.take(_srgb8_linear_table(), q))
+    q >>= 8 - bits
+    code = (q[..., 0] << (2 * bits)) | (q[..., 1] << bits) | q[..., 2]
+    return np.take(_lab_table(bits), code, axis=0).astype(np.float64)
+
+
+def _rgb_to_lab_mode(rgb: np.ndarray, mode: str) -> np.ndarray:
+    if mode == "exact":
+        return _rgb_to_lab(rgb)
+    if mode == "lut":
+        return _rgb_to_lab_lut(rgb)
+    if mode in _LAB_MODES:
+        return _rgb_to_lab_lut(rgb, bits=int(mode[len("lut3d_")]))
+    raise ValueError(f"Unknown lab_mode: {mode}")
+
+
+# Working color spaces for clustering. OKLab and linear RGB span about 0..1
+# and are scaled by _WORKING_SCALE so merge_delta, kmeans_tol and inertia stay
+# on the CIELab-like scale of L* (OKLab L 0..100, 1 unit ~ 1 dE).
+_COLOR_SPACES = ("cielab", "oklab", "linear_rgb")
+_WORKING_SCALE = 100.0
+_SPACE_NAMES = {"oklab": "oklab", "linear_rgb": "linear"}
+
+
+def _rgb_to_working(rgb: np.ndarray, space: str, lab_mode: str = "exact") -> np.ndarray:
+    # rgb 0..1, shape (..., 3) -> working space; lab_mode only applies to cielab
+    if space == "cielab":
+        return _rgb_to_lab_mode(rgb, lab_mode)
+    if space not in _SPACE_NAMES:
+        raise ValueError(f"Unknown color_space: {space}")
+    rgb = np.asarray(rgb)
+    out = np.clip(rgb, 0, 1, out=np.empty(rgb.shape, dtype=np.float64))
+    color_space.convert(out, "srgb", _SPACE_NAMES[space], out=out)
+    out *= _WORKING_SCALE
+    return out
+
+
+def _working_to_rgb(centers: np.ndarray, space: str) -> np.ndarray:
+    # working space -> sRGB clipped to 0..1
+    if space == "cielab":
+        return _lab_to_rgb(centers)
+    if space not in _SPACE_NAMES:
+        raise ValueError(f"Unknown color_space: {space}")
+    out = np.array(centers, dtype=np.float64)
+    out *= 1.0 / _WORKING_SCALE
+    color_space.convert(out, _SPACE_NAMES[space], "linear", out=out)
+    np.maximum(out, 0, out=out)
+    color_space.linear_to_srgb(out, out=out)
+    return np.clip(out, 0, 1, out=out)
+
+
+def _kmeans_pp_init(data: np.ndarray, k: int, rng: np.random.Generator,
+                    weights: Optional[np.ndarray] = None) -> np.ndarray:
+    # data (B,N,D): every frame is seeded independently but in lockstep.
+    # weights (B,N) make a point count weights[b, i] times; 0 excludes it.
+    B, n, D = data.shape
+    step = _chunk_rows(B, D)
+    rows = np.arange(B)
+    centers = np.empty((B, k, D), dtype=np.float64)
+    if weights is None:
+        idx = rng.integers(0, n, size=B)
+    else:
+        idx = _weighted_pick(weights, rng.random(B), step)
+    centers[:, 0] = data[rows, idx]
+    d2 = np.full((B, n), np.inf, dtype=data.dtype)
     for i in range(1, k):
-        # update distances
-        diff = data - centers[i - 1]
-        d2 = np.minimum(d2, np.einsum('ij,ij->i', diff, diff))
-        probs = d2 / np.sum(d2)
-        idx = rng.choice(n, p=probs)
-        centers[i] = data[idx]
+        # update distances, one chunk of points at a time
+        c = centers[:, i - 1, None, :].astype(data.dtype)
+        for s in range(0, n, step):
+            diff = data[:, s:s + step] - c
+            np.minimum(d2[:, s:s + step], np.einsum('bij,bij->bi', diff, diff), out=d2[:, s:s + step])
+        p = d2 if weights is None else d2 * weights
+        if weights is not None:
+            # every weighted point already sits on a center: pick by weight,
+            # never a zero-weight (padding) point
+            spent = ~p.any(axis=1)
+            p[spent] = weights[spent]
+        idx = _weighted_pick(p, rng.random(B), step)
+        centers[:, i] = data[rows, idx]
     return centers
 
 
-def _kmeans(data: np.ndarray, k: int, iters: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
-    rng = np.random.default_rng(seed)
-    centers = _kmeans_pp_init(data, k, rng)
-    labels = np.zeros(data.shape[0], dtype=np.int32)
-    for _ in range(iters):
-        # assign
-        # compute distances to centers
-        # (N,C) -> compute argmin over centers
-        d2 = np.sum((data[:, None, :] - centers[None, :, :]) ** 2, axis=2)
-        new_labels = np.argmin(d2, axis=1)
-        if np.array_equal(new_labels, labels):
+def _assign_chunk(block: np.ndarray, centers: np.ndarray, cc: np.ndarray) -> np.ndarray:
+    # ||x-c||^2 = ||x||^2 - 2x.c + ||c||^2; ||x||^2 is constant per point so
+    # the argmin over centers only needs a batched matmul, not a (B,N,C,D) diff
+    d2 = block @ centers.transpose(0, 2, 1)
+    d2 *= -2.0
+    d2 += cc[:, None, :]
+    return np.argmin(d2, axis=2)
+
+
+def _accumulate(block: np.ndarray, labels: np.ndarray, sums: np.ndarray, counts: np.ndarray,
+                w: Optional[np.ndarray] = None) -> None:
+    # per-frame cluster sums of one chunk in a single bincount per channel
+    B, k, D = sums.shape
+    flat = (labels + (np.arange(B) * k)[:, None]).ravel()
+    if w is None:
+        counts += np.bincount(flat, minlength=B * k).reshape(B, k)
+        for d in range(D):
+            sums[..., d] += np.bincount(flat, weights=block[..., d].ravel(), minlength=B * k).reshape(B, k)
+    else:
+        w = w.ravel()
+        counts += np.bincount(flat, weights=w, minlength=B * k).reshape(B, k)
+        for d in range(D):
+            sums[..., d] += np.bincount(flat, weights=block[..., d].ravel() * w, minlength=B * k).reshape(B, k)
+
+
+class _KMeansResult(NamedTuple):
+    centers: np.ndarray  # (k,D) or (B,k,D), float64
+    labels: np.ndarray   # (N,) or (B,N)
+    n_iter: int          # assignment passes run
+    inertia: np.ndarray  # per frame: sum of (weighted) squared distances to the centers
+
+
+def _kmeans_fit(data: np.ndarray, k: int, max_iter: int, seed: int,
+                weights: Optional[np.ndarray] = None, tol: float = 0.0,
+                init: Optional[np.ndarray] = None) -> _KMeansResult:
+    # data (N,D) for a single frame or (B,N,D) to cluster every frame together.
+    # float32 data is kept as float32; only the k centers are accumulated in float64.
+    # weights (N,) / (B,N) turn this into weighted k-means (e.g. histogram bins).
+    # init (k,D) / (B,k,D) starting centers replace the k-means++ seeding
+    # (warm start from a previous frame, see palette_tracker.py).
+    # Stops when no label changes, when no center moves by tol or more (Lab
+    # distance), or after max_iter passes.
+    single = data.ndim == 2
+    if single:
+        data = data[None]
+        if weights is not None:
+            weights = weights[None]
+    B, n, D = data.shape
+    step = _chunk_rows(B, k)
+    if init is None:
+        centers = _kmeans_pp_init(data, k, np.random.default_rng(seed), weights)
+    else:
+        centers = np.array(init, dtype=np.float64).reshape(B, k, D)
+    labels = np.zeros((B, n), dtype=np.int32)
+    sums = np.zeros((B, k, D), dtype=np.float64)
+    counts = np.zeros((B, k), dtype=np.float64 if weights is not None else np.int64)
+    # sum of w*|x|^2 per frame; with centers at the cluster means the inertia
+    # is then xx - sum_c |sum_c|^2 / count_c, no extra pass over the points
+    xx = np.zeros(B)
+    for s in range(0, n, step):
+        block = data[:, s:s + step]
+        sq = np.einsum('bij,bij->bi', block, block)
+        xx += (sq if weights is None else sq * weights[:, s:s + step]).sum(axis=1, dtype=np.float64)
+    n_iter = 0
+    for n_iter in range(1, max_iter + 1):
+        cent = centers.astype(data.dtype)
+        cc = np.einsum('bcd,bcd->bc', cent, cent)
+        sums.fill(0.0)
+        counts.fill(0)
+        changed = False
+        for s in range(0, n, step):
+            block = data[:, s:s + step]
+            # assign
+            new_labels = _assign_chunk(block, cent, cc)
+            if not changed and not np.array_equal(new_labels, labels[:, s:s + step]):
+                changed = True
+            labels[:, s:s + step] = new_labels
+            _accumulate(block, new_labels, sums, counts, None if weights is None else weights[:, s:s + step])
+        # update centers; empty clusters keep their center
+        new_centers = np.where((counts > 0)[..., None], sums / np.maximum(counts, 1)[..., None], centers)
+        shift = np.sqrt(((new_centers - centers) ** 2).sum(-1)).max()
+        centers = new_centers
+        if not changed or shift < tol:
             break
-        labels = new_labels
-        # update centers
-        for i in range(k):
-            mask = labels == i
-            if np.any(mask):
-                centers[i] = data[mask].mean(axis=0)
-    return centers, labels
+    filled = counts > 0
+    inertia = xx - np.where(filled, (sums ** 2).sum(-1) / np.where(filled, counts, 1), 0.0).sum(-1)
+    inertia = np.maximum(inertia, 0.0)
+    if single:
+        return _KMeansResult(centers[0], labels[0], n_iter, inertia[0])
+    return _KMeansResult(centers, labels, n_iter, inertia)
+
+
+def _restart_seeds(seed: int, n_init: int) -> List[int]:
+    # run 0 keeps the node's seed (n_init=1 reproduces a single run); the
+    # others are independent streams spawned from it
+    children = np.random.SeedSequence(seed).spawn(n_init - 1)
+    return [seed] + [int(c.generate_state(1)[0]) for c in children]
+
+
+def _kmeans_best(data: np.ndarray, k: int, max_iter: int, seed: int,
+                 weights: Optional[np.ndarray] = None, tol: float = 0.0, n_init: int = 1) -> _KMeansResult:
+    # n_init seeded restarts of _kmeans_fit on a thread pool (the matmul /
+    # argmin / bincount inner loops run in NumPy without the GIL); every frame
+    # keeps its own lowest-inertia run. Ties go to the earlier run, so the
+    # result depends only on seed, not on thread scheduling.
+    if n_init <= 1:
+        return _kmeans_fit(data, k, max_iter, seed, weights, tol)
+    seeds = _restart_seeds(seed, n_init)
+    workers = max(1, min(n_init, os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        runs = list(pool.map(lambda s: _kmeans_fit(data, k, max_iter, s, weights, tol), seeds))
+    inertia = np.stack([r.inertia for r in runs])  # (n_init,) or (n_init,B)
+    best = np.argmin(inertia, axis=0)
+    if data.ndim == 2:
+        return runs[int(best)]
+    frames = np.arange(best.shape[0])
+    return _KMeansResult(
+        np.stack([r.centers for r in runs])[best, frames],
+        np.stack([r.labels for r in runs])[best, frames],
+        max(runs[i].n_iter for i in set(best.tolist())),
+        inertia[best, frames],
+    )
+
+
+def _kmeans(data: np.ndarray, k: int, iters: int, seed: int,
+            weights: Optional[np.ndarray] = None, tol: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    # -> (centers, labels); see _kmeans_fit
+    fit = _kmeans_fit(data, k, iters, seed, weights, tol)
+    return fit.centers, fit.labels
+
+
+def _inertia(data: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    # (B,N,D) points, (B,k,D) centers -> (B,) sum of squared distances to the nearest center
+    B, n, _ = data.shape
+    step = _chunk_rows(B, centers.shape[1])
+    cent = centers.astype(data.dtype)
+    cc = np.einsum('bcd,bcd->bc', cent, cent)
+    out = np.zeros(B)
+    for s in range(0, n, step):
+        block = data[:, s:s + step]
+        d2 = block @ cent.transpose(0, 2, 1)
+        d2 *= -2.0
+        d2 += cc[:, None, :]
+        out += (d2.min(axis=2) + np.einsum('bij,bij->bi', block, block)).sum(axis=1, dtype=np.float64)
+    return np.maximum(out, 0.0)
+
+
+# Pixels quantized per step while building the color histogram
+_HIST_CHUNK = 1 << 20
+
+_SAMPLERS = ("random", "grid", "stratified", "area")
+_BATCH_MODES = ("first", "per_frame", "shared", "temporal")
+# tile_rows / tile_cols upper bound
+_MAX_TILES = 16
 
+# Mini-batch k-means: pixels per batch, rows each batch is read from, and
+# the early stop (largest center move in Lab, for _MINIBATCH_PATIENCE batches)
+_MINIBATCH_SIZE = 4096
+_MINIBATCH_ROWS = 16
+# batches pooled for the initial k-means++ / Lloyd pass
+_MINIBATCH_INIT_BATCHES = 4
+_MINIBATCH_TOL = 0.1
+_MINIBATCH_PATIENCE = 3
 
-def _hex_from_rgb01(rgb: np.ndarray) -> str:
-    r = int(np.round(rgb[0] * 255.0))
-    g = int(np.round(rgb[1] * 255.0))
-    b = int(np.round(rgb[2] * 255.0))
-    r = max(0, min(255, r))
-    g = max(0, min(255, g))
-    b = max(0, min(255, b))
-    return f"#{r:02X}{g:02X}{b:02X}"
+
+def _random_index(N: int, n: int, seed: int) -> Optional[np.ndarray]:
+    # n random pixel indices out of N without replacement, None = take all
+    if N <= n:
+        return None
+    return np.random.default_rng(seed).choice(N, size=n, replace=False)
+
+
+def _minibatch_kmeans(batches, k: int, seed: int, max_steps: int,
+                      tol: float = _MINIBATCH_TOL) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Mini-batch k-means (Sculley 2010) over an iterator of (B,m,D) batches.
+    # Each center moves towards the mean of its batch members with a step of
+    # batch_count / total_count, so memory is one batch regardless of image size.
+    # Returns centers (B,k,D), the pixel count seen per center (B,k) and the
+    # last batch (for callers that need representative points).
+    pool = [b for _, b in zip(range(_MINIBATCH_INIT_BATCHES), batches)]
+    # seed from a few pooled batches so a single batch missing a color
+    # region does not leave two centers splitting one cluster
+    centers, _ = _kmeans(np.concatenate(pool, axis=1), k, iters=5, seed=seed)
+    B, _, D = centers.shape
+    seen = np.zeros((B, k), dtype=np.float64)
+    sums = np.empty((B, k, D), dtype=np.float64)
+    counts = np.empty((B, k), dtype=np.float64)
+    still = 0
+    for step in range(max_steps):
+        batch = pool[step] if step < len(pool) else next(batches, None)
+        if batch is None:
+            break
+        cent = centers.astype(batch.dtype)
+        labels = _assign_chunk(batch, cent, np.einsum('bcd,bcd->bc', cent, cent))
+        sums.fill(0.0)
+        counts.fill(0.0)
+        _accumulate(batch, labels, sums, counts)
+        seen += counts
+        eta = np.divide(counts, seen, out=np.zeros_like(counts), where=seen > 0)[..., None]
+        batch_mean = sums / np.maximum(counts, 1)[..., None]
+        new_centers = centers + eta * (batch_mean - centers)
+        shift = np.sqrt(((new_centers - centers) ** 2).sum(-1)).max()  # per-center distance, as in lloyd
+        centers = new_centers
+        still = still + 1 if shift < tol else 0
+        if still >= _MINIBATCH_PATIENCE:
+            break
+    return centers, seen, batch
+
+
+class _Clusters(NamedTuple):
+    # what the clustering backends hand to _finalize
+    centers: np.ndarray            # (B,k,3) Lab
+    counts: np.ndarray             # (B,k) int64 pixels per cluster
+    points: Optional[np.ndarray]   # (B,M,3) clustered Lab points, None on torch
+    weights: Optional[np.ndarray]  # (B,M) histogram bin weights or None
+    n_iter: int                    # Lloyd passes / mini-batch steps
+    inertia: float                 # summed over frames
+    tiles: Optional["_Tiles"] = None
+
+
+class _Tiles(NamedTuple):
+    # tile_rows x tile_cols grid over the frame, row-major tile ids
+    ids: np.ndarray                           # (B,M) tile of every clustered point
+    boxes: List[Tuple[int, int, int, int]]    # per tile: y0, x0, y1, x1 (pixels, end exclusive)
+    cols: int
 
 
 class ImagePaletteExtractor:
     """
-    Extract 8 representative colors from an IMAGE and output only a JSON string:
-    custom_json = {"colors":["#RRGGBB", ...]} (8 colors)
+    Extract palette_size (default 8) representative colors from an IMAGE and
+    output only a JSON string:
+    custom_json = {"colors":["#RRGGBB", ...], "kmeans": {"n_iter": ..., "inertia": ...}}
+    "kmeans" reports the passes run and the inertia before merging.
+
+    Inputs:
+        batch_mode        first (default), per_frame (adds "frames"), shared (one
+                          palette for the batch), temporal (video: a PaletteTracker
+                          kept on the node, see palette_tracker.py; adds "frames"
+                          and "tracking", NumPy only, no result cache)
+        temporal_skip     temporal: histogram change (0..1) below which a frame
+                          reuses the previous palette
+        mask              optional MASK; only pixels where it is > 0.5 count
+        tile_rows/cols    > 1 adds "tiles", a palette per grid cell:
+                          [{"row", "col", "box": [y0, x0, y1, x1], "colors", "samples"}]
+                          ("frame" under per_frame). A mask or tiles run lloyd
+                          on NumPy (quantize_bits, algorithm, backend ignored).
+        quantize_bits     > 0: weighted k-means on a (2^bits)^3 RGB histogram
+                          instead of sampled pixels
+        lab_mode          exact math or an 8-bit lookup table (see _LAB_MODES);
+                          cielab only
+        color_space       working space for clustering, merging and sorting:
+                          cielab (default), oklab x 100, linear_rgb x 100
+        backend           numpy (default), torch (on the tensor's device,
+                          torch_backend.py), auto (torch for torch tensors)
+        algorithm         lloyd (default) or minibatch (streams batches from the
+                          image, works on np.memmap; NumPy only)
+        sampler           random (default), grid, stratified or area (block mean);
+                          see benchmarks/bench_samplers.py
+        merge_delta       merge clusters closer than this (merge_metric:
+                          euclidean in the working space, or ciede2000 with
+                          cielab); freed slots are refilled by splitting the
+                          widest cluster
+        max_iter/kmeans_tol  stop after max_iter passes or once no center moves
+                          by kmeans_tol (working-space distance) or more
+        n_init            k-means++ restarts in threads, lowest inertia kept
+        use_cache         reuse results from palette_cache for the same image
+                          and inputs
+
+    Stage timings are reported through palette_metrics when a sink is enabled
+    (TJ_COLORUTIL_METRICS=log,ring,prometheus).
     """
 
     @classmethod
@@ -138,7 +588,26 @@ class ImagePaletteExtractor:
                 "merge_delta": ("FLOAT", {"default": 6.0, "min": 0.0, "max": 50.0, "step": 0.5}),
                 "seed": ("INT", {"default": 42, "min": 0, "max": 2**31 - 1}),
                 "sort": ("COMBO", {"default": "frequency", "choices": ["frequency", "hue", "luminance"]}),
-            }
+                "batch_mode": ("COMBO", {"default": "first", "choices": list(_BATCH_MODES)}),
+                "quantize_bits": ("INT", {"default": 0, "min": 0, "max": 7, "step": 1}),
+                "lab_mode": ("COMBO", {"default": "exact", "choices": list(_LAB_MODES)}),
+                "backend": ("COMBO", {"default": "numpy", "choices": ["numpy", "torch", "auto"]}),
+                "use_cache": ("BOOLEAN", {"default": True}),
+                "algorithm": ("COMBO", {"default": "lloyd", "choices": ["lloyd", "minibatch"]}),
+                "sampler": ("COMBO", {"default": "random", "choices": list(_SAMPLERS)}),
+                "merge_metric": ("COMBO", {"default": "euclidean", "choices": list(_MERGE_METRICS)}),
+                "palette_size": ("INT", {"default": 8, "min": 1, "max": 256, "step": 1}),
+                "max_iter": ("INT", {"default": 15, "min": 1, "max": 300, "step": 1}),
+                "kmeans_tol": ("FLOAT", {"default": 0.1, "min": 0.0, "max": 10.0, "step": 0.01}),
+                "n_init": ("INT", {"default": 1, "min": 1, "max": 16, "step": 1}),
+                "color_space": ("COMBO", {"default": "cielab", "choices": list(_COLOR_SPACES)}),
+                "temporal_skip": ("FLOAT", {"default": 0.05, "min": 0.0, "max": 1.0, "step": 0.005}),
+                "tile_rows": ("INT", {"default": 1, "min": 1, "max": _MAX_TILES, "step": 1}),
+                "tile_cols": ("INT", {"default": 1, "min": 1, "max": _MAX_TILES, "step": 1}),
+            },
+            "optional": {
+                "mask": ("MASK", {}),
+            },
         }
 
     RETURN_TYPES = ("STRING",)
@@ -146,81 +615,284 @@ class ImagePaletteExtractor:
     FUNCTION = "extract_palette"
     CATEGORY = "TJnodes/color"
 
+    # batch_mode="temporal" state, created on first use
+    _tracker = None
+
     def _to_numpy_rgb01(self, image) -> np.ndarray:
         # Accepts ComfyUI IMAGE (torch tensor BCHW or BHWC) or numpy array
-        if torch is not None and hasattr(torch, "Tensor") and isinstance(image, torch.Tensor):  # type: ignore
+        return self._to_numpy_rgb01_batch(image, first_only=True)[0]
+
+    def _to_numpy_rgb01_batch(self, image, first_only: bool = False) -> np.ndarray:
+        # Same as _to_numpy_rgb01 but keeps every frame: returns (B,H,W,3)
+        torch = _loaded_torch()
+        if torch is not None and isinstance(image, torch.Tensor):
             t = image
-            if t.dim() == 4:
-                # Assume [B,H,W,C] or [B,C,H,W]
-                if t.shape[-1] == 3:
-                    arr = t[0].detach().cpu().numpy()  # H,W,3
-                else:
-                    arr = t[0].permute(1, 2, 0).detach().cpu().numpy()  # H,W,C
-            elif t.dim() == 3:
-                if t.shape[-1] == 3:
-                    arr = t.detach().cpu().numpy()
-                else:
-                    arr = t.permute(1, 2, 0).detach().cpu().numpy()
-            else:
+            if t.dim() == 3:
+                t = t.unsqueeze(0)
+            if t.dim() != 4:
                 raise ValueError("Unsupported tensor shape for IMAGE")
-            arr = np.ascontiguousarray(arr)
+            if first_only:
+                t = t[:1]
+            # Assume [B,H,W,C] or [B,C,H,W]
+            if t.shape[-1] != 3:
+                t = t.permute(0, 2, 3, 1)
+            arr = np.ascontiguousarray(t.detach().cpu().numpy())
             arr = np.clip(arr, 0.0, 1.0).astype(np.float64)
             return arr
         else:
             arr = np.asarray(image, dtype=np.float64)
-            if arr.ndim == 4:
-                arr = arr[0]
+            if arr.ndim == 3:
+                arr = arr[None]
+            if first_only:
+                arr = arr[:1]
             if arr.shape[-1] != 3:
                 raise ValueError("Expected last dimension=3 for RGB")
             arr = np.clip(arr, 0.0, 1.0)
             return arr
 
-    def _downsample_or_sample(self, arr: np.ndarray, sample_max_pixels: int, seed: int) -> np.ndarray:
-        H, W, _ = arr.shape
-        N = H * W
+    def _frames_view(self, image, first_only: bool = False) -> np.ndarray:
+        # (B,H,W,3) view of the IMAGE without copying or converting it
+        # (np.memmap stays memory-mapped, CPU tensors are shared). Values are
+        # not clipped; integer arrays are read as 0..255.
+        torch = _loaded_torch()
+        if torch is not None and isinstance(image, torch.Tensor):
+            t = image.detach()
+            if t.device.type != "cpu" or t.dtype not in (torch.float32, torch.float64):
+                return self._to_numpy_rgb01_batch(image, first_only)
+            arr = t.numpy()
+        else:
+            arr = image if isinstance(image, np.ndarray) else np.asarray(image)
+        if arr.ndim == 3:
+            arr = arr[None]
+        if first_only:
+            arr = arr[:1]
+        if arr.shape[-1] != 3:
+            arr = arr.transpose(0, 2, 3, 1)
+        if arr.ndim != 4 or arr.shape[-1] != 3:
+            raise ValueError("Expected last dimension=3 for RGB")
+        return arr
+
+    def _stream_batches(self, frames: np.ndarray, seed: int, lab_mode: str, color_space: str = "cielab"):
+        # Endless (B,m,3) batches in the working color space. Each batch reads _MINIBATCH_ROWS random
+        # full rows (contiguous, so memory-mapped images only page in those
+        # rows) and keeps random pixels from them at the same positions for
+        # every frame.
         rng = np.random.default_rng(seed)
-        if N <= sample_max_pixels:
-            return arr.reshape(-1, 3)
-        # random sample without replacement
-        idx = rng.choice(N, size=sample_max_pixels, replace=False)
-        flat = arr.reshape(-1, 3)
-        return flat[idx]
-
-    def _merge_close(self, centers: np.ndarray, counts: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
-        # Merge clusters whose LAB euclidean distance < threshold
+        B, H, W, _ = frames.shape
+        n_rows = min(H, _MINIBATCH_ROWS)
+        per_row = max(1, min(W, _MINIBATCH_SIZE // n_rows))
+        scale = 1.0 / 255.0 if np.issubdtype(frames.dtype, np.integer) else 1.0
+        while True:
+            rows = np.sort(rng.choice(H, size=n_rows, replace=False))
+            tile = frames[:, rows]
+            cols = rng.integers(0, W, size=(n_rows, per_row))
+            px = tile[:, np.arange(n_rows)[:, None], cols].reshape(B, -1, 3)
+            px = np.clip(px.astype(np.float64) * scale, 0.0, 1.0)
+            yield _rgb_to_working(px, color_space, lab_mode)
+
+    def _mask_view(self, mask, frames: np.ndarray) -> np.ndarray:
+        # ComfyUI MASK ((B,H,W) / (H,W) tensor or array, 1 = keep) -> (1|B,H,W)
+        # bool; a single mask applies to every frame
+        torch = _loaded_torch()
+        if torch is not None and isinstance(mask, torch.Tensor):
+            mask = mask.detach().to("cpu").numpy()
+        m = np.asarray(mask)
+        if m.ndim == 2:
+            m = m[None]
+        B, H, W, _ = frames.shape
+        m = m[:B]
+        if m.ndim != 3 or m.shape[1:] != (H, W) or m.shape[0] not in (1, B):
+            raise ValueError(f"mask of shape {np.shape(mask)} does not match the image ({B},{H},{W})")
+        return m > 0.5
+
+    def _sample_regions(self, frames: np.ndarray, mask: Optional[np.ndarray], grid: Optional[Tuple[int, int]],
+                        sample_max_pixels: int, seed: int, sampler: str, pooled: bool):
+        # One sampling pass for mask / tile extraction. Samples outside the
+        # mask are dropped here, before any color conversion; every frame
+        # keeps its samples in front, padded with zero weights to a common M.
+        # -> samples (B,M,3), weights (B,M) or None, tile ids (B,M) or None
+        B, H, W, _ = frames.shape
+        budget = max(1, -(-sample_max_pixels // B)) if pooled else sample_max_pixels
+        within = None
+        if mask is not None:
+            kept = float(mask.sum()) / mask.shape[0]
+            if kept == 0.0:
+                raise ValueError("mask excludes every pixel")
+            if sampler == "random":
+                # draw only inside the mask (of any frame)
+                within = np.flatnonzero(mask.any(axis=0))
+                budget = math.ceil(budget * within.size / kept)
+            else:
+                # the fixed layouts cover the whole frame; sample densely
+                # enough that about the same number survive the mask
+                budget = min(H * W, math.ceil(budget * H * W / kept))
+        samples, rows, cols = self._sample_at(frames, budget, seed, sampler, positions=True, within=within)
+        shape = samples.shape[:2]
+        keep = None if mask is None else np.broadcast_to(mask[:, rows, cols], shape)
+        tiles = None
+        if grid is not None:
+            R, C = grid
+            tiles = np.broadcast_to((rows * R // H) * C + cols * C // W, shape)
+        if pooled:
+            samples = samples.reshape(1, -1, 3)
+            keep = None if keep is None else keep.reshape(1, -1)
+            tiles = None if tiles is None else tiles.reshape(1, -1)
+        if keep is None:
+            return samples, None, tiles
+        kept = keep.sum(axis=1)
+        if not kept.all():
+            raise ValueError("mask excludes every sampled pixel of a frame")
+        M = int(kept.max())
+        order = np.argsort(~keep, axis=1, kind="stable")[:, :M]
+        samples = np.take_along_axis(samples, order[..., None], axis=1)
+        tiles = None if tiles is None else np.take_along_axis(tiles, order, axis=1)
+        weights = None if (kept == M).all() else np.take_along_axis(keep, order, axis=1).astype(np.float64)
+        return samples, weights, tiles
+
+    def _sample(self, frames: np.ndarray, sample_max_pixels: int, seed: int, sampler: str) -> np.ndarray:
+        # (B,H,W,3) -> (B,M,3) float64 in 0..1, same positions for every frame.
+        # frames may be an unconverted view (_frames_view); only the picked
+        # pixels are converted. grid/stratified/area never build an O(N) index.
+        return self._sample_at(frames, sample_max_pixels, seed, sampler)[0]
+
+    def _sample_at(self, frames: np.ndarray, sample_max_pixels: int, seed: int, sampler: str,
+                   positions: bool = False, within: Optional[np.ndarray] = None,
+                   ) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        # _sample plus, with positions=True, the (M,) pixel row / column of
+        # every sample (area: the block center). within (flat pixel indices)
+        # restricts the random sampler to those pixels.
+        B, H, W, _ = frames.shape
+        N = H * W
+        rows = cols = None
+        if within is not None:
+            pick = _random_index(within.size, sample_max_pixels, seed)
+            idx = within if pick is None else within[pick]
+            picked = frames.reshape(B, N, 3)[:, idx]
+            if positions:
+                rows, cols = np.divmod(idx, W)
+        elif sampler == "random" or N <= sample_max_pixels:
+            if sampler not in _SAMPLERS:
+                raise ValueError(f"Unknown sampler: {sampler}")
+            idx = _random_index(N, sample_max_pixels, seed)
+            flat = frames.reshape(B, N, 3)
+            picked = flat if idx is None else flat[:, idx]
+            if positions:
+                rows, cols = np.divmod(np.arange(N) if idx is None else idx, W)
+        else:
+            # s x s blocks, about sample_max_pixels of them
+            step = max(1, math.ceil(math.sqrt(N / sample_max_pixels)))
+            if sampler == "grid":
+                picked = frames[:, step // 2::step, step // 2::step]
+                if positions:
+                    rows, cols = np.meshgrid(np.arange(step // 2, H, step), np.arange(step // 2, W, step),
+                                             indexing="ij")
+            elif sampler == "stratified":
+                # one pixel at a random offset inside every block
+                rng = np.random.default_rng(seed)
+                by = np.arange(-(-H // step)) * step
+                bx = np.arange(-(-W // step)) * step
+                rows = np.minimum(by[:, None] + rng.integers(0, step, size=(by.size, bx.size)), H - 1)
+                cols = np.minimum(bx[None, :] + rng.integers(0, step, size=(by.size, bx.size)), W - 1)
+                picked = frames[:, rows, cols]
+            elif sampler == "area":
+                # block means (box-filter downscale); edge rows/cols that do not
+                # fill a whole block are dropped
+                h, w = H // step, W // step
+                # rows first, so the large reduction runs over contiguous memory
+                summed = frames[:, :h * step, :w * step].reshape(B, h, step, w * step, 3).sum(axis=2, dtype=np.float64)
+                picked = summed.reshape(B, h, w, step, 3).sum(axis=3) / (step * step)
+                if positions:
+                    rows, cols = np.meshgrid(np.arange(h) * step + step // 2, np.arange(w) * step + step // 2,
+                                             indexing="ij")
+            else:
+                raise ValueError(f"Unknown sampler: {sampler}")
+            picked = picked.reshape(B, -1, 3)
+            if positions:
+                rows, cols = rows.ravel(), cols.ravel()
+        scale = 1.0 / 255.0 if np.issubdtype(frames.dtype, np.integer) else 1.0
+        return np.clip(picked.astype(np.float64) * scale, 0.0, 1.0), rows, cols
+
+    def _histogram_bins(self, frames: np.ndarray, bits: int, pooled: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        # Quantize (B,H,W,3) to `bits` per channel and collapse identical bins.
+        # Returns bin colors (mean of the pixels in each bin) and pixel counts,
+        # (B,M,3) and (B,M), padded with zero-weight bins to a common M.
+        # pooled=True builds one histogram over every frame (B=1).
+        B = frames.shape[0]
+        flat = frames.reshape(B, -1, 3)
+        n_bins = 1 << (3 * bits)
+        shift = 8 - bits
+        groups = [flat.reshape(1, -1, 3)] if pooled else [flat[b:b + 1] for b in range(B)]
+        colors_out: List[np.ndarray] = []
+        counts_out: List[np.ndarray] = []
+        for group in groups:
+            pixels = group[0]
+            counts = np.zeros(n_bins, dtype=np.float64)
+            sums = np.zeros((3, n_bins), dtype=np.float64)
+            for s in range(0, pixels.shape[0], _HIST_CHUNK):
+                chunk = pixels[s:s + _HIST_CHUNK]
+                q = (chunk * 255.0 + 0.5).astype(np.int64) >> shift
+                code = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+                counts += np.bincount(code, minlength=n_bins)
+                for c in range(3):
+                    sums[c] += np.bincount(code, weights=chunk[:, c], minlength=n_bins)
+            nz = np.flatnonzero(counts)
+            colors_out.append((sums[:, nz] / counts[nz]).T)
+            counts_out.append(counts[nz])
+        m = max(c.shape[0] for c in colors_out)
+        colors = np.zeros((len(groups), m, 3), dtype=np.float64)
+        weights = np.zeros((len(groups), m), dtype=np.float64)
+        for b, (c, w) in enumerate(zip(colors_out, counts_out)):
+            colors[b, :c.shape[0]] = c
+            weights[b, :w.shape[0]] = w
+        return colors, weights
+
+    def _merge_close(self, centers: np.ndarray, counts: np.ndarray, threshold: float,
+                     metric: str = "euclidean") -> Tuple[np.ndarray, np.ndarray]:
+        # Agglomerative merge on the pairwise distance matrix: repeatedly fold the
+        # closest pair (distance < threshold) into its count-weighted mean and
+        # refresh only that row/column. Survivors keep their original order.
         k = centers.shape[0]
-        used = np.zeros(k, dtype=bool)
-        new_centers: List[np.ndarray] = []
-        new_counts: List[int] = []
-        for i in range(k):
-            if used[i]:
-                continue
-            group = [i]
-            used[i] = True
-            for j in range(i + 1, k):
-                if used[j]:
-                    continue
-                d = np.linalg.norm(centers[i] - centers[j])
-                if d < threshold:
-                    used[j] = True
-                    group.append(j)
-            # merge by weighted average
-            cs = counts[group]
-            merged = np.average(centers[group], axis=0, weights=cs)
-            new_centers.append(merged)
-            new_counts.append(int(cs.sum()))
-        return np.vstack(new_centers), np.array(new_counts)
-
-    def _ensure_k(self, centers: np.ndarray, counts: np.ndarray, data_lab: np.ndarray, k: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
-        rng = np.random.default_rng(seed)
-        while centers.shape[0] < k:
-            # split the largest count cluster by small jitter
+        centers = centers.astype(np.float64, copy=True)
+        weights = counts.astype(np.float64)
+        counts = counts.copy()
+        dist = _lab_distance(centers[:, None, :], centers[None, :, :], metric)
+        np.fill_diagonal(dist, np.inf)
+        alive = np.ones(k, dtype=bool)
+        for _ in range(k - 1):
+            flat = int(np.argmin(dist))
+            i, j = divmod(flat, k)
+            if not dist[i, j] < threshold:
+                break
+            i, j = min(i, j), max(i, j)
+            total = weights[i] + weights[j]
+            if total > 0:
+                centers[i] = (centers[i] * weights[i] + centers[j] * weights[j]) / total
+            else:
+                centers[i] = (centers[i] + centers[j]) / 2
+            weights[i] = total
+            counts[i] += counts[j]
+            alive[j] = False
+            dist[j, :] = np.inf
+            dist[:, j] = np.inf
+            row = np.where(alive, _lab_distance(centers[i], centers, metric), np.inf)
+            row[i] = np.inf
+            dist[i, :] = row
+            dist[:, i] = row
+        return centers[alive], counts[alive]
+
+    def _ensure_k(self, centers: np.ndarray, counts: np.ndarray, data_lab: Optional[np.ndarray], k: int, seed: int,
+                  weights: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if centers.shape[0] < k and data_lab is not None:
+            centers, counts = self._split_clusters(centers, counts, data_lab, weights, k)
+        missing = k - centers.shape[0]
+        if missing > 0:
+            # no points to split (torch backend) or only identical points left:
+            # add jittered copies of the largest cluster
+            rng = np.random.default_rng(seed)
             idx = int(np.argmax(counts))
-            c = centers[idx]
-            jitter = (rng.random(centers.shape[1]) - 0.5) * 2.0
-            new_c = c + jitter
-            centers = np.vstack([centers, new_c])
-            counts = np.append(counts, counts[idx] // 2)
+            jitter = (rng.random((missing, centers.shape[1])) - 0.5) * 2.0
+            centers = np.vstack([centers, centers[idx] + jitter])
+            counts = np.append(counts, np.full(missing, counts[idx] // 2))
         if centers.shape[0] > k:
             # drop smallest
             order = np.argsort(-counts)
@@ -229,8 +901,88 @@ class ImagePaletteExtractor:
             counts = counts[order]
         return centers, counts
 
-    def _sort(self, centers_rgb: np.ndarray, counts: np.ndarray, mode: str) -> Tuple[np.ndarray, np.ndarray]:
-        if mode == "hue":
+    def _split_clusters(self, centers: np.ndarray, counts: np.ndarray, data: np.ndarray,
+                        weights: Optional[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Bisect the cluster with the largest weighted SSE along its principal
+        # axis until there are k clusters. data holds the clustered Lab points
+        # (M,3); the parent's count is divided by the weight of each half.
+        pts = data.reshape(-1, data.shape[-1]).astype(np.float64)
+        w = np.ones(pts.shape[0]) if weights is None else weights.reshape(-1).astype(np.float64)
+        keep = w > 0
+        pts, w = pts[keep], w[keep]
+        n, D = centers.shape
+        if pts.shape[0] == 0:
+            return centers, counts
+        out_c = np.empty((k, D), dtype=np.float64)
+        out_c[:n] = centers
+        out_n = np.zeros(k, dtype=counts.dtype)
+        out_n[:n] = counts
+        labels = np.empty(pts.shape[0], dtype=np.int64)
+        cc = np.einsum('cd,cd->c', centers, centers)[None]
+        step = _chunk_rows(1, n)
+        for s in range(0, pts.shape[0], step):
+            labels[s:s + step] = _assign_chunk(pts[None, s:s + step], centers[None], cc)[0]
+        order = np.argsort(labels, kind="stable")
+        groups = np.split(order, np.cumsum(np.bincount(labels, minlength=n))[:-1])
+
+        # per-cluster weight, weighted sum and weighted sum of squares; the
+        # SSE is sq - |sum|^2 / weight, so a split only touches its own members
+        wsum = np.zeros(k)
+        wsum[:n] = np.bincount(labels, weights=w, minlength=n)
+        sq = np.zeros(k)
+        sq[:n] = np.bincount(labels, weights=w * (pts * pts).sum(1), minlength=n)
+        lin = np.zeros((k, D))
+        for d in range(D):
+            lin[:n, d] = np.bincount(labels, weights=w * pts[:, d], minlength=n)
+
+        def sse(i: int) -> float:
+            return sq[i] - (lin[i] @ lin[i]) / wsum[i] if wsum[i] > 0 else 0.0
+
+        err = np.array([sse(i) for i in range(k)])
+        while n < k:
+            idx = int(np.argmax(err))
+            if err[idx] <= 1e-9 * max(1.0, sq[idx]):
+                break
+            members = groups[idx]
+            x, ww = pts[members], w[members]
+            diff = x - lin[idx] / wsum[idx]
+            axis = np.linalg.eigh((diff * ww[:, None]).T @ diff)[1][:, -1]
+            left = diff @ axis <= 0
+            if left.all() or not left.any():
+                err[idx] = 0.0
+                continue
+            wl = ww * left
+            for i, wi in ((idx, wl), (n, ww - wl)):
+                wsum[i] = wi.sum()
+                lin[i] = wi @ x
+                sq[i] = wi @ (x * x).sum(1)
+                out_c[i] = lin[i] / wsum[i]
+            parent = out_n[idx]
+            out_n[idx] = np.rint(parent * wsum[idx] / (wsum[idx] + wsum[n]))
+            out_n[n] = parent - out_n[idx]
+            groups.append(members[~left])
+            groups[idx] = members[left]
+            err[idx], err[n] = sse(idx), sse(n)
+            n += 1
+        return out_c[:n], out_n[:n]
+
+    def _sort(self, centers_rgb: np.ndarray, counts: np.ndarray, mode: str, centers: Optional[np.ndarray] = None,
+              color_space: str = "cielab") -> Tuple[np.ndarray, np.ndarray]:
+        order = self._sort_order(centers_rgb, counts, mode, centers, color_space)
+        return centers_rgb[order], counts[order]
+
+    def _sort_order(self, centers_rgb: np.ndarray, counts: np.ndarray, mode: str,
+                    centers: Optional[np.ndarray] = None, color_space: str = "cielab") -> np.ndarray:
+        # cielab and linear_rgb keep the sRGB HSV / Rec.709 orderings; oklab
+        # sorts by OKLCh hue and OKLab L of the working-space centers
+        if color_space == "oklab" and mode in ("hue", "luminance") and centers is not None:
+            L = centers[:, 0]
+            if mode == "hue":
+                hue = np.mod(np.arctan2(centers[:, 2], centers[:, 1]), 2 * np.pi)
+                order = np.lexsort((L, hue))  # hue, then lightness
+            else:
+                order = np.argsort(L, kind="stable")
+        elif mode == "hue":
             import colorsys
             hsv = np.array([colorsys.rgb_to_hsv(*c) for c in centers_rgb], dtype=np.float64)
             order = np.lexsort((hsv[:, 2], hsv[:, 0]))  # hue, then value
@@ -239,27 +991,299 @@ class ImagePaletteExtractor:
             order = np.argsort(Y)
         else:
             order = np.argsort(-counts)  # frequency
-        return centers_rgb[order], counts[order]
+        return order
 
-    def extract_palette(self, image, sample_max_pixels: int = 100_000, merge_delta: float = 6.0, seed: int = 42, sort: str = "frequency") -> Tuple[str]:
-        arr = self._to_numpy_rgb01(image)
-        samples = self._downsample_or_sample(arr, sample_max_pixels, seed)
-        lab = _rgb_to_lab(samples)
+    def _merge_fill(self, centers: np.ndarray, counts: np.ndarray, lab: Optional[np.ndarray], k: int,
+                    merge_delta: float, seed: int, merge_metric: str = "euclidean",
+                    weights: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # merge close clusters, then split the widest ones back up to k
+        centers, counts = self._merge_close(centers, counts, threshold=merge_delta, metric=merge_metric)
+        return self._ensure_k(centers, counts, lab, k, seed, weights)
 
-        k = 8
-        centers, labels = _kmeans(lab, k=k, iters=15, seed=seed)
-        # counts per cluster
-        counts = np.bincount(labels, minlength=k).astype(np.int64)
-        # merge close clusters
-        centers, counts = self._merge_close(centers, counts, threshold=merge_delta)
-        centers, counts = self._ensure_k(centers, counts, lab, k, seed)
+    def _finalize(self, centers: np.ndarray, counts: np.ndarray, lab: Optional[np.ndarray], k: int,
+                  merge_delta: float, seed: int, sort: str, merge_metric: str = "euclidean",
+                  weights: Optional[np.ndarray] = None, color_space: str = "cielab") -> List[str]:
+        centers, counts = self._merge_fill(centers, counts, lab, k, merge_delta, seed, merge_metric, weights)
         # to sRGB
-        centers_rgb = _lab_to_rgb(centers)
-        centers_rgb, counts = self._sort(centers_rgb, counts, mode=sort)
+        centers_rgb = _working_to_rgb(centers, color_space)
+        centers_rgb, counts = self._sort(centers_rgb, counts, mode=sort, centers=centers, color_space=color_space)
 
-        # hex and json
-        hexes = [_hex_from_rgb01(c) for c in centers_rgb[:k]]
+        hexes = rgb01_to_hex(centers_rgb[:k])
         while len(hexes) < k:
             hexes.append("#000000")
-        custom_json = json.dumps({"colors": hexes}, ensure_ascii=False)
-        return (custom_json,)
+        return hexes
+
+    def _cluster_numpy(self, image, k: int, sample_max_pixels: int, seed: int, batch_mode: str,
+                       quantize_bits: int, lab_mode: str, algorithm: str = "lloyd",
+                       sampler: str = "random", max_iter: int = 15, tol: float = 0.0, n_init: int = 1,
+                       color_space: str = "cielab", mask=None, grid: Optional[Tuple[int, int]] = None) -> _Clusters:
+        tiles = None
+        if mask is not None or grid is not None:
+            # regions: sampled like lloyd/random, with positions for the mask and tiles
+            with palette_metrics.stage("convert"):
+                frames = self._frames_view(image, first_only=batch_mode == "first")
+                mask = None if mask is None else self._mask_view(mask, frames)
+            with palette_metrics.stage("sample"):
+                samples, weights, ids = self._sample_regions(frames, mask, grid, sample_max_pixels, seed, sampler,
+                                                             pooled=batch_mode == "shared")
+            if grid is not None:
+                R, C = grid
+                H, W = frames.shape[1:3]
+                # pixel row y is in tile row y * R // H
+                edges_y = [-(-r * H // R) for r in range(R + 1)]
+                edges_x = [-(-c * W // C) for c in range(C + 1)]
+                boxes = [(edges_y[r], edges_x[c], edges_y[r + 1], edges_x[c + 1]) for r in range(R) for c in range(C)]
+                tiles = _Tiles(ids, boxes, C)
+            return self._cluster_samples(samples, weights, k, seed, lab_mode, max_iter, tol, n_init, color_space,
+                                         tiles)
+        if algorithm == "minibatch" and quantize_bits <= 0:
+            frames = self._frames_view(image, first_only=batch_mode == "first")
+            if batch_mode == "shared":
+                # the whole batch as one tall image
+                frames = frames.reshape(1, -1, frames.shape[2], 3)
+            max_steps = max(1, sample_max_pixels // _MINIBATCH_SIZE)
+            # sampling, Lab conversion and updates interleave batch by batch
+            with palette_metrics.stage("minibatch"):
+                centers, seen, last = _minibatch_kmeans(self._stream_batches(frames, seed, lab_mode, color_space),
+                                                        k, seed, max_steps)
+            steps = int(round(seen[0].sum() / last.shape[1]))
+            # inertia is estimated from the last batch, scaled up to every pixel seen
+            inertia = float((_inertia(last, centers) * seen.sum(axis=1) / last.shape[1]).sum())
+            palette_metrics.record(samples=int(seen.sum()), n_iter=steps)
+            return _Clusters(centers, np.rint(seen).astype(np.int64), last, None, steps, inertia)
+        if algorithm not in ("lloyd", "minibatch"):
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        weights = None
+        if quantize_bits > 0:
+            # every pixel goes into the histogram; no random subsampling needed
+            with palette_metrics.stage("convert"):
+                if batch_mode == "first":
+                    frames = self._to_numpy_rgb01(image)[None]
+                else:
+                    frames = self._to_numpy_rgb01_batch(image)
+            with palette_metrics.stage("sample"):
+                samples, weights = self._histogram_bins(frames, quantize_bits, pooled=batch_mode == "shared")
+        else:
+            # sample from the unconverted image; only the samples are copied
+            with palette_metrics.stage("convert"):
+                frames = self._frames_view(image, first_only=batch_mode == "first")
+            with palette_metrics.stage("sample"):
+                if batch_mode == "shared":
+                    # one palette for the whole batch; the sample budget is split across frames
+                    per_frame = max(1, -(-sample_max_pixels // frames.shape[0]))
+                    samples = self._sample(frames, per_frame, seed, sampler).reshape(1, -1, 3)
+                else:
+                    # per_frame: sampling, Lab conversion and k-means run over all frames at once
+                    samples = self._sample(frames, sample_max_pixels, seed, sampler)
+        return self._cluster_samples(samples, weights, k, seed, lab_mode, max_iter, tol, n_init, color_space)
+
+    def _cluster_samples(self, samples: np.ndarray, weights: Optional[np.ndarray], k: int, seed: int, lab_mode: str,
+                         max_iter: int, tol: float, n_init: int, color_space: str,
+                         tiles: Optional[_Tiles] = None) -> _Clusters:
+        with palette_metrics.stage("lab"):
+            lab = _rgb_to_working(samples, color_space, lab_mode)
+        with palette_metrics.stage("kmeans"):
+            fit = _kmeans_best(lab, k=k, max_iter=max_iter, seed=seed, weights=weights, tol=tol, n_init=n_init)
+        palette_metrics.record(samples=int(lab.shape[0] * lab.shape[1]), n_iter=fit.n_iter)
+        # counts per cluster
+        B = lab.shape[0]
+        flat = (fit.labels + (np.arange(B) * k)[:, None]).ravel()
+        counts = np.bincount(flat, weights=None if weights is None else weights.ravel(), minlength=B * k)
+        return _Clusters(fit.centers, counts.reshape(B, k).astype(np.int64), lab, weights,
+                         fit.n_iter, float(fit.inertia.sum()), tiles)
+
+    def _cluster_torch(self, image, k: int, sample_max_pixels: int, seed: int, batch_mode: str,
+                       quantize_bits: int, max_iter: int = 15, tol: float = 0.0, n_init: int = 1,
+                       color_space: str = "cielab") -> _Clusters:
+        # Same as _cluster_numpy but on the IMAGE tensor's own device; only the
+        # k centers and counts come back to the CPU. Lab is always exact here.
+        try:
+            from . import torch_backend as tb
+        except ImportError:  # loaded as a top-level module (tests)
+            import torch_backend as tb  # type: ignore
+
+        torch = _import_torch()
+        if not isinstance(image, torch.Tensor):
+            image = torch.from_numpy(np.asarray(image, dtype=np.float32))
+        # stage times are host-side; on CUDA, queued kernels land in the
+        # stage that first waits for them (kmeans, or the final copy)
+        with palette_metrics.stage("convert"):
+            frames = tb.to_bhwc(image, first_only=batch_mode == "first")
+        weights = None
+        with palette_metrics.stage("sample"):
+            if quantize_bits > 0:
+                samples, weights = tb.histogram_bins(frames, quantize_bits, pooled=batch_mode == "shared")
+            elif batch_mode == "shared":
+                per_frame = max(1, -(-sample_max_pixels // frames.shape[0]))
+                samples = tb.sample(frames, per_frame, seed).reshape(1, -1, 3)
+            else:
+                samples = tb.sample(frames, sample_max_pixels, seed)
+        with palette_metrics.stage("lab"):
+            lab = tb.rgb_to_working(samples, color_space)
+        with palette_metrics.stage("kmeans"):
+            centers, labels, n_iter, inertia = tb.kmeans_best(lab, k=k, max_iter=max_iter, seed=seed,
+                                                              weights=weights, tol=tol, n_init=n_init)
+            counts = tb.cluster_counts(labels, k, weights)
+        palette_metrics.record(samples=int(lab.shape[0] * lab.shape[1]), n_iter=n_iter)
+        return _Clusters(tb.to_numpy(centers), np.rint(tb.to_numpy(counts)).astype(np.int64), None, None,
+                         n_iter, float(inertia.sum()))
+
+    def _tile_palettes(self, cl: _Clusters, k: int, merge_delta: float, seed: int, sort: str, merge_metric: str,
+                       max_iter: int, tol: float, n_init: int, color_space: str, per_frame: bool) -> List[dict]:
+        # One k-means + finalize per (frame, tile) on a thread pool, over the
+        # points already sampled and converted for the whole image. A tile
+        # without points (masked out) gets an empty palette.
+        tiles = cl.tiles
+        n_tiles = len(tiles.boxes)
+        jobs = []
+        for b in range(cl.points.shape[0]):
+            ids, pts = tiles.ids[b], cl.points[b]
+            if cl.weights is not None:
+                live = cl.weights[b] > 0
+                ids, pts = ids[live], pts[live]
+            # points grouped by tile with one sort instead of a mask per tile
+            order = np.argsort(ids, kind="stable")
+            bounds = np.cumsum(np.bincount(ids, minlength=n_tiles))[:-1]
+            jobs.extend((b, t, group) for t, group in enumerate(np.split(pts[order], bounds)))
+
+        def run(job: Tuple[int, int, np.ndarray]) -> Tuple[List[str], int]:
+            _, _, pts = job
+            if pts.shape[0] == 0:
+                return [], 0
+            fit = _kmeans_best(pts, k=k, max_iter=max_iter, seed=seed, tol=tol, n_init=n_init)
+            counts = np.bincount(fit.labels, minlength=k).astype(np.int64)
+            return self._finalize(fit.centers, counts, pts, k, merge_delta, seed, sort, merge_metric, None,
+                                  color_space), int(pts.shape[0])
+
+        workers = max(1, min(len(jobs), os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, jobs))
+        out = []
+        for (b, t, _), (colors, n) in zip(jobs, results):
+            entry = {"row": t // tiles.cols, "col": t % tiles.cols, "box": list(tiles.boxes[t]),
+                     "colors": colors, "samples": n}
+            out.append({"frame": b, **entry} if per_frame else entry)
+        return out
+
+    def _use_torch(self, image, backend: str, algorithm: str = "lloyd") -> bool:
+        if backend == "numpy" or algorithm == "minibatch":
+            return False
+        if backend == "torch":
+            if _import_torch() is None:
+                raise RuntimeError("backend=torch requested but torch is not installed")
+            return True
+        if backend == "auto":
+            torch = _loaded_torch()
+            return torch is not None and isinstance(image, torch.Tensor)
+        raise ValueError(f"Unknown backend: {backend}")
+
+    def extract_palette(self, image, sample_max_pixels: int = 100_000, merge_delta: float = 6.0, seed: int = 42,
+                        sort: str = "frequency", batch_mode: str = "first", quantize_bits: int = 0,
+                        lab_mode: str = "exact", backend: str = "numpy", use_cache: bool = True,
+                        algorithm: str = "lloyd", sampler: str = "random", merge_metric: str = "euclidean",
+                        palette_size: int = 8, max_iter: int = 15, kmeans_tol: float = 0.1, n_init: int = 1,
+                        color_space: str = "cielab", temporal_skip: float = 0.05, tile_rows: int = 1,
+                        tile_cols: int = 1, mask=None) -> Tuple[str]:
+        params = dict(sample_max_pixels=sample_max_pixels, merge_delta=merge_delta, seed=seed, sort=sort,
+                      batch_mode=batch_mode, quantize_bits=quantize_bits, lab_mode=lab_mode, backend=backend,
+                      algorithm=algorithm, sampler=sampler, merge_metric=merge_metric, palette_size=palette_size,
+                      max_iter=max_iter, kmeans_tol=kmeans_tol, n_init=n_init, color_space=color_space)
+        if batch_mode == "temporal":
+            params["temporal_skip"] = temporal_skip
+        if tile_rows * tile_cols > 1:
+            params.update(tile_rows=tile_rows, tile_cols=tile_cols)
+        with palette_metrics.extraction(node="ImagePaletteExtractor", backend=backend, algorithm=algorithm,
+                                        batch_mode=batch_mode, k=palette_size):
+            cache = palette_cache.get_result_cache()
+            # temporal results depend on the frames seen before, not only on this
+            # image; device tensors would need a full host copy just for the key
+            if (not (use_cache and cache.enabled) or batch_mode == "temporal" or not palette_cache.can_digest(image)
+                    or (mask is not None and not palette_cache.can_digest(mask))):
+                palette_metrics.record(cache="off")
+                return (self._extract(image, mask=mask, **params),)
+            with palette_metrics.stage("cache"):
+                key_params = params if mask is None else dict(params, mask=palette_cache.image_digest(mask))
+                key = palette_cache.make_key(palette_cache.image_digest(image), key_params)
+                custom_json = cache.get(key)
+            palette_metrics.record(cache="miss" if custom_json is None else "hit")
+            if custom_json is None:
+                custom_json = self._extract(image, mask=mask, **params)
+                cache.put(key, custom_json)
+            return (custom_json,)
+
+    def _extract(self, image, sample_max_pixels: int, merge_delta: float, seed: int, sort: str,
+                 batch_mode: str, quantize_bits: int, lab_mode: str, backend: str, algorithm: str,
+                 sampler: str, merge_metric: str, palette_size: int, max_iter: int, kmeans_tol: float,
+                 n_init: int, color_space: str = "cielab", temporal_skip: float = 0.05, tile_rows: int = 1,
+                 tile_cols: int = 1, mask=None) -> str:
+        k = int(palette_size)
+        if not 1 <= k <= 256:
+            raise ValueError(f"palette_size must be in 1..256, got {palette_size}")
+        if batch_mode not in _BATCH_MODES:
+            raise ValueError(f"Unknown batch_mode: {batch_mode}")
+        if merge_metric not in _MERGE_METRICS:
+            raise ValueError(f"Unknown merge_metric: {merge_metric}")
+        if color_space not in _COLOR_SPACES:
+            raise ValueError(f"Unknown color_space: {color_space}")
+        if merge_metric == "ciede2000" and color_space != "cielab":
+            raise ValueError("merge_metric=ciede2000 needs color_space=cielab")
+        if not (1 <= tile_rows <= _MAX_TILES and 1 <= tile_cols <= _MAX_TILES):
+            raise ValueError(f"tile_rows and tile_cols must be in 1..{_MAX_TILES}")
+        grid = (int(tile_rows), int(tile_cols)) if tile_rows * tile_cols > 1 else None
+        if batch_mode == "temporal":
+            if mask is not None or grid is not None:
+                raise ValueError("mask and tiles are not supported with batch_mode=temporal")
+            return self._extract_temporal(image, dict(
+                k=k, sample_max_pixels=sample_max_pixels, merge_delta=merge_delta, seed=seed, sort=sort,
+                quantize_bits=quantize_bits, lab_mode=lab_mode, sampler=sampler, merge_metric=merge_metric,
+                max_iter=max_iter, kmeans_tol=kmeans_tol, n_init=n_init, color_space=color_space,
+                skip_delta=temporal_skip))
+        if mask is None and grid is None and self._use_torch(image, backend, algorithm):
+            cl = self._cluster_torch(image, k, sample_max_pixels, seed, batch_mode, quantize_bits, max_iter, kmeans_tol,
+                                     n_init, color_space)
+        else:
+            cl = self._cluster_numpy(image, k, sample_max_pixels, seed, batch_mode, quantize_bits, lab_mode,
+                                     algorithm, sampler, max_iter, kmeans_tol, n_init, color_space, mask, grid)
+        with palette_metrics.stage("finalize"):
+            palettes = [
+                self._finalize(cl.centers[b], cl.counts[b], None if cl.points is None else cl.points[b], k,
+                               merge_delta, seed, sort, merge_metric, None if cl.weights is None else cl.weights[b],
+                               color_space)
+                for b in range(cl.centers.shape[0])
+            ]
+        out = {"colors": palettes[0]}
+        if batch_mode == "per_frame":
+            # "colors" keeps the first frame so the output still feeds ColorPalette(custom)
+            out["frames"] = palettes
+        out["kmeans"] = {"n_iter": cl.n_iter, "inertia": round(cl.inertia, 3)}
+        if cl.tiles is not None:
+            with palette_metrics.stage("tiles"):
+                out["tiles"] = self._tile_palettes(cl, k, merge_delta, seed, sort, merge_metric, max_iter, kmeans_tol,
+                                                   n_init, color_space, per_frame=batch_mode == "per_frame")
+        return json.dumps(out, ensure_ascii=False)
+
+    def _extract_temporal(self, image, config: dict) -> str:
+        # frames of this batch in order through the node's tracker; kmeans
+        # reports the passes of this call and the inertia of the last keyframe
+        try:
+            from .palette_tracker import PaletteTracker
+        except ImportError:  # loaded as a top-level module (tests)
+            from palette_tracker import PaletteTracker  # type: ignore
+
+        tracker = self._tracker
+        if tracker is None or tracker.config != config:
+            tracker = self._tracker = PaletteTracker(**config)
+        with palette_metrics.stage("convert"):
+            frames = self._frames_view(image)
+        n_iter, skipped = tracker.n_iter, tracker.skipped
+        palettes = [tracker.update(frames[b:b + 1]) for b in range(frames.shape[0])]
+        skipped = tracker.skipped - skipped
+        palette_metrics.record(n_iter=tracker.n_iter - n_iter, skipped=skipped)
+        out = {
+            "colors": palettes[0],
+            "frames": palettes,
+            "kmeans": {"n_iter": tracker.n_iter - n_iter, "inertia": round(tracker.inertia, 3)},
+            "tracking": {"clustered": len(palettes) - skipped, "skipped": skipped,
+                         "last_delta": round(tracker.last_delta, 4)},
+        }
+        return json.dumps(out, ensure_ascii=False)
@@ -97,6 +97,42 @@ function parseCustomColors(text) {
     }
 }
 
+// プリセット色の一括取得: 同じタイミングで要求されたプリセットを 1 回の GET にまとめる。
+// ブラウザは ETag で再検証するので、変更がなければ 304 で済む。
+const presetQueue = new Map(); // preset -> [{ resolve, reject }]
+let presetFlushTimer = null;
+
+function fetchPresetColors(preset) {
+    return new Promise((resolve, reject) => {
+        if (!presetQueue.has(preset)) presetQueue.set(preset, []);
+        presetQueue.get(preset).push({ resolve, reject });
+        if (!presetFlushTimer) presetFlushTimer = setTimeout(flushPresetQueue, 0);
+    });
+}
+
+async function flushPresetQueue() {
+    const batch = new Map(presetQueue);
+    presetQueue.clear();
+    presetFlushTimer = null;
+    const query = [...batch.keys()].map(p => `name=${encodeURIComponent(p)}`).join('&');
+    try {
+        const response = await fetch(`/tj_comfyuiutil/palettes?${query}`, { cache: 'no-cache' });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const data = await response.json();
+        for (const [preset, waiters] of batch) {
+            const colors = data.palettes?.[preset];
+            for (const w of waiters) {
+                if (colors) w.resolve(colors);
+                else w.reject(new Error(`unknown preset: ${preset}`));
+            }
+        }
+    } catch (e) {
+        for (const waiters of batch.values()) {
+            for (const w of waiters) w.reject(e);
+        }
+    }
+}
+
 function setErrorVisual(node, on) {
     const ui = node.__palette_ui__;
     if (!ui) return;
@@ -170,19 +206,12 @@ app.registerExtension({
                         updateChips(this, this.__palette_ui__.chips);
                     }
                 } else {
-                    // プリセットはサーバーから即時取得
+                    // プリセットはサーバーから取得 (他ノードの要求とまとめて 1 リクエスト)
                     try {
-                        const response = await fetch('/tj_comfyuiutil/palette', {
-                            method: 'POST',
-                            headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify({ preset })
-                        });
-                        if (response.ok) {
-                            const colors = await response.json();
-                            this.__palette_colors__ = colors;
-                            setErrorVisual(this, false);
-                            updateChips(this, this.__palette_ui__.chips);
-                        }
+                        const colors = await fetchPresetColors(preset);
+                        this.__palette_colors__ = colors;
+                        setErrorVisual(this, false);
+                        updateChips(this, this.__palette_ui__.chips);
                     } catch (e) {
                         console.error(`[${EXT_NAME}] Failed to fetch palette:`, e);
                     }
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Dict
+
+# Deferred loading of the node modules (and of NumPy/torch with them).
+#
+# load_module(name) imports a sibling module on demand, for code that only
+# needs it on some paths. lazy_node("image_palette_extractor", "ImagePaletteExtractor") returns a
+# stand-in class for NODE_CLASS_MAPPINGS that imports the real module only
+# when ComfyUI first touches the node (INPUT_TYPES for /object_info, an
+# attribute, or instantiation for execution); until then registering the
+# package imports neither NumPy nor torch. Every attribute read on the
+# stand-in, and every instance it creates, comes from the real class.
+# Attributes ComfyUI sets on the stand-in (RELATIVE_PYTHON_MODULE) stay on it.
+
+_PACKAGE = __name__.rpartition(".")[0]
+_lock = threading.Lock()
+
+
+def load_module(name: str) -> ModuleType:
+    """Sibling module by bare name, both inside the ComfyUI package and when
+    the modules are loaded top-level (tests, scripts)."""
+    return importlib.import_module(f"{_PACKAGE}.{name}" if _PACKAGE else name)
+
+
+class _LazyNodeMeta(type):
+    _real: Dict[type, type] = {}
+
+    def _load(cls) -> type:
+        real = _LazyNodeMeta._real.get(cls)
+        if real is None:
+            with _lock:
+                real = _LazyNodeMeta._real.get(cls)
+                if real is None:
+                    real = getattr(load_module(cls._module), cls._class)
+                    _LazyNodeMeta._real[cls] = real
+        return real
+
+    def __getattr__(cls, name: str) -> Any:
+        # only called for names the stand-in itself does not define
+        if name.startswith("__") and name.endswith("__"):
+            raise AttributeError(name)
+        return getattr(cls._load(), name)
+
+    def __call__(cls, *args: Any, **kwargs: Any) -> Any:
+        return cls._load()(*args, **kwargs)
+
+    @property
+    def loaded(cls) -> bool:
+        return cls in _LazyNodeMeta._real
+
+
+def lazy_node(module: str, class_name: str) -> type:
+    return _LazyNodeMeta(class_name, (), {"_module": module, "_class": class_name, "__module__": __name__})
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    from .color_palette import ColorPalette
+    from .lazy_import import load_module
+    from .palette_registry import get_registry
+except ImportError:  # loaded as a top-level module (tests)
+    from color_palette import ColorPalette  # type: ignore
+    from lazy_import import load_module  # type: ignore
+    from palette_registry import get_registry  # type: ignore
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Request handling behind the /tj_comfyuiutil/palette* routes in __init__.py,
+# kept free of aiohttp/ComfyUI so it can be tested directly.
+#
+#   POST /tj_comfyuiutil/palette    {"preset": ..., "custom_json": ...} -> [8 colors]
+#   POST /tj_comfyuiutil/palettes   {"requests": [{"preset": ...}, ...]} -> {"results": [[...], ...]}
+#   GET  /tj_comfyuiutil/palettes?name=a&name=b  -> {"palettes": {"a": [...], ...}}
+#        (every preset without name=), with an ETag of the preset file versions
+#        and Cache-Control: no-cache, so browsers revalidate and get 304s.
+#   POST /tj_comfyuiutil/palette_match  {"colors": [...], "k": 5} -> {"matches": [{"name", "distance"}, ...]}
+#        or {"queries": [[...], {"colors": [...]}, ...], "k": 5} -> {"results": [[...], ...]}
+#   POST /tj_comfyuiutil/extract_palette  image upload (+ extractor inputs) -> custom_json object
+#
+# The routes run these functions on palette_worker pools, JSON parsing
+# included (from_json), so the event loop only moves bytes. NumPy, the
+# extractor and the match index are imported on first use, not when
+# __init__.py registers the routes.
+
+# Upper bound on items per batch request
+MAX_BATCH = 1024
+MAX_MATCHES = 100
+CACHE_CONTROL = "no-cache"
+# Uploads to /extract_palette: encoded size and decoded pixel count (the
+# frames are converted to float32, 4096x4096 is ~200 MB)
+MAX_UPLOAD_BYTES = 32 << 20
+MAX_UPLOAD_PIXELS = 4096 * 4096
+_NPY_MAGIC = b"\x93NUMPY"
+
+_node: Optional[ColorPalette] = None
+
+
+def _palette_node() -> ColorPalette:
+    global _node
+    if _node is None:
+        _node = ColorPalette()
+    return _node
+
+
+def resolve(preset: str = "primary", custom_json: str = "") -> List[str]:
+    node = _palette_node()
+    if preset == "custom":
+        return node._parse_custom(custom_json)
+    return node.load_palette(preset)
+
+
+def from_json(fn: Callable[[Any], Any], body: bytes) -> Any:
+    """fn(parsed request body); invalid JSON raises ValueError."""
+    return fn(json.loads(body))
+
+
+def resolve_request(data: Any) -> List[str]:
+    """{"preset": ..., "custom_json": ...} -> 8 colors."""
+    return resolve(data.get("preset", "primary"), data.get("custom_json", ""))
+
+
+def resolve_batch(body: Any) -> Dict[str, List[List[str]]]:
+    """{"requests": [{"preset", "custom_json"}, ...]} (or the bare list) -> {"results": [...]} in order."""
+    items = body.get("requests") if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise ValueError('expected {"requests": [...]}')
+    if len(items) > MAX_BATCH:
+        raise ValueError(f"too many requests in one batch ({len(items)} > {MAX_BATCH})")
+    results = []
+    for item in items:
+        if isinstance(item, str):
+            item = {"preset": item}
+        if not isinstance(item, dict):
+            raise ValueError("each request must be an object or a preset name")
+        results.append(resolve(str(item.get("preset", "primary")), str(item.get("custom_json", ""))))
+    return {"results": results}
+
+
+def _matches(colors: Any, k: int) -> List[Dict[str, Any]]:
+    if isinstance(colors, dict):
+        colors = colors.get("colors")
+    if not isinstance(colors, (list, str)):
+        raise ValueError('each query must be a list of "#RRGGBB" colors or {"colors": [...]}')
+    try:
+        found = load_module("palette_index").get_preset_index().query(colors, k)
+    except (TypeError, ValueError) as e:  # also json.JSONDecodeError
+        raise ValueError(f"invalid palette: {e}") from e
+    return [{"name": name, "distance": dist} for name, dist in found]
+
+
+def match(body: Any) -> Dict[str, Any]:
+    """Nearest presets for one palette ({"colors"}) or many ({"queries"})."""
+    if not isinstance(body, dict):
+        raise ValueError('expected {"colors": [...]} or {"queries": [...]}')
+    try:
+        k = int(body.get("k", 5))
+    except (TypeError, ValueError):
+        raise ValueError("k must be an integer") from None
+    k = max(1, min(MAX_MATCHES, k))
+    if "queries" in body:
+        queries = body["queries"]
+        if not isinstance(queries, list):
+            raise ValueError('"queries" must be a list')
+        if len(queries) > MAX_BATCH:
+            raise ValueError(f"too many queries in one batch ({len(queries)} > {MAX_BATCH})")
+        return {"results": [_matches(q, k) for q in queries]}
+    return {"matches": _matches(body.get("colors", body.get("custom_json")), k)}
+
+
+def presets_payload(names: Sequence[str] = (), if_none_match: Optional[str] = None,
+                    ) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Colors for the named presets (all when empty) and their ETag.
+    The payload is None, and never built, when if_none_match matches the ETag."""
+    registry = get_registry()
+    names = list(dict.fromkeys(names)) if names else registry.names()
+    etag = registry.etag(names)
+    if etag_matches(if_none_match, etag):
+        return None, etag
+    return {"palettes": {name: resolve(name) for name in names}}, etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip() for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def extract_params(raw: Mapping[str, Any]) -> Dict[str, Any]:
+    """Validate ImagePaletteExtractor inputs given as strings (form fields /
+    query) against its INPUT_TYPES; returns them converted."""
+    specs = load_module("image_palette_extractor").ImagePaletteExtractor.INPUT_TYPES()["required"]
+    params: Dict[str, Any] = {}
+    for name, value in raw.items():
+        if name == "image" or name not in specs:
+            raise ValueError(f"unknown parameter: {name}")
+        kind, opts = specs[name]
+        if kind == "INT" or kind == "FLOAT":
+            try:
+                v = int(value) if kind == "INT" else float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be a number") from None
+            if not opts.get("min", v) <= v <= opts.get("max", v):
+                raise ValueError(f"{name} must be in {opts['min']}..{opts['max']}")
+        elif kind == "BOOLEAN":
+            v = str(value).strip().lower()
+            if v not in ("1", "true", "yes", "on", "0", "false", "no", "off"):
+                raise ValueError(f"{name} must be true or false")
+            v = v in ("1", "true", "yes", "on")
+        else:
+            v = str(value)
+            if v not in opts["choices"]:
+                raise ValueError(f"{name} must be one of {', '.join(opts['choices'])}")
+        params[name] = v
+    return params
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """Uploaded file -> (B,H,W,3) float32 0..1. Anything Pillow reads, or a
+    .npy array ((H,W,3) / (B,H,W,3), uint8 0..255 or float 0..1)."""
+    import numpy as np
+
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError(f"upload is larger than {MAX_UPLOAD_BYTES >> 20} MB")
+    if data[:len(_NPY_MAGIC)] == _NPY_MAGIC:
+        arr = np.load(io.BytesIO(data), allow_pickle=False)
+        if arr.ndim not in (3, 4) or arr.shape[-1] != 3 or arr.dtype.kind not in "uif":
+            raise ValueError("expected a (H,W,3) or (B,H,W,3) numeric array")
+    else:
+        try:
+            from PIL import Image
+        except ImportError:
+            raise RuntimeError("Pillow is required to decode uploaded images") from None
+        try:
+            with Image.open(io.BytesIO(data)) as im:
+                # checked before decoding, so oversized images are never expanded
+                if im.width * im.height > MAX_UPLOAD_PIXELS:
+                    raise ValueError(f"image has more than {MAX_UPLOAD_PIXELS} pixels")
+                arr = np.asarray(im.convert("RGB"))
+        except OSError as e:  # includes PIL.UnidentifiedImageError
+            raise ValueError(f"not a readable image: {e}") from None
+    if arr.size // 3 > MAX_UPLOAD_PIXELS:
+        raise ValueError(f"image has more than {MAX_UPLOAD_PIXELS} pixels")
+    if arr.dtype.kind in "ui":
+        out = arr.astype(np.float32)
+        out *= 1.0 / 255.0
+    else:
+        out = arr.astype(np.float32)
+    np.clip(out, 0.0, 1.0, out=out)
+    return out if out.ndim == 4 else out[None]
+
+
+def upload_key(data: bytes, raw: Mapping[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """Coalescing key of an extraction request: content digest + inputs."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest(), tuple(sorted((k, str(v)) for k, v in raw.items()))
+
+
+def extract(data: bytes, raw: Mapping[str, Any]) -> Dict[str, Any]:
+    """ImagePaletteExtractor on an uploaded image -> its custom_json as an object."""
+    params = extract_params(raw)
+    image = decode_image(data)
+    extractor = load_module("image_palette_extractor").ImagePaletteExtractor()
+    (custom_json,) = extractor.extract_palette(image, **params)
+    return json.loads(custom_json)
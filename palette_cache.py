@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Result cache for ImagePaletteExtractor.
+#
+# Keys are a content hash of the IMAGE plus every extraction parameter, so a
+# hit returns exactly what a fresh run would have produced. Two tiers:
+#   memory - bounded LRU (max_entries) with an optional TTL
+#   disk   - optional directory of small JSON files that survives restarts
+#
+# Environment (read once for the shared instance, see get_result_cache):
+#   TJ_COLORUTIL_RESULT_CACHE_SIZE   max in-memory entries (default 128, 0 = off)
+#   TJ_COLORUTIL_RESULT_CACHE_TTL    seconds before an entry expires (0 = never)
+#   TJ_COLORUTIL_RESULT_CACHE_DIR    enables the disk tier in this directory
+#
+# Only host memory is hashed: a tensor on another device (CUDA, MPS) would
+# have to be copied to the host in full just to build the key, which costs
+# more than the extraction the cache would save. ImagePaletteExtractor skips
+# the cache for such inputs (see can_digest).
+
+# Part of every key. Bump it whenever a change to the extraction makes the same
+# image and parameters produce a different result, so the disk tier does not
+# serve palettes computed by older code.
+CACHE_VERSION = 1
+
+
+def can_digest(image) -> bool:
+    """True if image_digest can hash the image in place (not a tensor on a GPU or other device)."""
+    device = getattr(image, "device", None)
+    return device is None or getattr(device, "type", "cpu") == "cpu"
+
+
+def _tensor_bytes(image) -> Tuple[memoryview, Tuple[int, ...], str]:
+    if hasattr(image, "detach"):  # torch.Tensor without importing torch
+        if not can_digest(image):
+            raise ValueError(f"image_digest needs a CPU tensor, got one on {image.device}")
+        t = image.detach().contiguous()
+        try:
+            arr = t.numpy()
+        except TypeError:  # bfloat16 and other dtypes NumPy has no equivalent for: hash the raw bytes
+            import torch  # already loaded, image is a tensor
+            return memoryview(t.view(torch.uint8).numpy()).cast("B"), tuple(t.shape), str(t.dtype)
+    else:
+        arr = np.asarray(image)
+    arr = np.ascontiguousarray(arr)
+    return memoryview(arr).cast("B"), arr.shape, arr.dtype.str
+
+
+def _version_of(image) -> Optional[int]:
+    # inference tensors (torch.inference_mode, how ComfyUI runs nodes) have no
+    # version counter and raise on _version; they are hashed every time
+    try:
+        return getattr(image, "_version", None)
+    except RuntimeError:
+        return None
+
+
+class _DigestMemo:
+    # id(tensor) -> (weakref, tensor._version, digest). torch bumps _version on
+    # every in-place write, so an unchanged tensor that ComfyUI passes again is
+    # recognized without re-hashing its pixels.
+    def __init__(self):
+        self._entries: Dict[int, Tuple[Any, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, image) -> Optional[str]:
+        version = _version_of(image)
+        if version is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(id(image))
+        if entry is not None and entry[0]() is image and entry[1] == version:
+            return entry[2]
+        return None
+
+    def put(self, image, digest: str) -> None:
+        version = _version_of(image)
+        if version is None:
+            return
+        key = id(image)
+        try:
+            ref = weakref.ref(image, lambda _, key=key: self._drop(key))
+        except TypeError:
+            return
+        with self._lock:
+            self._entries[key] = (ref, version, digest)
+
+    def _drop(self, key: int) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+_digest_memo = _DigestMemo()
+
+
+def image_digest(image) -> str:
+    """Content hash of an IMAGE (torch tensor or array-like): shape, dtype and pixels."""
+    cached = _digest_memo.get(image)
+    if cached is not None:
+        return cached
+    data, shape, dtype = _tensor_bytes(image)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((shape, dtype)).encode())
+    h.update(data)
+    digest = h.hexdigest()
+    _digest_memo.put(image, digest)
+    return digest
+
+
+def make_key(digest: str, params: Dict[str, Any]) -> str:
+    blob = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.blake2b(f"v{CACHE_VERSION}|{digest}|{blob}".encode(), digest_size=16).hexdigest()
+
+
+class PaletteCache:
+    """Bounded LRU + TTL cache of extraction results (JSON strings), with an optional disk tier."""
+
+    # puts between scans that trim the disk tier to disk_max_entries
+    _PRUNE_EVERY = 64
+
+    def __init__(self, max_entries: int = 128, ttl: float = 0.0,
+                 disk_dir: Optional[os.PathLike] = None, disk_max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_entries = disk_max_entries
+        self._mem: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    def _expired(self, stamp: float, now: float) -> bool:
+        return self.ttl > 0 and now - stamp > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._mem[key]
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._mem_put(key, value, now)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._mem_put(key, value, now)
+            self._puts += 1
+            prune = self._puts % self._PRUNE_EVERY == 0
+        self._disk_put(key, value)
+        if prune:
+            self._prune_disk()
+
+    def _mem_put(self, key: str, value: str, now: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._mem[key] = (value, now)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"  # type: ignore[operator]
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            if self._expired(path.stat().st_mtime, now):
+                path.unlink()
+                return None
+            return path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, value: str) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[PaletteCache] disk write failed: {e}")
+
+    def _prune_disk(self) -> None:
+        if self.disk_dir is None:
+            return
+        try:
+            files = sorted(self.disk_dir.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        except OSError:
+            return
+        for path in files[:max(0, len(files) - self.disk_max_entries)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._mem),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+            }
+
+
+_result_cache: Optional[PaletteCache] = None
+
+
+def get_result_cache() -> PaletteCache:
+    """Process-wide cache used by ImagePaletteExtractor, configured from the environment."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = PaletteCache(
+            max_entries=int(os.environ.get("TJ_COLORUTIL_RESULT_CACHE_SIZE", "128")),
+            ttl=float(os.environ.get("TJ_COLORUTIL_RESULT_CACHE_TTL", "0")),
+            disk_dir=os.environ.get("TJ_COLORUTIL_RESULT_CACHE_DIR") or None,
+        )
+    return _result_cache
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import json
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+try:
+    from .color_hex import hex_to_rgb01, parse_hex
+    from .image_palette_extractor import _rgb_to_lab
+    from .palette_registry import get_registry
+except ImportError:  # loaded as a top-level module (tests)
+    from color_hex import hex_to_rgb01, parse_hex  # type: ignore
+    from image_palette_extractor import _rgb_to_lab  # type: ignore
+    from palette_registry import get_registry  # type: ignore
+
+# Nearest-palette search over the preset library (and any other palettes).
+#
+# Distance between palettes A and B (CIE76 dE in Lab): the smaller palette is
+# matched one-to-one onto the larger one with the minimum total dE (Hungarian
+# assignment), colors of the larger palette left unmatched add their distance
+# to the nearest color of the smaller one, and the sum is divided by the size
+# of the larger palette. It does not depend on color order; for equal sizes it
+# is the mean dE of the best one-to-one pairing.
+#
+# Every color is also at least as far from its partner as from its nearest
+# neighbour in the other palette, so
+#   max(sum nearest A->B, sum nearest B->A) / max(|A|, |B|)
+# is a lower bound. The index keeps all Lab colors in one contiguous float32
+# array grouped by palette size, computes that bound for every palette at once
+# and runs the assignment only for candidates in increasing bound order until
+# the bound exceeds the current k-th best distance (exact top-k).
+
+_QUERY_CHUNK = 1 << 16  # palette colors per lower-bound block
+_BOUND_SLACK = 1e-3
+
+ColorsLike = Union[str, Sequence[str]]
+
+
+@lru_cache(maxsize=1)
+def _scipy_assignment():
+    # SciPy's solver when installed (imported on first use), else None
+    try:
+        from scipy.optimize import linear_sum_assignment as solve  # type: ignore
+    except Exception:
+        return None
+    return solve
+
+
+def has_fast_assignment() -> bool:
+    return _scipy_assignment() is not None
+
+
+def linear_sum_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Minimum-cost matching of a (n, m) cost matrix (Hungarian algorithm).
+
+    Returns (rows, cols) like scipy.optimize.linear_sum_assignment: every row
+    is matched when n <= m, every column when n > m. Uses SciPy when it is
+    installed; the pure-Python fallback is O(n^2 m), fine for palette sizes
+    up to a few dozen colors.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    solve = _scipy_assignment()
+    if solve is not None:
+        rows, cols = solve(cost)
+        return rows.astype(np.intp), cols.astype(np.intp)
+    return _hungarian(cost)
+
+
+def _hungarian(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    transposed = cost.shape[0] > cost.shape[1]
+    c = (cost.T if transposed else cost).tolist()
+    n, m = len(c), len(c[0]) if c else 0
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)  # p[j]: row matched to column j (1-based, 0 = free)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = c[i0 - 1]
+            ui0 = u[i0]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    pairs = sorted((p[j] - 1, j - 1) for j in range(1, m + 1) if p[j])
+    rows = np.array([r for r, _ in pairs], dtype=np.intp)
+    cols = np.array([col for _, col in pairs], dtype=np.intp)
+    if transposed:
+        order = np.argsort(cols)
+        return cols[order], rows[order]
+    return rows, cols
+
+
+def _pair_dist(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.maximum(((a[:, None, :] - b[None, :, :]) ** 2).sum(-1), 0.0))
+
+
+def palette_distance(lab_a: np.ndarray, lab_b: np.ndarray) -> float:
+    """Assignment-based dE between two (n,3) Lab palettes (see the module notes)."""
+    d = _pair_dist(np.asarray(lab_a, dtype=np.float64), np.asarray(lab_b, dtype=np.float64))
+    if d.size == 0:
+        return float("inf")
+    rows, cols = linear_sum_assignment(d)
+    total = float(d[rows, cols].sum())
+    if d.shape[0] > d.shape[1]:
+        unmatched = np.setdiff1d(np.arange(d.shape[0]), rows)
+        total += float(d[unmatched].min(axis=1).sum())
+    elif d.shape[1] > d.shape[0]:
+        unmatched = np.setdiff1d(np.arange(d.shape[1]), cols)
+        total += float(d[:, unmatched].min(axis=0).sum())
+    return total / max(d.shape)
+
+
+def _parse_colors(colors: ColorsLike) -> np.ndarray:
+    # ["#RRGGBB", ...] or a {"colors": [...]} / list JSON string -> (n,3) RGB 0..1
+    if isinstance(colors, str):
+        data = json.loads(colors)
+        colors = data.get("colors", []) if isinstance(data, dict) else data
+    if not isinstance(colors, (list, tuple)):
+        raise ValueError('expected a list of "#RRGGBB" colors')
+    return hex_to_rgb01(colors, require_hash=False)
+
+
+class PaletteIndex:
+    """Top-k nearest-palette queries over a fixed set of named palettes."""
+
+    def __init__(self, palettes: Union[Mapping[str, Sequence[str]], Iterable[Tuple[str, Sequence[str]]]],
+                 version: int = 0):
+        items = palettes.items() if isinstance(palettes, Mapping) else palettes
+        # every color of every palette parsed in one batch; owner = palette number
+        names, hexes, owner = [], [], []
+        for name, colors in items:
+            colors = list(colors)
+            owner.extend([len(names)] * len(colors))
+            names.append(str(name))
+            hexes.extend(colors)
+        rgb, valid = parse_hex(hexes, require_hash=False)
+        owner = np.array(owner, dtype=np.int64)[valid]
+        counts = np.bincount(owner, minlength=len(names))
+        keep = sorted((int(counts[i]), name, i) for i, name in enumerate(names) if counts[i])
+        self.version = version
+        self.names: List[str] = [name for _, name, _ in keep]
+        self.sizes = np.array([n for n, _, _ in keep], dtype=np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(self.sizes)]).astype(np.int64)
+        # colors stay grouped by owner in input order; reorder the groups to index order
+        rank = np.empty(len(names), dtype=np.int64)
+        rank[[i for _, _, i in keep]] = np.arange(len(keep))
+        order = np.argsort(rank[owner], kind="stable")
+        self.lab = np.ascontiguousarray(_rgb_to_lab(rgb[valid][order] / 255.0), dtype=np.float32)
+        # size -> (first palette id, count); each group's colors are one contiguous slice
+        self._groups: Dict[int, Tuple[int, int]] = {}
+        for i, n in enumerate(self.sizes.tolist()):
+            start, count = self._groups.get(n, (i, 0))
+            self._groups[n] = (start, count + 1)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def palette_lab(self, i: int) -> np.ndarray:
+        return self.lab[self.offsets[i]:self.offsets[i + 1]]
+
+    def lower_bounds(self, query_lab: np.ndarray) -> np.ndarray:
+        """Lower bound of palette_distance(query, p) for every indexed palette p."""
+        q = np.asarray(query_lab, dtype=np.float32)
+        qq = (q * q).sum(-1)
+        out = np.empty(len(self.names), dtype=np.float64)
+        for size, (first, count) in self._groups.items():
+            for s in range(0, count, max(1, _QUERY_CHUNK // size)):
+                n = min(count - s, max(1, _QUERY_CHUNK // size))
+                lo = first + s
+                block = self.lab[self.offsets[lo]:self.offsets[lo + n]]  # (n*size, 3)
+                d2 = (block * block).sum(-1)[:, None] - 2.0 * block @ q.T + qq[None]
+                d = np.sqrt(np.maximum(d2, 0.0)).reshape(n, size, len(q))
+                to_query = d.min(axis=2).sum(axis=1)  # palette colors -> nearest query color
+                to_palette = d.min(axis=1).sum(axis=1)  # query colors -> nearest palette color
+                out[lo:lo + n] = np.maximum(to_query, to_palette) / max(size, len(q))
+        return out
+
+    def query(self, colors: ColorsLike, k: int = 5) -> List[Tuple[str, float]]:
+        """The k closest palettes as (name, distance), closest first."""
+        q = _rgb_to_lab(_parse_colors(colors))
+        if len(q) == 0:
+            raise ValueError("query palette has no #RRGGBB colors")
+        if not self.names or k <= 0:
+            return []
+        # float32 bounds, so allow for rounding before pruning on them
+        bounds = self.lower_bounds(q) - _BOUND_SLACK
+        k = min(k, len(self.names))
+        best: List[Tuple[float, int]] = []
+        order = np.argsort(bounds, kind="stable")
+        for i in order.tolist():
+            if len(best) == k and bounds[i] > best[-1][0]:
+                break
+            dist = palette_distance(q, self.palette_lab(i))
+            if len(best) < k or dist < best[-1][0]:
+                best.append((dist, i))
+                best.sort(key=lambda t: (t[0], self.names[t[1]]))
+                del best[k:]
+        return [(self.names[i], round(dist, 4)) for dist, i in best]
+
+    def query_many(self, queries: Sequence[ColorsLike], k: int = 5) -> List[List[Tuple[str, float]]]:
+        return [self.query(q, k) for q in queries]
+
+
+_preset_index: Optional[PaletteIndex] = None
+_preset_lock = threading.Lock()
+
+
+def get_preset_index() -> PaletteIndex:
+    """Index over the registry presets (the ColorPalette presets), rebuilt when they change."""
+    global _preset_index
+    registry = get_registry()
+    with _preset_lock:
+        if _preset_index is None or _preset_index.version != registry.version:
+            version = registry.version
+            palettes = ((name, registry.get(name) or []) for name in registry.names())
+            _preset_index = PaletteIndex(palettes, version=version)
+        return _preset_index
+
+
+class PaletteMatch:
+    """
+    Find the stored presets closest to a palette (e.g. the output of
+    ImagePaletteExtractor).
+
+    palette: {"colors": ["#RRGGBB", ...]} JSON or a JSON list of hex colors.
+    top_k:   number of matches returned.
+
+    Outputs best_preset (name of the closest preset, "" if there is none) and
+    matches_json = {"matches": [{"name": ..., "distance": ...}, ...]}, closest
+    first. distance is the assignment-based mean CIE76 dE described at the top
+    of palette_index.py (0 = same colors in any order).
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "palette": ("STRING", {"multiline": True, "default": '{"colors":["#FF0000","#00FF00","#0000FF"]}'}),
+                "top_k": ("INT", {"default": 5, "min": 1, "max": 100, "step": 1}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("best_preset", "matches_json")
+    FUNCTION = "match"
+    CATEGORY = "TJnodes/color"
+
+    def match(self, palette: str, top_k: int = 5) -> Tuple[str, str]:
+        matches = get_preset_index().query(palette, top_k)
+        payload = {"matches": [{"name": name, "distance": dist} for name, dist in matches]}
+        return (matches[0][0] if matches else "", json.dumps(payload, ensure_ascii=False))
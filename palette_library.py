@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .color_hex import parse_hex
+except ImportError:  # run as a script / loaded as a top-level module (tests)
+    from color_hex import parse_hex  # type: ignore
+
+# Compiled palette library: many presets in one memory-mapped file.
+#
+# JSON in palettes/ stays the source format; `build` packs a set of JSON
+# presets into a .tjpal file that PaletteRegistry maps instead of parsing
+# every JSON file. Layout (little endian):
+#
+#   header   magic b"TJPAL\0", u16 version, u32 count, u32 names_size, u32 n_colors
+#   index    count x (u32 name_offset, u16 name_length, u16 colors, u32 color_offset),
+#            sorted by UTF-8 name bytes
+#   names    concatenated UTF-8 names
+#   colors   n_colors x 3 uint8 RGB triples
+#
+# Opening a library reads only the header; a lookup is a binary search over
+# the index (O(log n) name reads from the mapping) plus one slice of colors.
+#
+#   python palette_library.py build palettes/ [more dirs or .json files] -o palettes/library.tjpal
+
+MAGIC = b"TJPAL\0"
+VERSION = 1
+SUFFIX = ".tjpal"
+_HEADER = struct.Struct("<6sHIII")
+_INDEX = struct.Struct("<IHHI")
+_INDEX_DTYPE = np.dtype([("name_off", "<u4"), ("name_len", "<u2"), ("colors", "<u2"), ("color_off", "<u4")])
+
+
+def pack(palettes: Dict[str, Sequence[str]]) -> bytes:
+    """Serialize {name: ["#RRGGBB", ...]} into the library format."""
+    items = sorted((name.encode("utf-8"), colors) for name, colors in palettes.items())
+    index = np.zeros(len(items), dtype=_INDEX_DTYPE)
+    names = bytearray()
+    hexes: List[str] = []
+    for i, (name, colors) in enumerate(items):
+        if len(name) > 0xFFFF or len(colors) > 0xFFFF:
+            raise ValueError(f"palette {name!r} is too large")
+        index[i] = (len(names), len(name), len(colors), len(hexes))
+        names += name
+        hexes.extend(colors)
+    rgb, valid = parse_hex(hexes)
+    if not valid.all():
+        raise ValueError(f"expected #RRGGBB, got {hexes[int(np.argmin(valid))]!r}")
+    header = _HEADER.pack(MAGIC, VERSION, len(items), len(names), len(hexes))
+    return header + index.tobytes() + bytes(names) + rgb.tobytes()
+
+
+def read_sources(sources: Iterable[os.PathLike]) -> Dict[str, List[str]]:
+    """Collect presets from JSON files and directories of JSON files (later sources win)."""
+    out: Dict[str, List[str]] = {}
+    for src in map(Path, sources):
+        files = sorted(src.glob("*.json")) if src.is_dir() else [src]
+        for file in files:
+            with open(file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            out[file.stem] = [str(c) for c in data.get("colors", [])]
+    return out
+
+
+def build(sources: Iterable[os.PathLike], output: os.PathLike) -> int:
+    """Pack every JSON preset under sources into output; returns the palette count."""
+    palettes = read_sources(sources)
+    blob = pack(palettes)
+    out = Path(output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=out.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, out)
+    return len(palettes)
+
+
+class _Names:
+    # lazy sequence of name bytes for bisect
+    def __init__(self, lib: "PaletteLibrary"):
+        self._lib = lib
+
+    def __len__(self) -> int:
+        return len(self._lib)
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._lib._name_bytes(i)
+
+
+class PaletteLibrary:
+    """Read-only, memory-mapped view of a .tjpal file."""
+
+    def __init__(self, path: os.PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{self.path}: not a palette library (too short)")
+        magic, version, count, names_size, n_colors = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path}: not a palette library (magic/version)")
+        self._count = count
+        index_end = _HEADER.size + count * _INDEX_DTYPE.itemsize
+        self._names_at = index_end
+        self._colors_at = index_end + names_size
+        if len(self._map) < self._colors_at + 3 * n_colors:
+            raise ValueError(f"{self.path}: truncated palette library")
+        self._rgb = np.frombuffer(self._map, dtype=np.uint8, count=3 * n_colors,
+                                  offset=self._colors_at).reshape(-1, 3)
+        self._names_cache: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, i: int) -> Tuple[int, int, int, int]:
+        return _INDEX.unpack_from(self._map, _HEADER.size + i * _INDEX.size)
+
+    def _name_bytes(self, i: int) -> bytes:
+        off, length, _, _ = self._record(i)
+        start = self._names_at + off
+        return self._map[start:start + length]
+
+    def _find(self, name: str) -> int:
+        key = name.encode("utf-8")
+        i = bisect.bisect_left(_Names(self), key)
+        return i if i < self._count and self._name_bytes(i) == key else -1
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) >= 0
+
+    def rgb(self, name: str) -> Optional[np.ndarray]:
+        """(n,3) uint8 view of a palette, or None."""
+        i = self._find(name)
+        if i < 0:
+            return None
+        _, _, n, off = self._record(i)
+        return self._rgb[off:off + n]
+
+    def get(self, name: str) -> Optional[List[str]]:
+        i = self._find(name)
+        if i < 0:
+            return None
+        _, _, n, off = self._record(i)
+        start = self._colors_at + 3 * off
+        digits = self._map[start:start + 3 * n].hex().upper()
+        return ["#" + digits[j:j + 6] for j in range(0, 6 * n, 6)]
+
+    def names(self) -> List[str]:
+        # decoded once; the index is already sorted
+        if self._names_cache is None:
+            self._names_cache = [self._name_bytes(i).decode("utf-8") for i in range(self._count)]
+        return list(self._names_cache)
+
+    def close(self) -> None:
+        self._rgb = None  # type: ignore[assignment]
+        if isinstance(self._map, mmap.mmap):
+            try:
+                self._map.close()
+            except BufferError:  # a caller still holds an rgb() view; the GC closes it later
+                pass
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build or inspect a packed palette library (.tjpal).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="pack JSON presets into a library")
+    b.add_argument("sources", nargs="+", type=Path, help="directories of *.json presets or .json files")
+    b.add_argument("-o", "--output", type=Path, required=True)
+    i = sub.add_parser("info", help="list the palettes in a library")
+    i.add_argument("library", type=Path)
+    args = ap.parse_args(argv)
+    if args.cmd == "build":
+        n = build(args.sources, args.output)
+        print(f"wrote {n} palettes to {args.output}")
+        return 0
+    lib = PaletteLibrary(args.library)
+    for name in lib.names():
+        print(f"{name}: {' '.join(lib.get(name) or [])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+# Opt-in per-stage metrics for ImagePaletteExtractor.
+#
+# extract_palette opens one run per call (extraction()); the pipeline marks
+# its stages with `with stage("sample"):` and adds fields with record(). A
+# finished run is a flat dict
+#   {"node", "backend", ..., "cache", "samples", "n_iter", "inertia",
+#    "stages": {"convert": s, "sample": s, ...}, "total": s, "error": ...}
+# handed to every registered sink. With no sink registered extraction()
+# yields None and stage() returns a shared no-op context, so the disabled
+# cost is one ContextVar lookup per stage.
+#
+# Sinks: LoggingSink, RingBufferSink, PrometheusSink (text exposition served
+# at /tj_comfyuiutil/metrics). Environment, read at import:
+#   TJ_COLORUTIL_METRICS   comma list of log, ring, prometheus (default: off)
+
+_METRIC_PREFIX = "tj_palette"
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("run", "name", "t0")
+
+    def __init__(self, run: "RunMetrics", name: str):
+        self.run = run
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stages = self.run.stages
+        stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.t0
+        return False
+
+
+class RunMetrics:
+    """Durations and fields of one extract_palette call."""
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields: Dict[str, Any] = dict(fields)
+        self.stages: Dict[str, float] = {}
+        self.t0 = time.perf_counter()
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = dict(self.fields)
+        out["stages"] = {k: round(v, 6) for k, v in self.stages.items()}
+        return out
+
+
+class LoggingSink:
+    """One INFO line per run on the tj_colorutil.metrics logger."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger("tj_colorutil.metrics")
+        self.level = level
+
+    def emit(self, run: Dict[str, Any]) -> None:
+        if not self.logger.isEnabledFor(self.level):
+            return
+        stages = " ".join(f"{k}={v * 1e3:.1f}ms" for k, v in run["stages"].items())
+        extra = " ".join(f"{k}={v}" for k, v in run.items() if k not in ("stages", "total"))
+        self.logger.log(self.level, "extract %.1fms %s | %s", run["total"] * 1e3, stages, extra)
+
+
+class RingBufferSink:
+    """Keeps the last maxlen runs in memory."""
+
+    def __init__(self, maxlen: int = 256):
+        self._runs: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def emit(self, run: Dict[str, Any]) -> None:
+        with self._lock:
+            self._runs.append(run)
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._runs)
+
+
+class PrometheusSink:
+    """Aggregates runs into counters/summaries for the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs: Dict[str, int] = {}
+        self.stage_sum: Dict[str, float] = {}
+        self.stage_count: Dict[str, int] = {}
+        self.total_sum = 0.0
+        self.samples = 0
+        self.iterations = 0
+
+    def emit(self, run: Dict[str, Any]) -> None:
+        outcome = "error" if run.get("error") else str(run.get("cache", "off"))
+        with self._lock:
+            self.runs[outcome] = self.runs.get(outcome, 0) + 1
+            self.total_sum += run["total"]
+            for name, seconds in run["stages"].items():
+                self.stage_sum[name] = self.stage_sum.get(name, 0.0) + seconds
+                self.stage_count[name] = self.stage_count.get(name, 0) + 1
+            self.samples += int(run.get("samples", 0))
+            self.iterations += int(run.get("n_iter", 0))
+
+    def exposition(self) -> str:
+        p = _METRIC_PREFIX
+        with self._lock:
+            lines = [
+                f"# HELP {p}_runs_total extract_palette calls by cache outcome",
+                f"# TYPE {p}_runs_total counter",
+            ]
+            lines += [f'{p}_runs_total{{outcome="{k}"}} {v}' for k, v in sorted(self.runs.items())]
+            lines += [
+                f"# HELP {p}_run_seconds_total wall time of extract_palette calls",
+                f"# TYPE {p}_run_seconds_total counter",
+                f"{p}_run_seconds_total {self.total_sum:.6f}",
+                f"# HELP {p}_stage_seconds time spent per pipeline stage",
+                f"# TYPE {p}_stage_seconds summary",
+            ]
+            for name in sorted(self.stage_sum):
+                lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {self.stage_sum[name]:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {self.stage_count[name]}')
+            lines += [
+                f"# HELP {p}_samples_total pixels (or histogram bins) clustered",
+                f"# TYPE {p}_samples_total counter",
+                f"{p}_samples_total {self.samples}",
+                f"# HELP {p}_kmeans_iterations_total k-means passes run",
+                f"# TYPE {p}_kmeans_iterations_total counter",
+                f"{p}_kmeans_iterations_total {self.iterations}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+_sinks: List[Any] = []
+_sinks_lock = threading.Lock()
+_current: ContextVar[Optional[RunMetrics]] = ContextVar("tj_palette_metrics", default=None)
+
+
+def add_sink(sink) -> None:
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink) -> None:
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def get_sinks() -> List[Any]:
+    with _sinks_lock:
+        return list(_sinks)
+
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+
+@contextmanager
+def extraction(**fields) -> Iterator[Optional[RunMetrics]]:
+    """Collect one run; yields None (and records nothing) while no sink is registered."""
+    if not _sinks:
+        yield None
+        return
+    run = RunMetrics(fields)
+    token = _current.set(run)
+    try:
+        yield run
+    except BaseException as e:
+        run.fields["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        result = run.as_dict()
+        result["total"] = round(time.perf_counter() - run.t0, 6)
+        for sink in get_sinks():
+            try:
+                sink.emit(result)
+            except Exception as e:  # a broken sink must not fail the node
+                print(f"[palette_metrics] sink {type(sink).__name__} failed: {e}")
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage of the current run (no-op when disabled)."""
+    run = _current.get()
+    return _NULL_STAGE if run is None else _Stage(run, name)
+
+
+def record(**fields) -> None:
+    """Attach fields (sample count, iterations, ...) to the current run."""
+    run = _current.get()
+    if run is not None:
+        run.fields.update(fields)
+
+
+def prometheus_text() -> Optional[str]:
+    """Exposition of every registered PrometheusSink, or None if there is none."""
+    parts = [s.exposition() for s in get_sinks() if isinstance(s, PrometheusSink)]
+    return "".join(parts) if parts else None
+
+
+def recent_runs() -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for s in get_sinks():
+        if isinstance(s, RingBufferSink):
+            out.extend(s.records())
+    return out
+
+
+def configure_from_env() -> None:
+    names = {n.strip().lower() for n in os.environ.get("TJ_COLORUTIL_METRICS", "").split(",") if n.strip()}
+    factories = {"log": LoggingSink, "ring": RingBufferSink, "prometheus": PrometheusSink}
+    for name in sorted(names):
+        if name in factories:
+            add_sink(factories[name]())
+        else:
+            print(f"[palette_metrics] unknown sink in TJ_COLORUTIL_METRICS: {name}")
+
+
+configure_from_env()
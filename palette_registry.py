@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    from .lazy_import import load_module
+except ImportError:  # loaded as a top-level module (tests)
+    from lazy_import import load_module  # type: ignore
+
+if TYPE_CHECKING:
+    from palette_library import PaletteLibrary
+
+# Process-wide index of the palette presets (palettes/*.json plus any extra
+# user directories), shared by ColorPalette and the HTTP routes.
+#
+# Every preset is parsed once when its directory is scanned; lookups are a
+# dict access with no file system work. Freshness:
+#   - a background thread re-stats the indexed files every poll_interval
+#     seconds and reloads only those whose mtime/size changed;
+#   - a lookup miss re-stats the directories (one stat each) and rescans when
+#     one of them changed, so a preset file created a moment ago is found.
+# A preset name present in several directories resolves to the last one, so
+# user directories override the bundled palettes.
+#
+# A directory may also hold compiled libraries (*.tjpal, see palette_library),
+# which are memory-mapped instead of parsed; a stand-alone JSON preset of the
+# same name wins over a library entry so edits show up without a rebuild.
+#
+# Environment (read once for the shared instance, see get_registry):
+#   TJ_COLORUTIL_PALETTE_DIRS   extra preset directories, os.pathsep separated
+#   TJ_COLORUTIL_PALETTE_POLL   watcher interval in seconds (default 2, 0 = off)
+#
+# preset_names() answers ColorPalette.INPUT_TYPES at node registration from a
+# name index in the cache directory, so startup reads one small file instead
+# of parsing every preset (see there).
+
+BUILTIN_DIR = Path(__file__).parent / "palettes"
+# palette_library.SUFFIX; palette_library (and NumPy) is imported only once a
+# library file is found
+LIBRARY_SUFFIX = ".tjpal"
+
+
+class _Entry(NamedTuple):
+    path: Path
+    stamp: Tuple[int, int]  # (mtime_ns, size)
+    colors: Tuple[str, ...]
+
+
+class _Library(NamedTuple):
+    stamp: Tuple[int, int]
+    library: PaletteLibrary
+
+
+def _stamp(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_colors(path: Path) -> Tuple[str, ...]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return tuple(str(c) for c in data.get("colors", []))
+
+
+class PaletteRegistry:
+    """Name -> colors index over one or more preset directories."""
+
+    def __init__(self, dirs: Iterable[os.PathLike] = (BUILTIN_DIR,), poll_interval: float = 0.0):
+        self._dirs: List[Path] = [Path(d) for d in dirs]
+        self._entries: Dict[str, _Entry] = {}
+        self._libraries: Dict[Path, _Library] = {}  # directory order; later ones win
+        self._failed: Dict[Path, Tuple[int, int]] = {}  # unreadable files, not retried until they change
+        self._dir_stamps: Dict[Path, Optional[int]] = {}
+        self._names: List[str] = []
+        self._lock = threading.RLock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.version = 0  # bumped whenever the indexed contents change
+        self.refresh(force=True)
+        if poll_interval > 0:
+            self.start_watcher(poll_interval)
+
+    @property
+    def directories(self) -> List[Path]:
+        return list(self._dirs)
+
+    def add_directory(self, path: os.PathLike) -> None:
+        with self._lock:
+            if Path(path) not in self._dirs:
+                self._dirs.append(Path(path))
+        self.refresh(force=True)
+
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def get(self, name: str) -> Optional[List[str]]:
+        colors = self._lookup(name)
+        if colors is None and self._dirs_changed():
+            self.refresh(force=True)
+            colors = self._lookup(name)
+        return colors
+
+    def _lookup(self, name: str) -> Optional[List[str]]:
+        entry = self._entries.get(name)
+        if entry is not None:
+            return list(entry.colors)
+        for lib in reversed(list(self._libraries.values())):
+            colors = lib.library.get(name)
+            if colors is not None:
+                return colors
+        return None
+
+    def _source(self, name: str) -> Optional[Tuple[Path, Tuple[int, int]]]:
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry.path, entry.stamp
+        for path, lib in reversed(list(self._libraries.items())):
+            if name in lib.library:
+                return path, lib.stamp
+        return None
+
+    def path(self, name: str) -> Optional[Path]:
+        """JSON file or library that name resolves to."""
+        source = self._source(name)
+        return None if source is None else source[0]
+
+    def clear(self) -> None:
+        """Drop the index; the next lookup re-reads every preset."""
+        with self._lock:
+            self._entries = {}
+            self._libraries = {}
+            self._names = []
+            self._dir_stamps = {}
+            self._failed = {}
+            self.version += 1
+
+    def _dirs_changed(self) -> bool:
+        return any(_dir_mtime(d) != self._dir_stamps.get(d, -1) for d in self._dirs)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Re-stat the index (or rescan the directories when force); True if anything changed."""
+        with self._lock:
+            if force or self._dirs_changed():
+                self._dir_stamps = {d: _dir_mtime(d) for d in self._dirs}
+                paths: Dict[str, Path] = {}
+                lib_paths: List[Path] = []
+                for d in self._dirs:
+                    for file in sorted(d.glob("*.json")) if d.is_dir() else ():
+                        paths[file.stem] = file
+                    lib_paths += sorted(d.glob("*" + LIBRARY_SUFFIX)) if d.is_dir() else []
+            else:
+                paths = {name: e.path for name, e in self._entries.items()}
+                lib_paths = list(self._libraries)
+            libraries = self._load_libraries(lib_paths)
+            entries: Dict[str, _Entry] = {}
+            for name, file in paths.items():
+                stamp = _stamp(file)
+                if stamp is None:
+                    continue
+                old = self._entries.get(name)
+                if old is not None and old.path == file and old.stamp == stamp:
+                    entries[name] = old
+                    continue
+                if self._failed.get(file) == stamp:
+                    continue
+                try:
+                    entries[name] = _Entry(file, stamp, _read_colors(file))
+                    self._failed.pop(file, None)
+                except Exception as e:
+                    self._failed[file] = stamp
+                    print(f"[PaletteRegistry] Error loading {file}: {e}")
+            changed = entries != self._entries or libraries != self._libraries
+            if changed:
+                # replaced libraries are not closed here: a route thread may
+                # still be reading one; the mapping goes with its last reference
+                self._entries = entries
+                self._libraries = libraries
+                names = set(entries)
+                for lib in libraries.values():
+                    names.update(lib.library.names())
+                self._names = sorted(names)
+                self.version += 1
+            return changed
+
+    def _load_libraries(self, paths: List[Path]) -> Dict[Path, _Library]:
+        out: Dict[Path, _Library] = {}
+        for file in paths:
+            stamp = _stamp(file)
+            if stamp is None:
+                continue
+            old = self._libraries.get(file)
+            if old is not None and old.stamp == stamp:
+                out[file] = old
+                continue
+            if self._failed.get(file) == stamp:
+                continue
+            try:
+                out[file] = _Library(stamp, load_module("palette_library").PaletteLibrary(file))
+                self._failed.pop(file, None)
+            except Exception as e:
+                self._failed[file] = stamp
+                print(f"[PaletteRegistry] Error loading {file}: {e}")
+        return out
+
+    def start_watcher(self, interval: float) -> None:
+        with self._lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                             name="PaletteRegistryWatcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:  # keep watching after a transient error
+                print(f"[PaletteRegistry] refresh failed: {e}")
+
+    def etag(self, names: Iterable[str]) -> str:
+        """Strong ETag over the file versions (path, mtime, size) of the given presets."""
+        h = hashlib.blake2b(digest_size=12)
+        for name in names:
+            source = self._source(name)
+            h.update(repr((name, None if source is None else (str(source[0]), source[1]))).encode())
+        return f'"{h.hexdigest()}"'
+
+
+def _dir_mtime(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+_registry: Optional[PaletteRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def _default_dirs() -> List[Path]:
+    extra = [p for p in os.environ.get("TJ_COLORUTIL_PALETTE_DIRS", "").split(os.pathsep) if p]
+    return [BUILTIN_DIR, *map(Path, extra)]
+
+
+def get_registry() -> PaletteRegistry:
+    """Process-wide registry over palettes/ and TJ_COLORUTIL_PALETTE_DIRS."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PaletteRegistry(
+                    _default_dirs(),
+                    poll_interval=float(os.environ.get("TJ_COLORUTIL_PALETTE_POLL", "2")),
+                )
+    return _registry
+
+
+def _index_path() -> Path:
+    # same directory as the extractor's Lab tables (_cache_dir there)
+    cache = os.environ.get("TJ_COLORUTIL_CACHE_DIR") or Path(
+        os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "tj_colorutility"
+    return Path(cache) / "preset_names.json"
+
+
+def _dirs_signature(dirs: Iterable[Path]) -> List[Any]:
+    # Names change only when preset files or libraries are added, removed or
+    # renamed (directory mtime) or a library is rewritten (its own stamp).
+    out: List[Any] = []
+    for d in dirs:
+        libs = sorted(d.glob("*" + LIBRARY_SUFFIX)) if d.is_dir() else []
+        out.append([str(d), _dir_mtime(d), [[lib.name, *(_stamp(lib) or ())] for lib in libs]])
+    return out
+
+
+def preset_names() -> List[str]:
+    """Preset names without building the registry when a valid name index exists.
+
+    Used by ColorPalette.INPUT_TYPES during node registration. Once the
+    registry is loaded its names are returned directly.
+    """
+    if _registry is not None:
+        return _registry.names()
+    signature = _dirs_signature(_default_dirs())
+    path = _index_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data["dirs"] == signature:
+            return [str(n) for n in data["names"]]
+    except (OSError, ValueError, TypeError, KeyError):
+        pass
+    names = get_registry().names()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"dirs": signature, "names": names}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[PaletteRegistry] could not write {path}: {e}")
+    return names
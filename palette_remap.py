@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    from .color_hex import find_hex, hex_to_rgb8
+    from .image_palette_extractor import _lab_table, _loaded_torch, _rgb_to_lab
+except ImportError:  # loaded as a top-level module (tests)
+    from color_hex import find_hex, hex_to_rgb8  # type: ignore
+    from image_palette_extractor import _lab_table, _loaded_torch, _rgb_to_lab  # type: ignore
+
+# Nearest-palette-color remapping.
+#
+# lut3d_{6,7,8}bit modes quantize each pixel to an 8-bit RGB bin (upper bits
+# only for 6/7) and read the palette index of that bin from a uint8 table
+# built once per (palette, bits): the Lab of every bin center comes from the
+# extractor's cached sRGB -> Lab table, so a remap is two table lookups per
+# pixel. lut3d_8bit is exact for 8-bit sources. exact computes Lab per pixel.
+
+_REMAP_MODES = ("lut3d_8bit", "lut3d_7bit", "lut3d_6bit", "exact")
+_DITHER_MODES = ("none", "bayer4", "bayer8", "floyd_steinberg")
+_MAX_COLORS = 256
+# Pixels remapped per work item: small enough for the temporaries to stay in
+# cache (measured fastest around 64K on a 4K frame); items run on a thread pool
+_REMAP_CHUNK = 1 << 16
+# Table entries assigned per step while building an index table
+_INDEX_BUILD_CHUNK = 1 << 18
+_INDEX_CACHE_SIZE = 8
+
+
+def _parse_palette(text: str) -> np.ndarray:
+    # {"colors": [...]} (ColorPalette / ImagePaletteExtractor JSON), a JSON
+    # list, or hex codes separated by anything. Returns (n,3) float64 0..1.
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        data = None
+    if isinstance(data, dict):
+        data = data.get("colors", [])
+    if isinstance(data, list):
+        rgb = hex_to_rgb8(data, require_hash=False)
+    else:
+        rgb = find_hex(text or "")
+    if len(rgb) == 0:
+        raise ValueError("palette has no #RRGGBB colors")
+    if len(rgb) > _MAX_COLORS:
+        raise ValueError(f"palette has {len(rgb)} colors (max {_MAX_COLORS})")
+    return rgb / 255.0
+
+
+def _nearest_lab(lab: np.ndarray, palette_lab: np.ndarray) -> np.ndarray:
+    # (m,3) Lab -> (m,) uint8 index of the closest palette color (Euclidean dE).
+    # |lab|^2 is the same for every palette color, so it is left out of the argmin.
+    palette_lab = palette_lab.astype(lab.dtype)
+    d = lab @ (-2.0 * palette_lab.T).astype(lab.dtype)
+    d += (palette_lab * palette_lab).sum(-1)
+    return d.argmin(axis=1).astype(np.uint8)
+
+
+def _build_index_table(palette_lab: np.ndarray, bits: int) -> np.ndarray:
+    # float32 like the Lab table; ties within float32 rounding may differ from exact
+    table = _lab_table(bits)
+    out = np.empty(table.shape[0], dtype=np.uint8)
+    for s in range(0, table.shape[0], _INDEX_BUILD_CHUNK):
+        out[s:s + _INDEX_BUILD_CHUNK] = _nearest_lab(np.asarray(table[s:s + _INDEX_BUILD_CHUNK]), palette_lab)
+    return out
+
+
+_index_cache: "OrderedDict[Tuple[bytes, int], np.ndarray]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def _index_table(palette_rgb: np.ndarray, bits: int) -> np.ndarray:
+    # LRU over the last few palettes; an 8-bit table is 16 MB
+    key = (np.round(palette_rgb * 255).astype(np.uint8).tobytes(), bits)
+    with _index_lock:
+        table = _index_cache.get(key)
+        if table is not None:
+            _index_cache.move_to_end(key)
+            return table
+    table = _build_index_table(_rgb_to_lab(palette_rgb), bits)
+    with _index_lock:
+        _index_cache[key] = table
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return table
+
+
+class _Quantizer:
+    """Maps RGB 0..1 pixels of any shape (..., 3) to palette indices."""
+
+    def __init__(self, palette_rgb: np.ndarray, mode: str):
+        if mode not in _REMAP_MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        self.palette_rgb = palette_rgb
+        self.bits = None if mode == "exact" else int(mode[len("lut3d_")])
+        if self.bits is None:
+            self.palette_lab = _rgb_to_lab(palette_rgb)
+        else:
+            self.table = _index_table(palette_rgb, self.bits)
+
+    def __call__(self, rgb: np.ndarray, offset: Optional[np.ndarray] = None) -> np.ndarray:
+        # offset (broadcast to rgb) is added before quantizing, e.g. a dither threshold
+        if self.bits is None:
+            flat = (rgb if offset is None else rgb + offset).reshape(-1, 3)
+            return _nearest_lab(_rgb_to_lab(flat), self.palette_lab).reshape(rgb.shape[:-1])
+        if offset is None:
+            buf = np.clip(rgb, 0.0, 1.0)
+        else:
+            buf = np.add(rgb, offset, dtype=np.float32)
+            np.clip(buf, 0.0, 1.0, out=buf)
+        buf *= 255.0
+        buf += 0.5
+        q = buf.astype(np.int32)
+        if self.bits != 8:
+            q >>= 8 - self.bits
+        code = q[..., 0] << (2 * self.bits)
+        code |= q[..., 1] << self.bits
+        code |= q[..., 2]
+        return np.take(self.table, code)
+
+
+def _bayer(n: int) -> np.ndarray:
+    # n x n Bayer matrix scaled to (-0.5, 0.5)
+    m = np.zeros((1, 1), dtype=np.float64)
+    while m.shape[0] < n:
+        m = np.block([[4 * m, 4 * m + 2], [4 * m + 3, 4 * m + 1]])
+    return (m + 0.5) / m.size - 0.5
+
+
+def _bayer_spread(palette_rgb: np.ndarray) -> float:
+    # Threshold amplitude in RGB 0..1: the median per-channel (Chebyshev)
+    # distance from each palette color to its nearest neighbour, so the
+    # offset can just flip a pixel between adjacent palette entries.
+    if palette_rgb.shape[0] < 2:
+        return 0.0
+    d = np.abs(palette_rgb[:, None] - palette_rgb[None]).max(axis=-1)
+    np.fill_diagonal(d, np.inf)
+    return float(np.median(d.min(axis=1)))
+
+
+def _remap_plain(frames: np.ndarray, quantize: _Quantizer, out: np.ndarray,
+                 colors: Optional[np.ndarray] = None, threshold: Optional[np.ndarray] = None) -> None:
+    # frames (B,H,W,3) -> out (B,H,W) uint8 indices and, if given, colors
+    # (B,H,W,3) float32 palette colors; processed in blocks of whole rows
+    B, H, W, _ = frames.shape
+    rows = max(1, _REMAP_CHUNK // max(1, W))
+    palette = quantize.palette_rgb.astype(np.float32)
+    if threshold is not None:
+        # one block's worth of the tiled matrix; rows is a multiple of its size
+        n = threshold.shape[0]
+        rows = max(n, rows - rows % n)
+        threshold = np.tile(threshold, (rows // n, -(-W // n)))[:, :W, None]
+
+    def work(item: Tuple[int, int]) -> None:
+        b, y = item
+        block = frames[b, y:y + rows]
+        idx = quantize(block, None if threshold is None else threshold[:block.shape[0]])
+        out[b, y:y + rows] = idx
+        if colors is not None:
+            np.take(palette, idx, axis=0, out=colors[b, y:y + rows])
+
+    items = [(b, y) for b in range(B) for y in range(0, H, rows)]
+    workers = min(len(items), os.cpu_count() or 1)
+    if workers <= 1:
+        for item in items:
+            work(item)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(work, items))
+
+
+def _remap_floyd_steinberg(frames: np.ndarray, quantize: _Quantizer, out: np.ndarray, strength: float) -> None:
+    # Error diffusion is sequential along a row, but pixel (y, x) only reads
+    # pixels with a smaller x + 2y, so every anti-diagonal wavefront t = x + 2y
+    # is processed in one vectorized step (all frames at once): W + 2H steps
+    # instead of W * H.
+    B, H, W, _ = frames.shape
+    work = np.array(frames, dtype=np.float32)
+    palette = quantize.palette_rgb.astype(np.float32)
+    weights = np.float32(strength) * np.array([7, 3, 5, 1], dtype=np.float32) / 16
+    all_y = np.arange(H)
+    for t in range(W + 2 * (H - 1)):
+        y0 = max(0, (t - W + 2) // 2)
+        ys = all_y[y0:min(H - 1, t // 2) + 1]
+        xs = t - 2 * ys
+        v = np.clip(work[:, ys, xs], 0.0, 1.0)
+        idx = quantize(v)
+        out[:, ys, xs] = idx
+        err = v - palette[idx]
+        right = xs + 1 < W
+        work[:, ys[right], xs[right] + 1] += weights[0] * err[:, right]
+        below = ys + 1 < H
+        if not below.any():
+            continue
+        yb, xb, eb = ys[below] + 1, xs[below], err[:, below]
+        left = xb > 0
+        work[:, yb[left], xb[left] - 1] += weights[1] * eb[:, left]
+        work[:, yb, xb] += weights[2] * eb
+        right = xb + 1 < W
+        work[:, yb[right], xb[right] + 1] += weights[3] * eb[:, right]
+
+
+class PaletteRemap:
+    """
+    Quantize an IMAGE batch to a palette: every pixel becomes the palette
+    color closest to it in CIE Lab (CIE76 dE).
+
+    palette: {"colors": ["#RRGGBB", ...]} as output by ImagePaletteExtractor or
+    used by ColorPalette's custom_json, a JSON list, or plain hex codes
+    (up to 256 colors).
+
+    mode:
+        lut3d_8bit - nearest color per 8-bit RGB value from a precomputed
+                     256^3 index table (exact for 8-bit sources; default)
+        lut3d_7bit / lut3d_6bit - smaller tables over the upper bits,
+                     faster to build for a palette used once
+        exact      - Lab distance per pixel (slowest)
+    Index tables are built once per palette and kept for the last few palettes.
+
+    dither:
+        none            - plain nearest color (default)
+        bayer4 / bayer8 - ordered dithering with a 4x4 / 8x8 Bayer threshold
+                          scaled to the palette's color spacing
+        floyd_steinberg - error diffusion (processed in diagonal wavefronts;
+                          much slower than the other modes)
+    dither_strength scales the threshold or the diffused error.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE", {}),
+                "palette": ("STRING", {"multiline": True, "default": '{"colors":["#000000","#FFFFFF"]}'}),
+                "mode": ("COMBO", {"default": "lut3d_8bit", "choices": list(_REMAP_MODES)}),
+                "dither": ("COMBO", {"default": "none", "choices": list(_DITHER_MODES)}),
+                "dither_strength": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 2.0, "step": 0.05}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE",)
+    RETURN_NAMES = ("image",)
+    FUNCTION = "remap"
+    CATEGORY = "TJnodes/color"
+
+    def _frames(self, image) -> np.ndarray:
+        # (B,H,W,3) float32 0..1 view/copy of a ComfyUI IMAGE or array
+        torch = _loaded_torch()
+        if torch is not None and isinstance(image, torch.Tensor):
+            arr = image.detach().to("cpu", torch.float32).numpy()
+        else:
+            arr = np.asarray(image)
+            arr = arr / np.float32(255.0) if np.issubdtype(arr.dtype, np.integer) else arr.astype(np.float32, copy=False)
+        if arr.ndim == 3:
+            arr = arr[None]
+        if arr.ndim != 4 or arr.shape[-1] != 3:
+            raise ValueError("Expected IMAGE of shape (B,H,W,3)")
+        return arr
+
+    def _remap(self, image, palette: str, mode: str, dither: str, dither_strength: float,
+               with_colors: bool) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+        if dither not in _DITHER_MODES:
+            raise ValueError(f"Unknown dither: {dither}")
+        palette_rgb = _parse_palette(palette)
+        frames = self._frames(image)
+        quantize = _Quantizer(palette_rgb, mode)
+        out = np.empty(frames.shape[:3], dtype=np.uint8)
+        colors = np.empty(frames.shape, dtype=np.float32) if with_colors else None
+        if dither == "floyd_steinberg" and dither_strength > 0:
+            _remap_floyd_steinberg(frames, quantize, out, dither_strength)
+            if colors is not None:
+                np.take(palette_rgb.astype(np.float32), out, axis=0, out=colors)
+        else:
+            threshold = None
+            if dither.startswith("bayer") and dither_strength > 0:
+                spread = _bayer_spread(palette_rgb) * dither_strength
+                threshold = (_bayer(int(dither[len("bayer"):])) * spread).astype(np.float32)
+            _remap_plain(frames, quantize, out, colors, threshold)
+        return out, colors, palette_rgb
+
+    def remap_indices(self, image, palette: str, mode: str = "lut3d_8bit", dither: str = "none",
+                      dither_strength: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """(B,H,W) uint8 palette indices and the (n,3) palette in 0..1."""
+        indices, _, palette_rgb = self._remap(image, palette, mode, dither, dither_strength, False)
+        return indices, palette_rgb
+
+    def remap(self, image, palette: str, mode: str = "lut3d_8bit", dither: str = "none",
+              dither_strength: float = 1.0):
+        _, result, _ = self._remap(image, palette, mode, dither, dither_strength, True)
+        torch = _loaded_torch()
+        if torch is not None and isinstance(image, torch.Tensor):
+            return (torch.from_numpy(result).to(image.device),)
+        return (result,)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from . import palette_metrics
+    from .color_hex import rgb01_to_hex
+    from .image_palette_extractor import ImagePaletteExtractor, _kmeans_best, _kmeans_fit, _rgb_to_working, _working_to_rgb
+    from .palette_index import has_fast_assignment, linear_sum_assignment
+except ImportError:  # loaded as a top-level module (tests)
+    import palette_metrics  # type: ignore
+    from color_hex import rgb01_to_hex  # type: ignore
+    from image_palette_extractor import (  # type: ignore
+        ImagePaletteExtractor, _kmeans_best, _kmeans_fit, _rgb_to_working, _working_to_rgb,
+    )
+    from palette_index import has_fast_assignment, linear_sum_assignment  # type: ignore
+
+# Palette tracking over a sequence of frames (video), one frame at a time.
+# ImagePaletteExtractor batch_mode="temporal" runs one of these per node.
+#
+# PaletteTracker.update(frame) keeps three things from the last frame it
+# clustered (the keyframe):
+#   - a coarse RGB histogram. A frame whose histogram differs from it by less
+#     than skip_delta (total variation distance, 0..1) reuses the palette
+#     without sampling or clustering. Comparing with the keyframe, not the
+#     previous frame, keeps a slow fade from slipping through step by step.
+#   - the k-means centers. The next clustered frame starts k-means from them
+#     instead of from k-means++, which usually converges in a few passes.
+#     Past _CUT_DELTA (a scene cut) the frame is seeded fresh.
+#   - the palette in working space, slot by slot. A new palette is matched
+#     onto the previous slots (Hungarian assignment on squared distance), so
+#     a color keeps its slot while it drifts; sort only orders the first
+#     palette after construction or reset().
+
+# Grid-sampled pixels and bits per channel of the change-detection histogram
+_SIGNATURE_PIXELS = 1 << 14
+_SIGNATURE_BITS = 3
+# Histogram difference treated as a scene cut: cold k-means++ start
+_CUT_DELTA = 0.5
+# Largest palette matched exactly without SciPy (the Python Hungarian solver
+# is O(k^3)); larger ones pair the closest slots greedily
+_EXACT_MATCH_K = 64
+
+
+def _match_slots(d2: np.ndarray) -> np.ndarray:
+    # (k,k) squared distances previous slot -> new center; order[slot] = center
+    if d2.shape[0] <= _EXACT_MATCH_K or has_fast_assignment():
+        rows, cols = linear_sum_assignment(d2)
+        return cols[np.argsort(rows)]
+    order = np.full(d2.shape[0], -1, dtype=np.intp)
+    taken = np.zeros(d2.shape[1], dtype=bool)
+    left = d2.shape[0]
+    for flat in np.argsort(d2, axis=None, kind="stable"):
+        r, c = divmod(int(flat), d2.shape[1])
+        if order[r] < 0 and not taken[c]:
+            order[r] = c
+            taken[c] = True
+            left -= 1
+            if not left:
+                break
+    return order
+
+
+class PaletteTracker:
+    """Stateful palette extraction for consecutive frames (see the notes above).
+
+    Parameters match ImagePaletteExtractor.extract_palette (k = palette_size);
+    n_init only applies to cold starts. update() takes one frame, an (H,W,3)
+    or (1,H,W,3) array or CPU tensor, and returns its palette as "#RRGGBB".
+    """
+
+    def __init__(self, k: int = 8, sample_max_pixels: int = 100_000, merge_delta: float = 6.0, seed: int = 42,
+                 sort: str = "frequency", quantize_bits: int = 0, lab_mode: str = "exact", sampler: str = "random",
+                 merge_metric: str = "euclidean", max_iter: int = 15, kmeans_tol: float = 0.1, n_init: int = 1,
+                 color_space: str = "cielab", skip_delta: float = 0.05):
+        self.config: Dict[str, Any] = dict(
+            k=int(k), sample_max_pixels=sample_max_pixels, merge_delta=merge_delta, seed=seed, sort=sort,
+            quantize_bits=quantize_bits, lab_mode=lab_mode, sampler=sampler, merge_metric=merge_metric,
+            max_iter=max_iter, kmeans_tol=kmeans_tol, n_init=n_init, color_space=color_space, skip_delta=skip_delta,
+        )
+        self._node = ImagePaletteExtractor()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the previous frames; the next update() clusters from scratch."""
+        self._hist: Optional[np.ndarray] = None
+        self._centers: Optional[np.ndarray] = None
+        self._slots: Optional[np.ndarray] = None
+        self._palette: Optional[List[str]] = None
+        self.frames = 0
+        self.skipped = 0
+        self.n_iter = 0
+        self.inertia = 0.0
+        self.last_delta = 1.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"frames": self.frames, "skipped": self.skipped, "n_iter": self.n_iter,
+                "last_delta": round(self.last_delta, 4)}
+
+    def _signature(self, frames: np.ndarray) -> np.ndarray:
+        # normalized (2^bits)^3 histogram of a fixed pixel grid
+        rgb = self._node._sample(frames, _SIGNATURE_PIXELS, 0, "grid").reshape(-1, 3)
+        levels = 1 << _SIGNATURE_BITS
+        q = np.minimum((rgb * levels).astype(np.int64), levels - 1)
+        code = (q[:, 0] * levels + q[:, 1]) * levels + q[:, 2]
+        return np.bincount(code, minlength=levels ** 3) / max(1, code.shape[0])
+
+    def update(self, frame) -> List[str]:
+        c = self.config
+        frames = self._node._frames_view(frame)
+        if frames.shape[0] != 1:
+            raise ValueError(f"update() takes one frame, got a batch of {frames.shape[0]}")
+        self.frames += 1
+        with palette_metrics.stage("sample"):
+            hist = self._signature(frames)
+        delta = 1.0 if self._hist is None else 0.5 * float(np.abs(hist - self._hist).sum())
+        self.last_delta = delta
+        if self._palette is not None and delta < c["skip_delta"]:
+            self.skipped += 1
+            return list(self._palette)
+
+        k, seed = c["k"], c["seed"]
+        weights = None
+        with palette_metrics.stage("sample"):
+            if c["quantize_bits"] > 0:
+                samples, weights = self._node._histogram_bins(self._node._to_numpy_rgb01_batch(frames),
+                                                              c["quantize_bits"])
+            else:
+                samples = self._node._sample(frames, c["sample_max_pixels"], seed, c["sampler"])
+        with palette_metrics.stage("lab"):
+            lab = _rgb_to_working(samples, c["color_space"], c["lab_mode"])
+        with palette_metrics.stage("kmeans"):
+            if self._centers is not None and delta < _CUT_DELTA:
+                fit = _kmeans_fit(lab, k, c["max_iter"], seed, weights, c["kmeans_tol"], init=self._centers)
+            else:
+                fit = _kmeans_best(lab, k, c["max_iter"], seed, weights, c["kmeans_tol"], c["n_init"])
+        palette_metrics.record(samples=int(lab.shape[1]))
+        self.n_iter += fit.n_iter
+        self.inertia = float(fit.inertia.sum())
+        w = None if weights is None else weights[0]
+        with palette_metrics.stage("finalize"):
+            counts = np.bincount(fit.labels[0], weights=w, minlength=k).astype(np.int64)
+            centers, counts = self._node._merge_fill(fit.centers[0], counts, lab[0], k, c["merge_delta"], seed,
+                                                     c["merge_metric"], w)
+            rgb = _working_to_rgb(centers, c["color_space"])
+            if self._slots is None or self._slots.shape != centers.shape:
+                order = self._node._sort_order(rgb, counts, c["sort"], centers, c["color_space"])
+            else:
+                order = _match_slots(((self._slots[:, None, :] - centers[None, :, :]) ** 2).sum(-1))
+            palette = rgb01_to_hex(rgb[order])
+            palette += ["#000000"] * (k - len(palette))
+        self._hist = hist
+        self._centers = fit.centers[0]
+        self._slots = centers[order]
+        self._palette = palette
+        return list(palette)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Thread pools that keep blocking route work (preset file reads, JSON parsing,
+# palette extraction) off the aiohttp event loop.
+#
+# WorkerPool.run(key, fn, *args) awaits fn(*args) on the pool:
+#   - coalescing: while a job for key is queued or running, further run()
+#     calls with the same key wait for that job instead of starting their own
+#     (key=None never coalesces)
+#   - backpressure: at most max_pending jobs may be queued or running; past
+#     that run() raises Busy at once (the routes answer 503 + Retry-After)
+#     instead of growing an unbounded queue
+# A waiter that is cancelled (client went away) does not cancel the shared
+# job. Bookkeeping happens on the event loop thread only.
+
+RETRY_AFTER_S = 1
+
+
+class Busy(RuntimeError):
+    """The pool already has max_pending jobs queued or running."""
+
+
+class WorkerPool:
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._pending = 0
+        self._counts = {"submitted": 0, "coalesced": 0, "rejected": 0}
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"tj_{self.name}")
+            return self._executor
+
+    async def run(self, key: Optional[Hashable], fn: Callable[..., Any], *args: Any) -> Any:
+        if key is not None:
+            shared = self._inflight.get(key)
+            if shared is not None:
+                self._counts["coalesced"] += 1
+                return await asyncio.shield(shared)
+        if self._pending >= self.max_pending:
+            self._counts["rejected"] += 1
+            raise Busy(f"{self.name} pool is busy ({self._pending} jobs pending)")
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self._pool(), functools.partial(fn, *args))
+        self._pending += 1
+        self._counts["submitted"] += 1
+        if key is not None:
+            self._inflight[key] = fut
+
+        def done(f: asyncio.Future) -> None:
+            self._pending -= 1
+            if key is not None and self._inflight.get(key) is f:
+                del self._inflight[key]
+
+        fut.add_done_callback(done)
+        return await asyncio.shield(fut)
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.workers, "max_pending": self.max_pending, "pending": self._pending, **self._counts}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+# Preset lookups / matching: short jobs, a couple of threads is plenty
+route_pool = WorkerPool("route", workers=2, max_pending=64)
+# Uploaded-image extraction: CPU heavy and memory hungry, one at a time
+extract_pool = WorkerPool("extract", workers=1, max_pending=4)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {pool.name: pool.stats() for pool in (route_pool, extract_pool)}
@@ -2,6 +2,11 @@ from __future__ import annotations
 
 from typing import Tuple
 
+try:
+    from .lazy_import import load_module
+except ImportError:  # loaded as a top-level module (tests)
+    from lazy_import import load_module  # type: ignore
+
 
 class RGBColorPicker:
     """
@@ -28,10 +33,6 @@ class RGBColorPicker:
     CATEGORY = "TJnodes/color"
 
     def convert_to_hex(self, red: int, green: int, blue: int, alpha: int = 255) -> Tuple[str, str]:
-        r = max(0, min(255, int(red)))
-        g = max(0, min(255, int(green)))
-        b = max(0, min(255, int(blue)))
-        a = max(0, min(255, int(alpha)))
-        hex_color = f"#{r:02X}{g:02X}{b:02X}"
-        hex_color_rgba = f"#{r:02X}{g:02X}{b:02X}{a:02X}"
-        return (hex_color, hex_color_rgba)
+        # 0-255 へのクランプは rgb8_to_hex 側で行う (color_hex は初回実行時に読み込む)
+        (hex_color_rgba,) = load_module("color_hex").rgb8_to_hex([int(red), int(green), int(blue), int(alpha)])
+        return (hex_color_rgba[:7], hex_color_rgba)
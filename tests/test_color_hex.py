@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from color_hex import find_hex, hex_to_rgb01, hex_to_rgb8, parse_hex, rgb01_to_hex, rgb8_to_hex
+
+
+class TestColorHex(unittest.TestCase):
+    def test_parse_and_validate(self):
+        colors = ["#ff0000", " #00FF00 ", "#GG0000", "#FF00", "#FF000080", "00FF00", None, 0xFF0000,
+                  "#FF0000" + "0" * 20, "#ＦＦ0000", ""]
+        values, valid = parse_hex(colors)
+        self.assertEqual(valid.tolist(), [True, True] + [False] * 9)
+        np.testing.assert_array_equal(values[:2], [[255, 0, 0], [0, 255, 0]])
+        self.assertFalse(values[2:].any())
+        _, valid = parse_hex(colors, require_hash=False)
+        self.assertEqual(np.flatnonzero(valid).tolist(), [0, 1, 5])
+
+    def test_rgba(self):
+        values, valid = parse_hex(["#0A141E80", "#0A141E", "#0A141E8"], alpha=True)
+        self.assertEqual(valid.tolist(), [True, True, False])
+        np.testing.assert_array_equal(values, [[10, 20, 30, 128], [10, 20, 30, 255], [0, 0, 0, 0]])
+        self.assertEqual(rgb8_to_hex(values[:2]), ["#0A141E80", "#0A141EFF"])
+
+    def test_format(self):
+        self.assertEqual(rgb8_to_hex([[255, 0, 16], [-5, 300, 171]]), ["#FF0010", "#00FFAB"])
+        self.assertEqual(rgb8_to_hex([1, 2, 3]), ["#010203"])
+        self.assertEqual(rgb8_to_hex(np.zeros((0, 3), dtype=np.uint8)), [])
+        # same rounding as int(np.round(x * 255))
+        self.assertEqual(rgb01_to_hex([[0.5, 1.2, -0.1], [2.5 / 255, 0, 1]]), ["#80FF00", "#0200FF"])
+        with self.assertRaises(ValueError):
+            rgb8_to_hex([[1, 2]])
+
+    def test_roundtrip_many(self):
+        rgb = np.random.default_rng(0).integers(0, 256, size=(10_000, 3))
+        hexes = rgb8_to_hex(rgb)
+        self.assertEqual(hexes[:3], [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in rgb[:3]])
+        np.testing.assert_array_equal(hex_to_rgb8(hexes), rgb)
+        np.testing.assert_array_equal(hex_to_rgb8([h.lower() for h in hexes]), rgb)
+        np.testing.assert_allclose(hex_to_rgb01(hexes), rgb / 255.0)
+
+    def test_find_hex_in_text(self):
+        found = find_hex("bg: #ff0000#00FF00, fg 0000ff; 1234567 #abc zz#ABCDEF80")
+        np.testing.assert_array_equal(found, [[255, 0, 0], [0, 255, 0], [0, 0, 255]])
+        np.testing.assert_array_equal(find_hex("#ABCDEF80", alpha=True), [[171, 205, 239, 128]])
+        self.assertEqual(find_hex("").shape, (0, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
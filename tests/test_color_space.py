@@ -0,0 +1,104 @@
+import tracemalloc
+import unittest
+
+import numpy as np
+
+import color_space
+from color_space import SPACES, convert
+
+
+# The conversion helpers as they were in image_palette_extractor before
+# color_space, kept as the reference.
+def _ref_srgb_to_linear(c):
+    return np.where(c <= 0.04045, c / 12.92, ((np.maximum(c, 0.04045) + 0.055) / 1.055) ** 2.4)
+
+
+def _ref_linear_to_srgb(c):
+    return np.where(c <= 0.0031308, 12.92 * c, 1.055 * (np.maximum(c, 0.0031308) ** (1 / 2.4)) - 0.055)
+
+
+def _ref_rgb_to_lab(rgb):
+    M = np.array([[0.4124564, 0.3575761, 0.1804375],
+                  [0.2126729, 0.7151522, 0.0721750],
+                  [0.0193339, 0.1191920, 0.9503041]])
+    xyz = _ref_srgb_to_linear(np.clip(rgb, 0, 1)) @ M.T / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), (29 / 6) ** 2 / 3 * xyz + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def _ref_lab_to_rgb(lab):
+    fy = (lab[:, 0] + 16) / 116
+    f = np.stack([lab[:, 1] / 500 + fy, fy, fy - lab[:, 2] / 200], axis=1)
+    xyz = np.where(f ** 3 > (6 / 29) ** 3, f ** 3, (f - 4 / 29) * (3 * (6 / 29) ** 2)) * np.array([0.95047, 1.0, 1.08883])
+    M_inv = np.array([[3.2404542, -1.5371385, -0.4985314],
+                      [-0.9692660, 1.8760108, 0.0415560],
+                      [0.0556434, -0.2040259, 1.0572252]])
+    return np.clip(_ref_linear_to_srgb(np.clip(xyz @ M_inv.T, 0, None)), 0, 1)
+
+
+class TestColorSpace(unittest.TestCase):
+    def setUp(self):
+        self.rgb = np.random.default_rng(0).random((5000, 3))
+
+    def test_matches_reference_functions(self):
+        np.testing.assert_allclose(color_space.srgb_to_linear(self.rgb), _ref_srgb_to_linear(self.rgb), atol=1e-14)
+        np.testing.assert_allclose(color_space.linear_to_srgb(self.rgb), _ref_linear_to_srgb(self.rgb), atol=1e-14)
+        lab = color_space.srgb_to_lab(self.rgb)
+        np.testing.assert_allclose(lab, _ref_rgb_to_lab(self.rgb), atol=1e-10)
+        back = np.clip(color_space.lab_to_srgb(lab), 0, 1)
+        np.testing.assert_allclose(back, _ref_lab_to_rgb(lab), atol=1e-12)
+
+    def test_round_trips(self):
+        for space in SPACES:
+            for dtype, atol in ((np.float64, 1e-5), (np.float32, 1e-4)):
+                x = self.rgb.astype(dtype)
+                y = convert(x, "srgb", space)
+                self.assertEqual(y.dtype, dtype)
+                np.testing.assert_allclose(convert(y, space, "srgb"), x, atol=atol, err_msg=f"{space} {dtype}")
+
+    def test_float32_close_to_float64(self):
+        for space in ("lab", "oklab"):
+            np.testing.assert_allclose(convert(self.rgb.astype(np.float32), "srgb", space),
+                                       convert(self.rgb, "srgb", space), atol=2e-3)
+
+    def test_known_values(self):
+        white = np.ones(3)
+        np.testing.assert_allclose(color_space.srgb_to_lab(white), [100, 0, 0], atol=1e-3)
+        np.testing.assert_allclose(color_space.srgb_to_oklab(white), [1, 0, 0], atol=1e-6)
+        # Ottosson's reference: sRGB red is OKLab (0.62796, 0.22486, 0.12585)
+        np.testing.assert_allclose(color_space.srgb_to_oklab(np.array([1.0, 0, 0])), [0.62796, 0.22486, 0.12585], atol=1e-4)
+        lch = color_space.lab_to_lch(np.array([[50.0, 0.0, -10.0]]))
+        np.testing.assert_allclose(lch, [[50, 10, 270]])
+
+    def test_out_and_in_place(self):
+        img = self.rgb.reshape(50, 100, 3)
+        expected = convert(img, "srgb", "oklch")
+        buf = img.copy()
+        self.assertIs(convert(buf, "srgb", "oklch", out=buf), buf)
+        np.testing.assert_allclose(buf, expected)
+        out = np.empty_like(img, dtype=np.float32)
+        convert(img, "srgb", "oklch", out=out)
+        np.testing.assert_allclose(out, expected, rtol=1e-4, atol=1e-3)
+        with self.assertRaises(ValueError):
+            convert(img, "srgb", "lab", out=np.empty((3, 3)))
+        with self.assertRaises(ValueError):
+            convert(img, "srgb", "hsv")
+        with self.assertRaises(ValueError):
+            convert(np.zeros((4, 2)), "srgb", "lab")
+        # the transfer functions work on any shape
+        self.assertEqual(color_space.srgb_to_linear(np.linspace(0, 1, 7)).shape, (7,))
+
+    def test_allocations_do_not_grow_with_size(self):
+        peaks = []
+        for n in (1 << 15, 1 << 20):
+            buf = np.random.default_rng(1).random((n, 3))
+            tracemalloc.start()
+            convert(buf, "srgb", "lab", out=buf)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        self.assertLess(peaks[1], 2 * peaks[0] + 4096)
+        self.assertLess(peaks[1], 2 << 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
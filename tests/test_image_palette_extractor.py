@@ -1,4 +1,9 @@
+import json
+import os
+import tempfile
 import unittest
+from unittest import mock
+
 import numpy as np
 
 try:
@@ -6,7 +11,14 @@ try:
 except Exception:  # pragma: no cover
     torch = None  # type: ignore
 
-from image_palette_extractor import ImagePaletteExtractor
+import image_palette_extractor
+import palette_tracker
+from color_hex import hex_to_rgb01
+from image_palette_extractor import (
+    ImagePaletteExtractor, _ciede2000, _kmeans, _kmeans_best, _kmeans_fit, _lab_to_rgb, _minibatch_kmeans,
+    _rgb_to_lab, _rgb_to_lab_mode,
+)
+from palette_tracker import PaletteTracker
 
 
 class TestImagePaletteExtractor(unittest.TestCase):
@@ -40,12 +52,408 @@ class TestImagePaletteExtractor(unittest.TestCase):
         custom_json = out[0]
         self.assertTrue(custom_json.startswith('{'))
         # Verify JSON parsable and has 8 colors
-        import json
         data = json.loads(custom_json)
         self.assertIn('colors', data)
         self.assertEqual(len(data['colors']), 8)
         self.assertTrue(all(isinstance(c, str) and c.startswith('#') for c in data['colors']))
 
+    def test_extract_palette_per_frame(self):
+        node = ImagePaletteExtractor()
+        img = np.zeros((2, 64, 64, 3), dtype=np.float64)
+        img[0, :32] = [1.0, 0.0, 0.0]
+        img[0, 32:] = [0.0, 0.0, 1.0]
+        img[1, :32] = [0.0, 1.0, 0.0]
+        img[1, 32:] = [1.0, 1.0, 1.0]
+        data = json.loads(node.extract_palette(img, sample_max_pixels=1000, seed=1, batch_mode="per_frame")[0])
+        self.assertEqual(len(data['frames']), 2)
+        self.assertEqual(data['colors'], data['frames'][0])
+        self.assertTrue(all(len(p) == 8 for p in data['frames']))
+        self.assertIn('#FF0000', data['frames'][0])
+        self.assertNotIn('#00FF00', data['frames'][0])
+        self.assertIn('#00FF00', data['frames'][1])
+        self.assertIn('#FFFFFF', data['frames'][1])
+
+    def test_extract_palette_shared(self):
+        node = ImagePaletteExtractor()
+        img = np.zeros((2, 64, 64, 3), dtype=np.float64)
+        img[0] = [1.0, 0.0, 0.0]
+        img[1] = [0.0, 1.0, 0.0]
+        data = json.loads(node.extract_palette(img, sample_max_pixels=1000, seed=1, batch_mode="shared")[0])
+        self.assertNotIn('frames', data)
+        self.assertIn('#FF0000', data['colors'])
+        self.assertIn('#00FF00', data['colors'])
+
+    def test_kmeans_chunked_matches_single_block(self):
+        rng = np.random.default_rng(0)
+        lab = _rgb_to_lab(rng.random((5000, 3)))
+        ref_centers, ref_labels = _kmeans(lab, k=8, iters=15, seed=3)
+        saved = image_palette_extractor._KMEANS_CHUNK_ELEMS
+        image_palette_extractor._KMEANS_CHUNK_ELEMS = 64  # 8 rows per chunk
+        try:
+            centers, labels = _kmeans(lab, k=8, iters=15, seed=3)
+        finally:
+            image_palette_extractor._KMEANS_CHUNK_ELEMS = saved
+        np.testing.assert_allclose(centers, ref_centers, atol=1e-9)
+        np.testing.assert_array_equal(labels, ref_labels)
+
+    def test_kmeans_float32(self):
+        rng = np.random.default_rng(0)
+        lab = _rgb_to_lab(rng.random((5000, 3)))
+        ref_centers, _ = _kmeans(lab, k=8, iters=15, seed=3)
+        centers, labels = _kmeans(lab.astype(np.float32), k=8, iters=15, seed=3)
+        self.assertEqual(centers.dtype, np.float64)
+        np.testing.assert_allclose(centers, ref_centers, atol=0.05)
+
+    def test_extract_palette_histogram(self):
+        node = ImagePaletteExtractor()
+        image = self._make_test_image()
+        data = json.loads(node.extract_palette(image, seed=1, quantize_bits=5)[0])
+        self.assertEqual(len(data['colors']), 8)
+        for c in ['#FF0000', '#00FF00', '#0000FF', '#FFFFFF', '#000000']:
+            self.assertIn(c, data['colors'])
+
+    def test_histogram_bins(self):
+        node = ImagePaletteExtractor()
+        img = np.zeros((2, 16, 16, 3), dtype=np.float64)
+        img[0, :4] = [1.0, 0.0, 0.0]
+        img[1, :, :8] = [0.0, 1.0, 0.0]
+        img[1, :, 8:] = [0.2, 0.4, 0.6]
+        colors, weights = node._histogram_bins(img, bits=5)
+        self.assertEqual(colors.shape, (2, 2, 3))
+        np.testing.assert_array_equal(weights.sum(axis=1), [256, 256])
+        np.testing.assert_array_equal(np.sort(weights[0]), [64, 192])
+        colors, weights = node._histogram_bins(img, bits=5, pooled=True)
+        self.assertEqual(colors.shape, (1, 4, 3))
+        self.assertEqual(weights.sum(), 512)
+
+    def test_weighted_init_skips_padding(self):
+        # a solid frame has one bin, padded with zero-weight bins to the noisy
+        # frame's count; k-means++ must not seed from the padding
+        node = ImagePaletteExtractor()
+        img = np.empty((2, 32, 32, 3), dtype=np.float32)
+        img[0] = 0.5
+        img[1] = np.random.default_rng(0).random((32, 32, 3))
+        colors, weights = node._histogram_bins(img, bits=5)
+        lab = _rgb_to_lab(colors)
+        fit = _kmeans_fit(lab, k=8, max_iter=15, seed=42, weights=weights)
+        np.testing.assert_allclose(fit.centers[0], np.repeat(lab[0, :1], 8, axis=0), atol=1e-6)
+
+    def test_lab_roundtrip_dark_colors(self):
+        rng = np.random.default_rng(0)
+        rgb = rng.random((1000, 3)) * 0.05
+        np.testing.assert_allclose(_lab_to_rgb(_rgb_to_lab(rgb)), rgb, atol=1e-6)
+
+    def test_lab_lut_accuracy(self):
+        rng = np.random.default_rng(0)
+        rgb = rng.integers(0, 256, size=(20000, 3)) / 255.0
+        exact = _rgb_to_lab(rgb)
+        with tempfile.TemporaryDirectory() as tmp:
+            old = os.environ.get("TJ_COLORUTIL_CACHE_DIR")
+            os.environ["TJ_COLORUTIL_CACHE_DIR"] = tmp
+            image_palette_extractor._lab_table.cache_clear()
+            try:
+                lut = _rgb_to_lab_mode(rgb, "lut")
+                lut6 = _rgb_to_lab_mode(rgb, "lut3d_6bit")
+                self.assertTrue(os.path.exists(os.path.join(tmp, "srgb_lab_6bit.npy")))
+            finally:
+                image_palette_extractor._lab_table.cache_clear()
+                if old is None:
+                    del os.environ["TJ_COLORUTIL_CACHE_DIR"]
+                else:
+                    os.environ["TJ_COLORUTIL_CACHE_DIR"] = old
+        self.assertLess(np.abs(lut - exact).max(), 1e-9)
+        self.assertLess(np.linalg.norm(lut6 - exact, axis=-1).max(), 2.9)
+
+    def test_cache_dir_outside_package(self):
+        env = {k: v for k, v in os.environ.items() if k not in ("TJ_COLORUTIL_CACHE_DIR", "XDG_CACHE_HOME")}
+        with mock.patch.dict(os.environ, env, clear=True):
+            os.environ["XDG_CACHE_HOME"] = "/xdg"
+            self.assertEqual(str(image_palette_extractor._cache_dir()), "/xdg/tj_colorutility")
+            os.environ["TJ_COLORUTIL_CACHE_DIR"] = "/override"
+            self.assertEqual(str(image_palette_extractor._cache_dir()), "/override")
+
+    def test_extract_palette_minibatch_memmap(self):
+        node = ImagePaletteExtractor()
+        image = self._make_test_image()
+        if torch is not None:
+            image = image.numpy()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "img.npy")
+            np.save(path, image.astype(np.float32))
+            mm = np.load(path, mmap_mode="r")
+            data = json.loads(node.extract_palette(mm, seed=1, algorithm="minibatch", use_cache=False)[0])
+            del mm
+        self.assertEqual(len(data['colors']), 8)
+        for c in ['#FF0000', '#00FF00', '#0000FF', '#FFFFFF', '#000000']:
+            self.assertIn(c, data['colors'])
+
+    def test_minibatch_kmeans_stops_early(self):
+        rng = np.random.default_rng(0)
+        centers_true = np.array([[20.0, 0, 0], [50.0, 40, 0], [80.0, 0, -40]])
+        steps = []
+
+        def batches():
+            while True:
+                steps.append(1)
+                pick = rng.integers(0, 3, size=512)
+                yield (centers_true[pick] + rng.normal(0, 0.5, size=(512, 3)))[None]
+
+        centers, seen, _ = _minibatch_kmeans(batches(), k=3, seed=0, max_steps=1000)
+        self.assertLess(len(steps), 1000)
+        found = np.sort(centers[0][:, 0])
+        np.testing.assert_allclose(found, [20.0, 50.0, 80.0], atol=0.5)
+        self.assertLessEqual(int(seen.sum()), 512 * len(steps))
+        self.assertEqual(int(seen.sum()) % 512, 0)
+
+    def test_samplers(self):
+        node = ImagePaletteExtractor()
+        img = np.random.default_rng(0).random((2, 40, 60, 3)).astype(np.float32)
+        for sampler in ("random", "grid", "stratified", "area"):
+            out = node._sample(img, 600, seed=3, sampler=sampler)
+            self.assertEqual(out.shape[0], 2)
+            self.assertEqual(out.dtype, np.float64)
+            self.assertTrue(400 <= out.shape[1] <= 600, (sampler, out.shape))
+        # 2400 px / 600 -> 2x2 blocks
+        np.testing.assert_allclose(node._sample(img, 600, 0, "grid")[0, 0], img[0, 1, 1])
+        area = node._sample(img, 600, 0, "area")
+        np.testing.assert_allclose(area[1, 0], img[1, :2, :2].reshape(-1, 3).mean(axis=0), rtol=1e-6)
+        # stratified picks one pixel inside each block, same spot in every frame
+        strat = node._sample(img, 600, 0, "stratified")
+        self.assertTrue(any(np.allclose(strat[0, 0], img[0, y, x]) for y in range(2) for x in range(2)))
+        idx = np.flatnonzero(np.all(np.isclose(img[0].reshape(-1, 3), strat[0, 0]), axis=1))[0]
+        np.testing.assert_allclose(strat[1, 0], img[1].reshape(-1, 3)[idx])
+        # small images are used whole
+        self.assertEqual(node._sample(img, 5000, 0, "area").shape, (2, 2400, 3))
+        with self.assertRaises(ValueError):
+            node._sample(img, 600, 0, "nope")
+
+    def test_ciede2000_reference_pairs(self):
+        # Sharma, Wu & Dalal (2005) test data
+        a = np.array([[50, 2.6772, -79.7751], [50, -1.3802, -84.2814], [2.0776, 0.0795, -1.1350],
+                      [50, 2.5, 0], [22.7233, 20.0904, -46.6940]])
+        b = np.array([[50, 0, -82.7485], [50, 0, -82.7485], [0.9033, -0.0636, -0.5514],
+                      [50, 0, -2.5], [23.0331, 14.9730, -42.5619]])
+        expected = [2.0425, 1.0000, 0.9082, 4.3065, 2.0373]
+        np.testing.assert_allclose(_ciede2000(a, b), expected, atol=1e-4)
+        np.testing.assert_allclose(_ciede2000(b, a), expected, atol=1e-4)
+
+    def test_merge_close(self):
+        node = ImagePaletteExtractor()
+        centers = np.array([[50.0, 0, 0], [52.0, 0, 0], [80.0, 0, 0], [50.0, 1.0, 0], [20.0, 0, 0]])
+        counts = np.array([10, 30, 5, 10, 1])
+        merged, n = node._merge_close(centers, counts, threshold=3.0)
+        self.assertEqual(n.tolist(), [50, 5, 1])
+        np.testing.assert_allclose(merged[0], [51.2, 0.2, 0.0])
+        np.testing.assert_allclose(merged[1:], centers[[2, 4]])
+        merged, n = node._merge_close(centers, counts, threshold=3.0, metric="ciede2000")
+        self.assertEqual(n.sum(), counts.sum())
+        same, n = node._merge_close(centers, counts, threshold=0.0)
+        np.testing.assert_array_equal(same, centers)
+
+    def test_ensure_k_splits_clusters(self):
+        node = ImagePaletteExtractor()
+        rng = np.random.default_rng(0)
+        # two tight blobs that a merge collapsed into one center
+        data = np.concatenate([rng.normal([40, 10, 0], 0.5, (300, 3)), rng.normal([60, -10, 5], 0.5, (100, 3))])
+        centers, counts = node._ensure_k(data.mean(axis=0, keepdims=True), np.array([400]), data, 2, seed=0)
+        order = np.argsort(-counts)
+        self.assertEqual(counts[order].tolist(), [300, 100])
+        np.testing.assert_allclose(centers[order], [[40, 10, 0], [60, -10, 5]], atol=0.2)
+        # without points (torch backend) the jitter fallback still fills k slots
+        centers, counts = node._ensure_k(np.array([[50.0, 0, 0]]), np.array([10]), None, 4, seed=0)
+        self.assertEqual(centers.shape, (4, 3))
+
+    def test_extract_palette_merge_metric(self):
+        node = ImagePaletteExtractor()
+        image = self._make_test_image()
+        out = node.extract_palette(image, merge_metric="ciede2000", use_cache=False)[0]
+        self.assertEqual(len(json.loads(out)["colors"]), 8)
+        with self.assertRaises(ValueError):
+            node.extract_palette(image, merge_metric="nope", use_cache=False)
+
+    def test_kmeans_fit_tolerance_and_inertia(self):
+        rng = np.random.default_rng(0)
+        lab = _rgb_to_lab(rng.random((5000, 3)))
+        full = _kmeans_fit(lab, k=8, max_iter=50, seed=3)
+        early = _kmeans_fit(lab, k=8, max_iter=50, seed=3, tol=0.5)
+        self.assertLess(early.n_iter, full.n_iter)
+        self.assertEqual(_kmeans_fit(lab, k=8, max_iter=2, seed=3).n_iter, 2)
+        # inertia of the returned labels against the returned centers
+        direct = ((lab - full.centers[full.labels]) ** 2).sum()
+        self.assertAlmostEqual(float(full.inertia), direct, delta=1e-6 * direct)
+
+    def test_kmeans_fit_warm_start(self):
+        lab = _rgb_to_lab(np.random.default_rng(0).random((5000, 3)))
+        full = _kmeans_fit(lab, k=8, max_iter=100, seed=3)
+        warm = _kmeans_fit(lab, k=8, max_iter=100, seed=99, init=full.centers)
+        self.assertLessEqual(warm.n_iter, 2)
+        np.testing.assert_allclose(warm.centers, full.centers)
+
+    def test_extract_palette_temporal(self):
+        node = ImagePaletteExtractor()
+        a = self._make_test_image()
+        a = a[0].numpy().astype(np.float64) if torch is not None else a
+        c = a * 0.5 + 0.2  # every color moves, the stripes stay
+        clip = np.stack([a, a, c])
+        data = json.loads(node.extract_palette(clip, sample_max_pixels=5000, seed=1, batch_mode="temporal")[0])
+        self.assertEqual(data["tracking"]["clustered"], 2)
+        self.assertEqual(data["tracking"]["skipped"], 1)
+        self.assertEqual(data["colors"], data["frames"][0])
+        self.assertEqual(data["frames"][1], data["frames"][0])
+        # slot i of the moved frame holds the moved color of slot i
+        np.testing.assert_allclose(hex_to_rgb01(data["frames"][2]), hex_to_rgb01(data["frames"][0]) * 0.5 + 0.2,
+                                   atol=1.5 / 255)
+        tracker = node._tracker
+        self.assertIsInstance(tracker, PaletteTracker)
+        # the next execution continues with the same tracker
+        again = json.loads(node.extract_palette(c[None], sample_max_pixels=5000, seed=1, batch_mode="temporal")[0])
+        self.assertIs(node._tracker, tracker)
+        self.assertEqual(again["colors"], data["frames"][2])
+        self.assertEqual(again["tracking"]["skipped"], 1)
+        self.assertEqual(tracker.frames, 4)
+        node.extract_palette(c[None], sample_max_pixels=5000, seed=2, batch_mode="temporal")
+        self.assertIsNot(node._tracker, tracker)
+        tracker.reset()
+        self.assertEqual(sorted(tracker.update(c)), sorted(data["frames"][2]))
+        self.assertEqual((tracker.frames, tracker.skipped), (1, 0))
+        with self.assertRaises(ValueError):
+            tracker.update(clip)
+
+    def test_tracker_slot_matching_large_palettes(self):
+        rng = np.random.default_rng(0)
+        for k in (8, 200):
+            slots = rng.random((k, 3)) * 100
+            perm = rng.permutation(k)
+            moved = slots[perm] + rng.normal(0, 0.01, size=(k, 3))
+            d2 = ((slots[:, None] - moved[None]) ** 2).sum(-1)
+            # slot i finds the center it moved to, exactly or greedily above _EXACT_MATCH_K
+            np.testing.assert_array_equal(perm[palette_tracker._match_slots(d2)], np.arange(k))
+
+    def _assert_colors(self, colors, expected, msg=None):
+        # every color is close to an expected one and every expected one
+        # appears (single-color regions come back as jittered copies)
+        d = np.abs(hex_to_rgb01(colors)[:, None] - np.array(expected, dtype=np.float64)[None]).max(-1)
+        self.assertTrue((d.min(axis=1) < 0.1).all() and (d.min(axis=0) < 1e-3).all(), msg=f"{msg}: {colors}")
+
+    def _quadrants(self):
+        img = np.zeros((1, 64, 96, 3))
+        img[0, :32, :48] = [1.0, 0.0, 0.0]
+        img[0, :32, 48:] = [0.0, 1.0, 0.0]
+        img[0, 32:, :48] = [0.0, 0.0, 1.0]
+        img[0, 32:, 48:] = [1.0, 1.0, 1.0]
+        return img
+
+    def test_extract_palette_mask(self):
+        node = ImagePaletteExtractor()
+        img = self._quadrants()
+        mask = np.zeros((64, 96), dtype=np.float32)
+        mask[:32, :48] = 1.0
+        for sampler in ("random", "grid", "area"):
+            data = json.loads(node.extract_palette(img, mask=mask, sampler=sampler, sample_max_pixels=1000,
+                                                   use_cache=False)[0])
+            self._assert_colors(data["colors"], [[1, 0, 0]], msg=sampler)
+        # masked samples never reach the color conversion
+        samples, weights, _ = node._sample_regions(img, mask[None] > 0.5, None, 500, 0, "stratified", False)
+        self.assertIsNone(weights)
+        np.testing.assert_array_equal(np.unique(samples.reshape(-1, 3), axis=0), [[1.0, 0.0, 0.0]])
+        # one mask per frame
+        frames = np.concatenate([img, img])
+        masks = np.stack([mask, 1.0 - mask])
+        data = json.loads(node.extract_palette(frames, mask=masks, batch_mode="per_frame", sample_max_pixels=1000,
+                                               use_cache=False)[0])
+        self._assert_colors(data["frames"][0], [[1, 0, 0]])
+        self._assert_colors(data["frames"][1], [[0, 1, 0], [0, 0, 1], [1, 1, 1]])
+        # the result cache tells masks apart
+        cached = [json.loads(node.extract_palette(img, mask=m, sample_max_pixels=1000)[0])["colors"] for m in masks]
+        self._assert_colors(cached[1], [[0, 1, 0], [0, 0, 1], [1, 1, 1]])
+        with self.assertRaises(ValueError):
+            node.extract_palette(img, mask=np.zeros((64, 96)), use_cache=False)
+        with self.assertRaises(ValueError):
+            node.extract_palette(img, mask=np.ones((32, 32)), use_cache=False)
+
+    def test_extract_palette_tiles(self):
+        node = ImagePaletteExtractor()
+        img = self._quadrants()
+        data = json.loads(node.extract_palette(img, tile_rows=2, tile_cols=2, sample_max_pixels=2000,
+                                               use_cache=False)[0])
+        self.assertEqual(len(data["colors"]), 8)
+        tiles = data["tiles"]
+        self.assertEqual([(t["row"], t["col"], t["box"]) for t in tiles],
+                         [(0, 0, [0, 0, 32, 48]), (0, 1, [0, 48, 32, 96]), (1, 0, [32, 0, 64, 48]),
+                          (1, 1, [32, 48, 64, 96])])
+        for t, expected in zip(tiles, ([1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 1])):
+            self._assert_colors(t["colors"], [expected])
+        self.assertEqual(sum(t["samples"] for t in tiles), 2000)
+        # uneven grid, per frame, with a mask: masked-out tiles are empty
+        mask = np.zeros((64, 96))
+        mask[:, :48] = 1.0
+        data = json.loads(node.extract_palette(np.concatenate([img, img]), mask=mask, batch_mode="per_frame",
+                                               tile_rows=1, tile_cols=3, sample_max_pixels=2000, use_cache=False)[0])
+        self.assertEqual([(t["frame"], t["col"]) for t in data["tiles"]],
+                         [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)])
+        self.assertEqual(data["tiles"][1]["box"], [0, 32, 64, 64])
+        self._assert_colors(data["tiles"][1]["colors"], [[1, 0, 0], [0, 0, 1]])
+        self.assertEqual((data["tiles"][2]["colors"], data["tiles"][2]["samples"]), ([], 0))
+        with self.assertRaises(ValueError):
+            node.extract_palette(img, tile_rows=2, batch_mode="temporal")
+        with self.assertRaises(ValueError):
+            node.extract_palette(img, tile_rows=17, use_cache=False)
+
+    def test_extract_palette_size(self):
+        node = ImagePaletteExtractor()
+        img = np.random.default_rng(0).random((1, 64, 64, 3))
+        data = json.loads(node.extract_palette(img, palette_size=32, max_iter=5, use_cache=False)[0])
+        self.assertEqual(len(data["colors"]), 32)
+        self.assertEqual(len(set(data["colors"])), 32)
+        self.assertLessEqual(data["kmeans"]["n_iter"], 5)
+        self.assertGreater(data["kmeans"]["inertia"], 0)
+        # the widget range is the accepted range
+        lo = ImagePaletteExtractor.INPUT_TYPES()["required"]["palette_size"][1]
+        self.assertEqual((lo["min"], lo["max"]), (1, 256))
+        data = json.loads(node.extract_palette(img, palette_size=1, use_cache=False)[0])
+        self.assertEqual(len(data["colors"]), 1)
+        for bad in (0, 257):
+            with self.assertRaises(ValueError):
+                node.extract_palette(img, palette_size=bad, use_cache=False)
+
+    def test_kmeans_best_of_restarts(self):
+        rng = np.random.default_rng(0)
+        lab = _rgb_to_lab(rng.random((2, 3000, 3)))
+        single = _kmeans_fit(lab, k=8, max_iter=15, seed=3)
+        best = _kmeans_best(lab, k=8, max_iter=15, seed=3, n_init=4)
+        self.assertTrue(np.all(best.inertia <= single.inertia))
+        again = _kmeans_best(lab, k=8, max_iter=15, seed=3, n_init=4)
+        np.testing.assert_array_equal(best.centers, again.centers)
+        # each frame picks its own lowest-inertia run
+        runs = [_kmeans_fit(lab, k=8, max_iter=15, seed=s) for s in image_palette_extractor._restart_seeds(3, 4)]
+        np.testing.assert_array_equal(best.inertia, np.min([r.inertia for r in runs], axis=0))
+        one = _kmeans_best(lab, k=8, max_iter=15, seed=3, n_init=1)
+        np.testing.assert_array_equal(one.centers, single.centers)
+
+    def test_extract_palette_color_space(self):
+        node = ImagePaletteExtractor()
+        image = self._make_test_image()
+        expected = {"#FF0000", "#00FF00", "#0000FF", "#FFFF00", "#FF00FF", "#00FFFF", "#FFFFFF", "#000000"}
+        for space in ("oklab", "linear_rgb"):
+            for kwargs in ({}, {"quantize_bits": 5}, {"algorithm": "minibatch"}):
+                data = json.loads(node.extract_palette(image, seed=1, color_space=space, use_cache=False, **kwargs)[0])
+                self.assertEqual(set(data["colors"]), expected, msg=f"{space} {kwargs}")
+        data = json.loads(node.extract_palette(image, seed=1, color_space="oklab", sort="luminance",
+                                               use_cache=False)[0])
+        self.assertEqual(data["colors"][0], "#000000")
+        self.assertEqual(data["colors"][-1], "#FFFFFF")
+        with self.assertRaises(ValueError):
+            node.extract_palette(image, color_space="oklab", merge_metric="ciede2000", use_cache=False)
+        with self.assertRaises(ValueError):
+            node.extract_palette(image, color_space="hsv", use_cache=False)
+
+    def test_working_space_roundtrip(self):
+        rgb = np.random.default_rng(0).random((500, 3))
+        for space in image_palette_extractor._COLOR_SPACES:
+            work = image_palette_extractor._rgb_to_working(rgb, space)
+            np.testing.assert_allclose(image_palette_extractor._working_to_rgb(work, space), rgb, atol=1e-5)
+            # L* and OKLab L both span 0..100
+            self.assertTrue(0 <= work[:, 0].min() and work[:, 0].max() <= 100.0 + 1e-6)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,38 @@
+import sys
+import unittest
+
+from lazy_import import lazy_node, load_module
+
+
+class TestLazyNode(unittest.TestCase):
+    def test_loads_on_first_use(self):
+        saved = sys.modules.pop("color_space", None)
+        try:
+            node = lazy_node("color_space", "missing_class")
+            self.assertNotIn("color_space", sys.modules)
+            with self.assertRaises(AttributeError):
+                node.INPUT_TYPES
+            self.assertIn("color_space", sys.modules)
+            self.assertFalse(node.loaded)
+        finally:
+            if saved is not None:
+                sys.modules["color_space"] = saved
+
+    def test_delegates_to_real_class(self):
+        node = lazy_node("rgb_color_picker", "RGBColorPicker")
+        self.assertEqual(node.__name__, "RGBColorPicker")
+        node.RELATIVE_PYTHON_MODULE = "custom_nodes.test"  # set by ComfyUI on registration
+        self.assertFalse(node.loaded)
+        real = load_module("rgb_color_picker").RGBColorPicker
+        self.assertEqual(node.INPUT_TYPES(), real.INPUT_TYPES())
+        self.assertTrue(node.loaded)
+        self.assertEqual((node.FUNCTION, node.RETURN_TYPES), (real.FUNCTION, real.RETURN_TYPES))
+        self.assertFalse(hasattr(node, "NOT_A_NODE_ATTRIBUTE"))
+        instance = node()
+        self.assertIsInstance(instance, real)
+        self.assertEqual(getattr(instance, node.FUNCTION)(255, 0, 16, 128), ("#FF0010", "#FF001080"))
+        self.assertFalse(hasattr(real, "RELATIVE_PYTHON_MODULE"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import io
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import palette_api
+from palette_registry import get_registry
+
+
+class TestPaletteApi(unittest.TestCase):
+    def test_resolve_batch(self):
+        out = palette_api.resolve_batch({"requests": [
+            {"preset": "primary"},
+            {"preset": "custom", "custom_json": '{"colors":["#112233"]}'},
+            "monochrome",
+        ]})["results"]
+        self.assertEqual(len(out), 3)
+        self.assertEqual(out[0][0], "#FF0000")
+        self.assertEqual(out[1][:2], ["#112233", "#000000"])
+        self.assertEqual(out[2][0], "#FFFFFF")
+        with self.assertRaises(ValueError):
+            palette_api.resolve_batch({"requests": "primary"})
+        with self.assertRaises(ValueError):
+            palette_api.resolve_batch([{"preset": "primary"}] * (palette_api.MAX_BATCH + 1))
+
+    def test_presets_payload_etag(self):
+        payload, etag = palette_api.presets_payload(["primary", "pastel", "primary"])
+        self.assertEqual(list(payload["palettes"]), ["primary", "pastel"])
+        again, etag2 = palette_api.presets_payload(["primary", "pastel"])
+        self.assertEqual(etag, etag2)
+        self.assertNotEqual(etag, palette_api.presets_payload(["primary"])[1])
+        everything, _ = palette_api.presets_payload()
+        self.assertEqual(sorted(everything["palettes"]), get_registry().names())
+        # a matching If-None-Match answers with the ETag only; no preset is resolved
+        with mock.patch.object(palette_api, "resolve", side_effect=AssertionError("payload built")):
+            self.assertEqual(palette_api.presets_payload(["primary", "pastel"], f"W/{etag}"), (None, etag))
+
+    def test_match(self):
+        primary = palette_api.resolve("primary")
+        out = palette_api.match({"colors": primary[::-1], "k": 2})
+        self.assertEqual(out["matches"][0], {"name": "primary", "distance": 0.0})
+        self.assertEqual(len(out["matches"]), 2)
+        many = palette_api.match({"queries": [primary, {"colors": palette_api.resolve("pastel")}]})
+        self.assertEqual([r[0]["name"] for r in many["results"]], ["primary", "pastel"])
+        for bad in ({"colors": 5}, {"queries": "x"}, {"colors": "{"}, {"colors": primary, "k": "x"}):
+            with self.assertRaises(ValueError):
+                palette_api.match(bad)
+
+    def test_from_json(self):
+        self.assertEqual(palette_api.from_json(palette_api.resolve_request, b'{"preset":"primary"}')[0], "#FF0000")
+        with self.assertRaises(ValueError):
+            palette_api.from_json(palette_api.resolve_request, b"{bad")
+
+    def test_extract_params(self):
+        params = palette_api.extract_params({"palette_size": "4", "merge_delta": "2.5", "use_cache": "false",
+                                             "sort": "hue"})
+        self.assertEqual(params, {"palette_size": 4, "merge_delta": 2.5, "use_cache": False, "sort": "hue"})
+        for bad in ({"palette_size": "999"}, {"palette_size": "x"}, {"sort": "nope"}, {"use_cache": "maybe"},
+                    {"image": "x"}, {"unknown": "1"}):
+            with self.assertRaises(ValueError, msg=bad):
+                palette_api.extract_params(bad)
+
+    def test_extract_npy_upload(self):
+        img = np.zeros((32, 32, 3), dtype=np.uint8)
+        img[16:] = [0, 0, 255]
+        buf = io.BytesIO()
+        np.save(buf, img)
+        out = palette_api.extract(buf.getvalue(), {"palette_size": "2", "use_cache": "0"})
+        self.assertEqual(sorted(out["colors"]), ["#000000", "#0000FF"])
+        decoded = palette_api.decode_image(buf.getvalue())
+        self.assertEqual((decoded.shape, decoded.dtype), ((1, 32, 32, 3), np.float32))
+        self.assertEqual(palette_api.upload_key(buf.getvalue(), {"b": 1, "a": 2}),
+                         palette_api.upload_key(buf.getvalue(), {"a": 2, "b": 1}))
+        buf = io.BytesIO()
+        np.save(buf, np.zeros((4, 4), dtype=np.uint8))
+        with self.assertRaises(ValueError):
+            palette_api.decode_image(buf.getvalue())
+
+    def test_etag_matches(self):
+        self.assertTrue(palette_api.etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(palette_api.etag_matches('W/"b"', '"b"'))
+        self.assertTrue(palette_api.etag_matches("*", '"b"'))
+        self.assertFalse(palette_api.etag_matches(None, '"b"'))
+        self.assertFalse(palette_api.etag_matches('"a"', '"b"'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import tempfile
+import time
+import unittest
+import numpy as np
+
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover
+    torch = None  # type: ignore
+
+import palette_cache
+from palette_cache import PaletteCache, image_digest, make_key
+from image_palette_extractor import ImagePaletteExtractor
+
+
+class TestPaletteCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = PaletteCache(max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        self.assertEqual(cache.get("a"), "1")  # a becomes most recent
+        cache.put("c", "3")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "1")
+        self.assertEqual(cache.get("c"), "3")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["size"]), (3, 1, 1, 2))
+
+    def test_ttl_expiry(self):
+        cache = PaletteCache(max_entries=4, ttl=0.05)
+        cache.put("a", "1")
+        self.assertEqual(cache.get("a"), "1")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_disk_tier_survives_new_instance(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            PaletteCache(max_entries=4, disk_dir=tmp).put("abcd", '{"colors":[]}')
+            fresh = PaletteCache(max_entries=4, disk_dir=tmp)
+            self.assertEqual(fresh.get("abcd"), '{"colors":[]}')
+            self.assertEqual(fresh.stats()["disk_hits"], 1)
+            self.assertEqual(fresh.get("abcd"), '{"colors":[]}')
+            self.assertEqual(fresh.stats()["hits"], 1)
+
+    def test_image_digest(self):
+        a = np.zeros((1, 4, 4, 3), dtype=np.float32)
+        b = a.copy()
+        self.assertEqual(image_digest(a), image_digest(b))
+        b[0, 0, 0, 0] = 1.0
+        self.assertNotEqual(image_digest(a), image_digest(b))
+        self.assertNotEqual(image_digest(a), image_digest(a.reshape(1, 2, 8, 3)))
+        self.assertNotEqual(make_key("x", {"seed": 1}), make_key("x", {"seed": 2}))
+
+    @unittest.skipIf(torch is None, "torch not installed")
+    def test_image_digest_tracks_inplace_writes(self):
+        t = torch.zeros((1, 4, 4, 3))
+        before = image_digest(t)
+        self.assertEqual(image_digest(t), before)
+        t[0, 0, 0, 0] = 1.0
+        self.assertNotEqual(image_digest(t), before)
+
+    @unittest.skipIf(torch is None, "torch not installed")
+    def test_extractor_caches_inference_tensors(self):
+        # ComfyUI runs nodes under inference_mode; such tensors have no version counter
+        saved = palette_cache._result_cache
+        palette_cache._result_cache = PaletteCache(max_entries=8)
+        try:
+            with torch.inference_mode():
+                t = torch.rand((1, 16, 16, 3), generator=torch.Generator().manual_seed(0))
+            node = ImagePaletteExtractor()
+            first = node.extract_palette(t, seed=5)
+            self.assertEqual(node.extract_palette(t, seed=5), first)
+            with torch.inference_mode():
+                self.assertEqual(node.extract_palette(t, seed=5), first)
+            self.assertEqual(palette_cache.get_result_cache().stats()["hits"], 2)
+        finally:
+            palette_cache._result_cache = saved
+
+    @unittest.skipIf(torch is None, "torch not installed")
+    def test_image_digest_without_host_copy(self):
+        from unittest import mock
+        a = torch.rand((1, 4, 4, 3), generator=torch.Generator().manual_seed(0))
+        with mock.patch.object(torch.Tensor, "cpu", side_effect=AssertionError("full .cpu() copy")), \
+                mock.patch.object(torch.Tensor, "float", side_effect=AssertionError("full .float() copy")):
+            self.assertEqual(image_digest(a), image_digest(a.numpy()))
+            b = a.to(torch.bfloat16)
+            self.assertEqual(image_digest(b), image_digest(b.clone()))
+            self.assertNotEqual(image_digest(b), image_digest(b.view(torch.int16)))
+        # tensors on other devices are never copied over: the extractor skips the cache
+        meta = torch.empty((1, 4, 4, 3), device="meta")
+        self.assertFalse(palette_cache.can_digest(meta))
+        self.assertTrue(palette_cache.can_digest(a))
+        with self.assertRaises(ValueError):
+            image_digest(meta)
+
+    def test_make_key_includes_cache_version(self):
+        key = make_key("x", {"seed": 1})
+        saved = palette_cache.CACHE_VERSION
+        palette_cache.CACHE_VERSION = saved + 1
+        try:
+            self.assertNotEqual(make_key("x", {"seed": 1}), key)
+        finally:
+            palette_cache.CACHE_VERSION = saved
+
+    def test_extractor_uses_cache(self):
+        saved = palette_cache._result_cache
+        palette_cache._result_cache = PaletteCache(max_entries=8)
+        try:
+            node = ImagePaletteExtractor()
+            img = np.random.default_rng(0).random((1, 32, 32, 3))
+            first = node.extract_palette(img, seed=5)
+            second = node.extract_palette(img, seed=5)
+            node.extract_palette(img, seed=6)
+            self.assertEqual(first, second)
+            stats = palette_cache.get_result_cache().stats()
+            self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+            node.extract_palette(img, seed=5, use_cache=False)
+            self.assertEqual(palette_cache.get_result_cache().stats()["hits"], 1)
+        finally:
+            palette_cache._result_cache = saved
+
+
+if __name__ == "__main__":
+    unittest.main()
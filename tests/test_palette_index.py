@@ -0,0 +1,66 @@
+import itertools
+import json
+import unittest
+
+import numpy as np
+
+from image_palette_extractor import _rgb_to_lab
+from palette_index import PaletteIndex, PaletteMatch, linear_sum_assignment, palette_distance
+
+
+def _hexes(rgb):
+    return [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in rgb]
+
+
+class TestPaletteIndex(unittest.TestCase):
+    def test_linear_sum_assignment_matches_bruteforce(self):
+        rng = np.random.default_rng(0)
+        for n, m in ((1, 1), (3, 3), (4, 6), (6, 4), (6, 6)):
+            cost = rng.random((n, m))
+            rows, cols = linear_sum_assignment(cost)
+            self.assertEqual(len(rows), min(n, m))
+            if n <= m:
+                best = min(sum(cost[i, p[i]] for i in range(n)) for p in itertools.permutations(range(m), n))
+            else:
+                best = min(sum(cost[p[j], j] for j in range(m)) for p in itertools.permutations(range(n), m))
+            self.assertAlmostEqual(float(cost[rows, cols].sum()), best)
+
+    def test_palette_distance_properties(self):
+        rng = np.random.default_rng(1)
+        a = _rgb_to_lab(rng.random((6, 3)))
+        b = _rgb_to_lab(rng.random((4, 3)))
+        self.assertAlmostEqual(palette_distance(a, a[::-1]), 0.0)
+        self.assertAlmostEqual(palette_distance(a, b), palette_distance(b, a))
+        self.assertGreater(palette_distance(a, b), 0.0)
+
+    def test_query_is_exact_top_k(self):
+        rng = np.random.default_rng(2)
+        palettes = {f"p{i:03d}": _hexes(rng.integers(0, 256, size=(rng.integers(3, 9), 3))) for i in range(300)}
+        index = PaletteIndex(palettes)
+        self.assertEqual(len(index), 300)
+        for _ in range(3):
+            query = _hexes(rng.integers(0, 256, size=(rng.integers(3, 9), 3)))
+            q = _rgb_to_lab(np.array([[int(h[i:i + 2], 16) for i in (1, 3, 5)] for h in query]) / 255.0)
+            brute = sorted((round(palette_distance(q, index.palette_lab(i)), 4), index.names[i]) for i in range(len(index)))
+            self.assertEqual(index.query(query, 5), [(name, d) for d, name in brute[:5]])
+            bounds = index.lower_bounds(q)
+            exact = np.array([palette_distance(q, index.palette_lab(i)) for i in range(len(index))])
+            self.assertTrue((bounds <= exact + 1e-3).all())
+
+    def test_query_finds_reordered_preset(self):
+        index = PaletteIndex({"warm": ["#FF0000", "#FF8800", "#FFFF00"], "cool": ["#0000FF", "#00FFFF", "#00FF00"]})
+        self.assertEqual(index.query('{"colors": ["#FFFF00", "#FF0000", "#FF8800"]}', 1), [("warm", 0.0)])
+        self.assertEqual(PaletteIndex({}).query(["#000000"]), [])
+        with self.assertRaises(ValueError):
+            index.query([])
+
+    def test_node_against_presets(self):
+        node = PaletteMatch()
+        best, matches = node.match(json.dumps({"colors": ["#FF0000", "#00FF00", "#0000FF", "#FFFF00",
+                                                          "#FF00FF", "#00FFFF", "#FFFFFF", "#000000"]}), 3)
+        self.assertEqual(best, "primary")
+        self.assertEqual(len(json.loads(matches)["matches"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import palette_library
+from palette_library import PaletteLibrary, build, pack
+from palette_registry import PaletteRegistry
+
+
+class TestPaletteLibrary(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write_lib(self, palettes, name="lib.tjpal"):
+        path = self.root / name
+        path.write_bytes(pack(palettes))
+        return path
+
+    def test_roundtrip_and_binary_search(self):
+        palettes = {f"p{i:04d}": [f"#{i % 256:02X}{(i * 7) % 256:02X}{(i * 13) % 256:02X}"] * (1 + i % 5)
+                    for i in range(0, 1000, 3)}
+        palettes["ブランド"] = ["#ABCDEF", "#000000"]
+        lib = PaletteLibrary(self._write_lib(palettes))
+        try:
+            self.assertEqual(len(lib), len(palettes))
+            self.assertEqual(lib.names(), sorted(palettes, key=lambda n: n.encode("utf-8")))
+            for name, colors in palettes.items():
+                self.assertEqual(lib.get(name), colors)
+            self.assertIsNone(lib.get("p0001"))
+            self.assertIsNone(lib.get(""))
+            self.assertNotIn("zzz", lib)
+            rgb = lib.rgb("ブランド")
+            self.assertEqual(rgb.dtype, np.uint8)
+            self.assertEqual(rgb.tolist(), [[0xAB, 0xCD, 0xEF], [0, 0, 0]])
+            del rgb
+        finally:
+            lib.close()
+
+    def test_empty_and_invalid(self):
+        lib = PaletteLibrary(self._write_lib({}))
+        self.assertEqual(lib.names(), [])
+        self.assertIsNone(lib.get("a"))
+        lib.close()
+        bad = self.root / "bad.tjpal"
+        bad.write_bytes(b"not a library at all")
+        with self.assertRaises(ValueError):
+            PaletteLibrary(bad)
+        truncated = self.root / "short.tjpal"
+        truncated.write_bytes(pack({"a": ["#010203"] * 4})[:-3])
+        with self.assertRaises(ValueError):
+            PaletteLibrary(truncated)
+        with self.assertRaises(ValueError):
+            pack({"a": ["red"]})
+
+    def test_build_from_json_directory(self):
+        src = self.root / "src"
+        src.mkdir()
+        (src / "a.json").write_text(json.dumps({"colors": ["#112233"]}), encoding="utf-8")
+        (src / "b.json").write_text(json.dumps({"colors": ["#445566", "#778899"]}), encoding="utf-8")
+        out = self.root / "out" / "presets.tjpal"
+        self.assertEqual(palette_library.main(["build", str(src), "-o", str(out)]), 0)
+        lib = PaletteLibrary(out)
+        self.assertEqual(lib.names(), ["a", "b"])
+        self.assertEqual(lib.get("b"), ["#445566", "#778899"])
+        lib.close()
+
+    def test_registry_serves_library_with_json_override(self):
+        d = self.root / "presets"
+        d.mkdir()
+        build_src = {"lib_only": ["#010101"], "shared": ["#020202"]}
+        (d / "brands.tjpal").write_bytes(pack(build_src))
+        (d / "shared.json").write_text(json.dumps({"colors": ["#FFFFFF"]}), encoding="utf-8")
+        reg = PaletteRegistry([d])
+        self.assertEqual(reg.names(), ["lib_only", "shared"])
+        self.assertEqual(reg.get("lib_only"), ["#010101"])
+        self.assertEqual(reg.get("shared"), ["#FFFFFF"])  # the JSON source wins
+        self.assertEqual(reg.path("lib_only"), d / "brands.tjpal")
+        tag = reg.etag(["lib_only"])
+
+        # a rebuilt library is picked up by refresh and changes the ETag
+        (d / "brands.tjpal").write_bytes(pack({"lib_only": ["#0A0A0A", "#0B0B0B"]}))
+        self.assertTrue(reg.refresh())
+        self.assertEqual(reg.get("lib_only"), ["#0A0A0A", "#0B0B0B"])
+        self.assertNotEqual(reg.etag(["lib_only"]), tag)
+        self.assertEqual(reg.names(), ["lib_only", "shared"])
+
+
+    def test_refresh_keeps_replaced_library_readable(self):
+        d = self.root / "presets"
+        d.mkdir()
+        path = d / "brands.tjpal"
+        path.write_bytes(pack({"lib_only": ["#010101"]}))
+        reg = PaletteRegistry([d])
+        old = reg._libraries[path].library
+        # rebuilt the way build() writes it: a new file renamed over the old one
+        tmp = d / "brands.tmp"
+        tmp.write_bytes(pack({"lib_only": ["#0A0A0A"]}))
+        tmp.replace(path)
+        self.assertTrue(reg.refresh())
+        # a reader that picked up the old library before the swap can finish
+        self.assertEqual(old.get("lib_only"), ["#010101"])
+        self.assertEqual(reg.get("lib_only"), ["#0A0A0A"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import logging
+import unittest
+import numpy as np
+
+import palette_metrics
+from palette_metrics import LoggingSink, PrometheusSink, RingBufferSink
+from image_palette_extractor import ImagePaletteExtractor
+
+
+class TestPaletteMetrics(unittest.TestCase):
+    def setUp(self):
+        self._saved = palette_metrics.get_sinks()
+        for s in self._saved:
+            palette_metrics.remove_sink(s)
+
+    def tearDown(self):
+        for s in palette_metrics.get_sinks():
+            palette_metrics.remove_sink(s)
+        for s in self._saved:
+            palette_metrics.add_sink(s)
+
+    def test_disabled_is_noop(self):
+        with palette_metrics.extraction(node="x") as run:
+            self.assertIsNone(run)
+            with palette_metrics.stage("sample"):
+                pass
+            palette_metrics.record(samples=1)
+
+    def test_extract_palette_records_stages(self):
+        ring, prom = RingBufferSink(maxlen=4), PrometheusSink()
+        palette_metrics.add_sink(ring)
+        palette_metrics.add_sink(prom)
+        node = ImagePaletteExtractor()
+        img = np.random.default_rng(0).random((1, 32, 32, 3))
+        node.extract_palette(img, seed=1, use_cache=False)
+        node.extract_palette(img, seed=1, quantize_bits=4, use_cache=False)
+        runs = ring.records()
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(set(runs[0]["stages"]), {"convert", "sample", "lab", "kmeans", "finalize"})
+        self.assertEqual(runs[0]["samples"], 1024)
+        self.assertEqual(runs[0]["cache"], "off")
+        self.assertGreater(runs[0]["n_iter"], 0)
+        self.assertGreaterEqual(runs[0]["total"], sum(runs[0]["stages"].values()))
+        text = palette_metrics.prometheus_text()
+        self.assertIn('tj_palette_runs_total{outcome="off"} 2', text)
+        self.assertIn('tj_palette_stage_seconds_count{stage="kmeans"} 2', text)
+
+    def test_error_and_logging_sink(self):
+        ring = RingBufferSink()
+        palette_metrics.add_sink(ring)
+        palette_metrics.add_sink(LoggingSink(level=logging.DEBUG))
+        with self.assertRaises(ValueError):
+            ImagePaletteExtractor().extract_palette(np.zeros((1, 8, 8, 3)), batch_mode="nope", use_cache=False)
+        self.assertEqual(ring.records()[0]["error"], "ValueError")
+        self.assertIsNone(palette_metrics.prometheus_text())
+
+
+if __name__ == "__main__":
+    unittest.main()
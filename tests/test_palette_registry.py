@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import palette_library
+import palette_registry
+from palette_registry import PaletteRegistry, get_registry, preset_names
+from color_palette import ColorPalette
+
+
+def _write(path: Path, colors) -> None:
+    path.write_text(json.dumps({"colors": colors}), encoding="utf-8")
+
+
+class TestPaletteRegistry(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name) / "base"
+        self.user = Path(self._tmp.name) / "user"
+        self.base.mkdir()
+        self.user.mkdir()
+        _write(self.base / "a.json", ["#111111"])
+        _write(self.base / "b.json", ["#222222"])
+        _write(self.user / "b.json", ["#BBBBBB"])
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_index_and_override(self):
+        reg = PaletteRegistry([self.base, self.user])
+        self.assertEqual(reg.names(), ["a", "b"])
+        self.assertEqual(reg.get("a"), ["#111111"])
+        self.assertEqual(reg.get("b"), ["#BBBBBB"])  # later directory wins
+        self.assertIsNone(reg.get("missing"))
+
+    def test_miss_rescans_new_file_and_refresh_reloads_edits(self):
+        reg = PaletteRegistry([self.base])
+        version = reg.version
+        _write(self.base / "c.json", ["#333333"])
+        self.assertEqual(reg.get("c"), ["#333333"])
+        # rewrite with a different size so the stamp changes even on coarse clocks
+        _write(self.base / "a.json", ["#444444", "#555555"])
+        self.assertEqual(reg.get("a"), ["#111111"])  # hits never touch the disk
+        self.assertTrue(reg.refresh())
+        self.assertEqual(reg.get("a"), ["#444444", "#555555"])
+        (self.base / "b.json").unlink()
+        reg.refresh()
+        self.assertNotIn("b", reg.names())
+        self.assertGreater(reg.version, version)
+
+    def test_broken_file_is_skipped(self):
+        (self.base / "bad.json").write_text("{", encoding="utf-8")
+        reg = PaletteRegistry([self.base])
+        self.assertNotIn("bad", reg.names())
+        self.assertEqual(reg.get("a"), ["#111111"])
+
+    def test_watcher_picks_up_changes(self):
+        reg = PaletteRegistry([self.base], poll_interval=0.02)
+        try:
+            _write(self.base / "a.json", ["#999999", "#999999"])
+            deadline = time.time() + 2.0
+            while reg.get("a") != ["#999999", "#999999"] and time.time() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(reg.get("a"), ["#999999", "#999999"])
+        finally:
+            reg.stop_watcher()
+
+    def test_color_palette_shares_registry(self):
+        self.assertIs(ColorPalette()._registry, get_registry())
+        self.assertIs(ColorPalette()._registry, ColorPalette()._registry)
+        self.assertIn("primary", ColorPalette.INPUT_TYPES()["required"]["preset"][0])
+
+    def test_preset_names_index(self):
+        self.assertEqual(palette_registry.LIBRARY_SUFFIX, palette_library.SUFFIX)
+        env = {"TJ_COLORUTIL_PALETTE_DIRS": str(self.user), "TJ_COLORUTIL_PALETTE_POLL": "0",
+               "TJ_COLORUTIL_CACHE_DIR": self._tmp.name}
+        with mock.patch.dict(os.environ, env), mock.patch.object(palette_registry, "_registry", None):
+            names = preset_names()  # builds the registry and writes the index
+            self.assertIn("primary", names)
+            self.assertIn("b", names)
+            self.assertTrue((Path(self._tmp.name) / "preset_names.json").is_file())
+            palette_registry._registry = None
+            self.assertEqual(preset_names(), names)
+            self.assertIsNone(palette_registry._registry)  # served from the index
+            _write(self.user / "zz.json", ["#123456"])
+            os.utime(self.user, ns=(0, 0))
+            self.assertEqual(preset_names(), sorted(names + ["zz"]))
+            self.assertIsNotNone(palette_registry._registry)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from image_palette_extractor import _rgb_to_lab
+from palette_remap import PaletteRemap, _bayer, _parse_palette
+
+PALETTE = '{"colors":["#000000","#FFFFFF","#FF0000","#00FF00","#0000FF","#808080"]}'
+
+
+class TestPaletteRemap(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # keep the Lab tables built by the LUT modes out of the package directory
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._old = os.environ.get("TJ_COLORUTIL_CACHE_DIR")
+        os.environ["TJ_COLORUTIL_CACHE_DIR"] = cls._tmp.name
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old is None:
+            del os.environ["TJ_COLORUTIL_CACHE_DIR"]
+        else:
+            os.environ["TJ_COLORUTIL_CACHE_DIR"] = cls._old
+        cls._tmp.cleanup()
+
+    def setUp(self):
+        self.node = PaletteRemap()
+        # 8-bit valued pixels, so the 8-bit table is exact
+        rng = np.random.default_rng(0)
+        self.image = rng.integers(0, 256, size=(2, 24, 20, 3)).astype(np.float32) / 255.0
+
+    def test_parse_palette_formats(self):
+        expected = [[1, 0, 0], [0, 0, 1]]
+        for text in ('{"colors":["#FF0000","#0000FF"]}', '["#ff0000", "#0000ff"]', "#FF0000, #0000FF"):
+            np.testing.assert_allclose(_parse_palette(text), expected)
+        with self.assertRaises(ValueError):
+            _parse_palette('{"colors": []}')
+
+    def test_exact_matches_bruteforce_lab(self):
+        idx, pal = self.node.remap_indices(self.image, PALETTE, mode="exact")
+        d = np.linalg.norm(_rgb_to_lab(self.image)[..., None, :] - _rgb_to_lab(pal), axis=-1)
+        self.assertEqual(idx.shape, (2, 24, 20))
+        np.testing.assert_array_equal(idx, d.argmin(-1))
+
+    def test_lut_modes(self):
+        exact, _ = self.node.remap_indices(self.image, PALETTE, mode="exact")
+        lut8, _ = self.node.remap_indices(self.image, PALETTE, mode="lut3d_8bit")
+        np.testing.assert_array_equal(lut8, exact)
+        lut6, _ = self.node.remap_indices(self.image, PALETTE, mode="lut3d_6bit")
+        self.assertGreater((lut6 == exact).mean(), 0.95)
+
+    def test_remap_outputs_palette_colors(self):
+        (out,) = self.node.remap(self.image, PALETTE)
+        self.assertEqual(out.shape, self.image.shape)
+        self.assertEqual(out.dtype, np.float32)
+        pal = _parse_palette(PALETTE).astype(np.float32)
+        self.assertTrue((np.abs(out.reshape(-1, 1, 3) - pal[None]).sum(-1).min(-1) == 0).all())
+
+    def test_dithering_preserves_mean_of_flat_gray(self):
+        # 25% gray between black and white: dithering mixes the two, plain mapping does not
+        gray = np.full((1, 32, 32, 3), 0.25, dtype=np.float32)
+        bw = '["#000000", "#FFFFFF"]'
+        plain, _ = self.node.remap_indices(gray, bw)
+        self.assertEqual(plain.mean(), 0.0)
+        # ordered dithering thresholds against the Lab midpoint (L*=50, sRGB ~0.47),
+        # so it lands slightly above the sRGB mean; error diffusion is exact
+        for dither, delta in (("bayer4", 0.07), ("bayer8", 0.07), ("floyd_steinberg", 0.01)):
+            idx, _ = self.node.remap_indices(gray, bw, dither=dither)
+            self.assertAlmostEqual(idx.mean(), 0.25, delta=delta, msg=dither)
+
+    def test_floyd_steinberg_matches_sequential_reference(self):
+        rng = np.random.default_rng(1)
+        img = rng.random((1, 9, 13, 3), dtype=np.float32)
+        idx, pal = self.node.remap_indices(img, PALETTE, mode="exact", dither="floyd_steinberg")
+        pal_lab = _rgb_to_lab(pal)
+        work = img[0].astype(np.float32).copy()
+        ref = np.zeros((9, 13), dtype=np.uint8)
+        for y in range(9):
+            for x in range(13):
+                v = np.clip(work[y, x], 0, 1)
+                i = int(np.linalg.norm(_rgb_to_lab(v.astype(np.float64)) - pal_lab, axis=-1).argmin())
+                ref[y, x] = i
+                err = v - pal[i].astype(np.float32)
+                for dy, dx, w in ((0, 1, 7), (1, -1, 3), (1, 0, 5), (1, 1, 1)):
+                    if 0 <= y + dy < 9 and 0 <= x + dx < 13:
+                        work[y + dy, x + dx] += np.float32(w / 16) * err
+        np.testing.assert_array_equal(idx[0], ref)
+
+    def test_bayer_matrix(self):
+        m = _bayer(4)
+        self.assertEqual(m.shape, (4, 4))
+        self.assertEqual(len(np.unique(m)), 16)
+        self.assertAlmostEqual(float(m.mean()), 0.0)
+
+    def test_torch_tensor_roundtrip(self):
+        try:
+            import torch
+        except ImportError:
+            self.skipTest("torch not installed")
+        (out,) = self.node.remap(torch.from_numpy(self.image), PALETTE)
+        self.assertIsInstance(out, torch.Tensor)
+        self.assertEqual(tuple(out.shape), self.image.shape)
+
+
+if __name__ == "__main__":
+    unittest.main()
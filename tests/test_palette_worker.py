@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from palette_worker import Busy, WorkerPool
+
+
+class TestWorkerPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.pool = WorkerPool("test", workers=2, max_pending=2)
+        self.release = threading.Event()
+        self.calls = 0
+
+    def tearDown(self):
+        self.release.set()
+        self.pool.shutdown()
+
+    def job(self, value):
+        self.calls += 1
+        self.release.wait(5)
+        if value is None:
+            raise ValueError("bad")
+        return value * 2
+
+    async def test_identical_requests_share_one_job(self):
+        tasks = [asyncio.create_task(self.pool.run("k", self.job, 21)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*tasks), [42] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.pool.stats()["coalesced"], 4)
+        # finished jobs are not reused
+        self.assertEqual(await self.pool.run("k", self.job, 1), 2)
+        self.assertEqual(self.calls, 2)
+
+    async def test_backpressure(self):
+        tasks = [asyncio.create_task(self.pool.run(i, self.job, i)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        with self.assertRaises(Busy):
+            await self.pool.run(99, self.job, 99)
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*tasks), [0, 2])
+        self.assertEqual(self.pool.stats()["pending"], 0)
+        self.assertEqual(self.pool.stats()["rejected"], 1)
+
+    async def test_errors_reach_every_waiter(self):
+        self.release.set()
+        results = await asyncio.gather(self.pool.run("e", self.job, None), self.pool.run("e", self.job, None),
+                                       return_exceptions=True)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+    async def test_cancelled_waiter_keeps_shared_job(self):
+        first = asyncio.create_task(self.pool.run("k", self.job, 5))
+        second = asyncio.create_task(self.pool.run("k", self.job, 5))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        self.release.set()
+        self.assertEqual(await second, 10)
+        self.assertEqual(self.calls, 1)
+
+    async def test_event_loop_stays_free(self):
+        task = asyncio.create_task(self.pool.run(None, time.sleep, 0.2))
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        self.assertLess(time.perf_counter() - t0, 0.1)
+        await task
+
+
+if __name__ == "__main__":
+    unittest.main()
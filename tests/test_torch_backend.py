@@ -0,0 +1,85 @@
+import json
+import unittest
+import numpy as np
+
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover
+    torch = None  # type: ignore
+
+from image_palette_extractor import ImagePaletteExtractor, _rgb_to_lab
+
+if torch is not None:
+    import torch_backend
+
+
+@unittest.skipIf(torch is None, "torch not installed")
+class TestTorchBackend(unittest.TestCase):
+    def _stripes(self):
+        colors = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0], [1.0, 1.0, 1.0]]
+        img = torch.zeros((1, 64, 64, 3))
+        for i, c in enumerate(colors):
+            img[0, i * 16:(i + 1) * 16] = torch.tensor(c)
+        return img
+
+    def test_rgb_to_lab_matches_numpy(self):
+        rng = np.random.default_rng(0)
+        rgb = rng.random((1000, 3))
+        out = torch_backend.rgb_to_lab(torch.from_numpy(rgb)).numpy()
+        np.testing.assert_allclose(out, _rgb_to_lab(rgb), atol=1e-6)
+
+    def test_rgb_to_working_matches_numpy(self):
+        from image_palette_extractor import _COLOR_SPACES, _rgb_to_working
+        rgb = np.random.default_rng(0).random((1000, 3))
+        for space in _COLOR_SPACES:
+            out = torch_backend.rgb_to_working(torch.from_numpy(rgb), space).numpy()
+            np.testing.assert_allclose(out, _rgb_to_working(rgb, space), atol=1e-6, err_msg=space)
+
+    def test_to_bhwc_channels_first(self):
+        img = torch.rand(2, 3, 8, 5)
+        out = torch_backend.to_bhwc(img)
+        self.assertEqual(tuple(out.shape), (2, 8, 5, 3))
+        self.assertEqual(tuple(torch_backend.to_bhwc(img, first_only=True).shape), (1, 8, 5, 3))
+
+    def test_kmeans_recovers_stripes(self):
+        lab = torch_backend.rgb_to_lab(self._stripes().reshape(1, -1, 3))
+        centers, labels = torch_backend.kmeans(lab, k=4, iters=15, seed=0)
+        counts = torch_backend.cluster_counts(labels, 4)
+        self.assertEqual(sorted(counts[0].tolist()), [1024, 1024, 1024, 1024])
+
+    def test_kmeans_fit_reports_inertia(self):
+        lab = torch_backend.rgb_to_lab(torch.rand(1, 2000, 3, generator=torch.Generator().manual_seed(0)))
+        centers, labels, n_iter, inertia = torch_backend.kmeans_fit(lab, k=6, max_iter=4, seed=0)
+        self.assertLessEqual(n_iter, 4)
+        direct = ((lab[0] - centers[0][labels[0]]) ** 2).sum().item()
+        self.assertAlmostEqual(inertia[0].item(), direct, delta=1e-4 * direct)
+
+    def test_extract_palette_torch_backend(self):
+        node = ImagePaletteExtractor()
+        for kwargs in ({}, {"quantize_bits": 5}):
+            data = json.loads(node.extract_palette(self._stripes(), seed=1, backend="torch", **kwargs)[0])
+            self.assertEqual(len(data["colors"]), 8)
+            for c in ["#FF0000", "#00FF00", "#0000FF", "#FFFFFF"]:
+                self.assertIn(c, data["colors"])
+
+    def test_histogram_padding_never_seeds(self):
+        # a solid frame has one bin, the rest is zero-weight padding up to the
+        # noisy frame's bin count; seeds must come from the solid color only
+        img = np.empty((2, 32, 32, 3), dtype=np.float32)
+        img[0] = 0.5
+        img[1] = np.random.default_rng(0).random((32, 32, 3))
+        samples, weights = torch_backend.histogram_bins(torch.from_numpy(img), 5)
+        lab = torch_backend.rgb_to_lab(samples.double())
+        centers, _, _, _ = torch_backend.kmeans_fit(lab, 8, 15, 42, weights.to(lab.dtype))
+        np.testing.assert_allclose(centers[0].numpy(), np.repeat(lab[0, :1].numpy(), 8, axis=0), atol=1e-6)
+
+        node = ImagePaletteExtractor()
+        out = {backend: json.loads(node.extract_palette(torch.from_numpy(img), backend=backend, quantize_bits=5,
+                                                        batch_mode="per_frame", use_cache=False)[0])
+               for backend in ("torch", "numpy")}
+        self.assertNotIn("#000000", out["torch"]["frames"][0])
+        self.assertEqual(out["torch"]["frames"][0], out["numpy"]["frames"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
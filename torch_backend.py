@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+
+# Torch implementation of the ImagePaletteExtractor pipeline (sampling,
+# histogram, sRGB -> Lab/OKLab, k-means). Everything runs on the device the IMAGE
+# already lives on, in its own float precision; only the k cluster centers
+# and their weights are copied back to NumPy for merging/sorting.
+# Mirrors the NumPy functions in image_palette_extractor.py; random draws come
+# from a torch.Generator, so palettes match the NumPy backend closely but not
+# bit for bit.
+
+# Upper bound on the number of elements in the per-chunk temporaries
+_CHUNK_ELEMS = 1 << 20
+
+_M_RGB_TO_XYZ = (
+    (0.4124564, 0.3575761, 0.1804375),
+    (0.2126729, 0.7151522, 0.0721750),
+    (0.0193339, 0.1191920, 0.9503041),
+)
+_D65 = (0.95047, 1.00000, 1.08883)
+# OKLab (Ottosson): linear sRGB -> LMS, cube-rooted LMS -> Lab
+_M_RGB_TO_LMS = (
+    (0.4122214708, 0.5363325363, 0.0514459929),
+    (0.2119034982, 0.6806995451, 0.1073969566),
+    (0.0883024619, 0.2817188376, 0.6299787005),
+)
+_M_LMS_TO_OKLAB = (
+    (0.2104542553, 0.7936177850, -0.0040720468),
+    (1.9779984951, -2.4285922050, 0.4505937099),
+    (0.0259040371, 0.7827717662, -0.8086757660),
+)
+# same scale as image_palette_extractor._WORKING_SCALE
+_WORKING_SCALE = 100.0
+
+
+def _chunk_rows(B: int, width: int) -> int:
+    return max(1, _CHUNK_ELEMS // max(1, B * width))
+
+
+def _generator(device: torch.device, seed: int) -> torch.Generator:
+    g = torch.Generator(device=device)
+    g.manual_seed(seed)
+    return g
+
+
+def to_bhwc(image: torch.Tensor, first_only: bool = False) -> torch.Tensor:
+    # IMAGE [B,H,W,C] / [B,C,H,W] / [H,W,C] -> [B,H,W,3] clamped to 0..1, same device
+    t = image.detach()
+    if t.dim() == 3:
+        t = t.unsqueeze(0)
+    if t.dim() != 4:
+        raise ValueError("Unsupported tensor shape for IMAGE")
+    if first_only:
+        t = t[:1]
+    if t.shape[-1] != 3:
+        t = t.permute(0, 2, 3, 1)
+    if t.shape[-1] != 3:
+        raise ValueError("Expected 3 channels for RGB")
+    if t.dtype not in (torch.float32, torch.float64):
+        t = t.float()
+    return t.clamp(0.0, 1.0)
+
+
+def sample(frames: torch.Tensor, sample_max_pixels: int, seed: int) -> torch.Tensor:
+    # (B,H,W,3) -> (B,M,3), same pixel positions for every frame
+    B, H, W, _ = frames.shape
+    N = H * W
+    flat = frames.reshape(B, N, 3)
+    if N <= sample_max_pixels:
+        return flat
+    # drawn with replacement: randperm would be O(N) and a few duplicate
+    # samples do not move the cluster centers
+    idx = torch.randint(0, N, (sample_max_pixels,), generator=_generator(frames.device, seed), device=frames.device)
+    return flat[:, idx]
+
+
+def histogram_bins(frames: torch.Tensor, bits: int, pooled: bool = False) -> Tuple[torch.Tensor, torch.Tensor]:
+    # Same contract as ImagePaletteExtractor._histogram_bins
+    B = frames.shape[0]
+    flat = frames.reshape(B, -1, 3)
+    n_bins = 1 << (3 * bits)
+    shift = 8 - bits
+    groups = [flat.reshape(-1, 3)] if pooled else [flat[b] for b in range(B)]
+    colors_out: List[torch.Tensor] = []
+    counts_out: List[torch.Tensor] = []
+    for pixels in groups:
+        q = (pixels * 255.0 + 0.5).to(torch.int64) >> shift
+        code = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+        counts = torch.bincount(code, minlength=n_bins).to(pixels.dtype)
+        sums = torch.stack([torch.bincount(code, weights=pixels[:, c], minlength=n_bins) for c in range(3)], dim=1)
+        nz = torch.nonzero(counts).squeeze(1)
+        colors_out.append(sums[nz] / counts[nz, None])
+        counts_out.append(counts[nz])
+    m = max(c.shape[0] for c in colors_out)
+    colors = frames.new_zeros((len(groups), m, 3))
+    weights = frames.new_zeros((len(groups), m))
+    for b, (c, w) in enumerate(zip(colors_out, counts_out)):
+        colors[b, :c.shape[0]] = c
+        weights[b, :w.shape[0]] = w
+    return colors, weights
+
+
+def srgb_to_linear(rgb: torch.Tensor) -> torch.Tensor:
+    # rgb 0..1, shape (..., 3)
+    rgb = rgb.clamp(0.0, 1.0)
+    return torch.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+
+def rgb_to_oklab(rgb: torch.Tensor) -> torch.Tensor:
+    lin = srgb_to_linear(rgb)
+    M1 = torch.tensor(_M_RGB_TO_LMS, dtype=lin.dtype, device=lin.device)
+    M2 = torch.tensor(_M_LMS_TO_OKLAB, dtype=lin.dtype, device=lin.device)
+    lms = (lin @ M1.T).clamp_min(0.0) ** (1 / 3)
+    return lms @ M2.T
+
+
+def rgb_to_working(rgb: torch.Tensor, space: str) -> torch.Tensor:
+    # working color space of ImagePaletteExtractor (see _rgb_to_working there)
+    if space == "cielab":
+        return rgb_to_lab(rgb)
+    if space == "oklab":
+        return rgb_to_oklab(rgb) * _WORKING_SCALE
+    if space == "linear_rgb":
+        return srgb_to_linear(rgb) * _WORKING_SCALE
+    raise ValueError(f"Unknown color_space: {space}")
+
+
+def rgb_to_lab(rgb: torch.Tensor) -> torch.Tensor:
+    # rgb 0..1, shape (..., 3)
+    lin = srgb_to_linear(rgb)
+    M = torch.tensor(_M_RGB_TO_XYZ, dtype=lin.dtype, device=lin.device)
+    xyz = (lin @ M.T) / torch.tensor(_D65, dtype=lin.dtype, device=lin.device)
+    eps = (6 / 29) ** 3
+    k = (29 / 6) ** 2 / 3
+    f = torch.where(xyz > eps, xyz.clamp_min(eps) ** (1 / 3), k * xyz + 4 / 29)
+    fx, fy, fz = f.unbind(-1)
+    return torch.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], dim=-1)
+
+
+def _pick(p: torch.Tensor, g: torch.Generator) -> torch.Tensor:
+    # one index per row with probability p / sum(p); uniform if a row sums to 0
+    p = p.double()
+    empty = p.sum(dim=1, keepdim=True) <= 0
+    p = torch.where(empty, torch.ones_like(p), p)
+    return torch.multinomial(p, 1, generator=g).squeeze(1)
+
+
+def _kmeans_pp_init(data: torch.Tensor, k: int, g: torch.Generator,
+                    weights: Optional[torch.Tensor] = None) -> torch.Tensor:
+    B, n, D = data.shape
+    step = _chunk_rows(B, D)
+    rows = torch.arange(B, device=data.device)
+    centers = data.new_empty((B, k, D))
+    if weights is None:
+        idx = torch.randint(0, n, (B,), generator=g, device=data.device)
+    else:
+        idx = _pick(weights, g)
+    centers[:, 0] = data[rows, idx]
+    d2 = torch.full((B, n), float("inf"), dtype=data.dtype, device=data.device)
+    for i in range(1, k):
+        c = centers[:, i - 1, None, :]
+        for s in range(0, n, step):
+            diff = data[:, s:s + step] - c
+            d2[:, s:s + step] = torch.minimum(d2[:, s:s + step], (diff * diff).sum(-1))
+        p = d2 if weights is None else d2 * weights
+        if weights is not None:
+            # every weighted point already sits on a center: pick by weight,
+            # never a zero-weight (padding) point (as the NumPy init does)
+            spent = p.sum(dim=1, keepdim=True) <= 0
+            p = torch.where(spent, weights.to(p.dtype), p)
+        idx = _pick(p, g)
+        centers[:, i] = data[rows, idx]
+    return centers
+
+
+def kmeans_fit(data: torch.Tensor, k: int, max_iter: int, seed: int, weights: Optional[torch.Tensor] = None,
+               tol: float = 0.0) -> Tuple[torch.Tensor, torch.Tensor, int, torch.Tensor]:
+    # data (B,N,D) -> centers (B,k,D), labels (B,N), passes run, inertia (B,);
+    # chunked and stopped like _kmeans_fit
+    B, n, D = data.shape
+    step = _chunk_rows(B, k)
+    g = _generator(data.device, seed)
+    centers = _kmeans_pp_init(data, k, g, weights)
+    labels = torch.zeros((B, n), dtype=torch.int64, device=data.device)
+    offsets = (torch.arange(B, device=data.device) * k)[:, None]
+    xx = (data * data).sum(-1)
+    xx = (xx if weights is None else xx * weights).sum(1, dtype=torch.float64)
+    sums = data.new_zeros((B, k, D))
+    counts = data.new_zeros((B, k))
+    n_iter = 0
+    for n_iter in range(1, max_iter + 1):
+        cc = (centers * centers).sum(-1)
+        sums = data.new_zeros((B * k, D))
+        counts = data.new_zeros(B * k)
+        changed = False
+        for s in range(0, n, step):
+            block = data[:, s:s + step]
+            d2 = torch.baddbmm(cc[:, None, :], block, centers.transpose(1, 2), alpha=-2.0)
+            new_labels = d2.argmin(dim=2)
+            if not changed and not torch.equal(new_labels, labels[:, s:s + step]):
+                changed = True
+            labels[:, s:s + step] = new_labels
+            flat = (new_labels + offsets).reshape(-1)
+            if weights is None:
+                w = torch.ones_like(flat, dtype=data.dtype)
+                sums.index_add_(0, flat, block.reshape(-1, D))
+            else:
+                w = weights[:, s:s + step].reshape(-1)
+                sums.index_add_(0, flat, block.reshape(-1, D) * w[:, None])
+            counts.index_add_(0, flat, w)
+        sums = sums.view(B, k, D)
+        counts = counts.view(B, k)
+        means = sums / counts.clamp_min(1e-12)[..., None]
+        new_centers = torch.where((counts > 0)[..., None], means, centers)
+        shift = float((new_centers - centers).norm(dim=-1).max())
+        centers = new_centers
+        if not changed or shift < tol:
+            break
+    explained = ((sums * sums).sum(-1) / counts.clamp_min(1e-12)).where(counts > 0, sums.new_zeros(()))
+    inertia = (xx - explained.sum(-1).double()).clamp_min(0.0)
+    return centers, labels, n_iter, inertia
+
+
+def kmeans_best(data: torch.Tensor, k: int, max_iter: int, seed: int, weights: Optional[torch.Tensor] = None,
+                tol: float = 0.0, n_init: int = 1) -> Tuple[torch.Tensor, torch.Tensor, int, torch.Tensor]:
+    # n_init restarts with the seeds of _kmeans_best, run one after another
+    # (they already share the device); lowest inertia per frame wins
+    best = kmeans_fit(data, k, max_iter, seed, weights, tol)
+    if n_init <= 1:
+        return best
+    centers, labels, n_iter, inertia = best
+    for s in np.random.SeedSequence(seed).spawn(n_init - 1):
+        c, l, it, i = kmeans_fit(data, k, max_iter, int(s.generate_state(1)[0]), weights, tol)
+        better = i < inertia
+        if bool(better.any()):
+            centers = torch.where(better[:, None, None], c, centers)
+            labels = torch.where(better[:, None], l, labels)
+            inertia = torch.where(better, i, inertia)
+            n_iter = max(n_iter, it)
+    return centers, labels, n_iter, inertia
+
+
+def kmeans(data: torch.Tensor, k: int, iters: int, seed: int,
+           weights: Optional[torch.Tensor] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+    centers, labels, _, _ = kmeans_fit(data, k, iters, seed, weights)
+    return centers, labels
+
+
+def cluster_counts(labels: torch.Tensor, k: int, weights: Optional[torch.Tensor] = None) -> torch.Tensor:
+    # (B,N) labels -> (B,k) pixel counts (or summed weights)
+    B = labels.shape[0]
+    offsets = (torch.arange(B, device=labels.device) * k)[:, None]
+    flat = (labels + offsets).reshape(-1)
+    w = None if weights is None else weights.reshape(-1)
+    return torch.bincount(flat, weights=w, minlength=B * k).view(B, k)
+
+
+def to_numpy(t: torch.Tensor) -> np.ndarray:
+    return t.detach().to("cpu", torch.float64).numpy()